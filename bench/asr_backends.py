@@ -0,0 +1,192 @@
+"""
+语音识别后端基准：对比PyTorch与ONNX（fp32/int8量化）模型的实时率、峰值内存与识别结果差异
+
+每种配置在独立子进程中运行（后端配置通过环境变量传入，工作进程同样继承），保证各配置的峰值内存互不影响：
+- 主进程峰值内存：子进程自身（VAD、解码与聚类）的ru_maxrss
+- 工作进程峰值内存：识别进程池中占用最大的一个进程（进程池关闭后读取RUSAGE_CHILDREN）
+字符差异率以PyTorch整文件识别结果为参照，去掉标点与空白后按编辑操作统计：差异字符数 / 参照字符数
+
+两种后端使用同一组模型：ONNX的识别（SeACo-Paraformer）、VAD与标点模型默认由MODEL_CONFIG中的同一模型及版本导出，
+使用相同的热词（ASR_HOTWORDS）；声纹模型cam++没有ONNX导出，ONNX配置中仍使用PyTorch版本（报告的models中列出）。
+通过ASR_ONNX_MODEL等环境变量换用其他ONNX模型时，差异中包含模型本身的差别
+
+用法：python -m bench.asr_backends dataset/interview.m4a --workers 2 --intra 2,4 --inter 1,2
+"""
+import argparse
+import difflib
+import json
+import os
+import subprocess
+import sys
+import time
+
+from bench.asr_rtf import sentence_text
+from bench.run_bench import git_commit, peak_rss_mb, resource
+from meeting.asr_parallel import PUNCTUATION
+
+
+def children_peak_rss_mb() -> float:
+    """已结束子进程中的最大峰值常驻内存（MB）"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def normalize(text: str) -> str:
+    return "".join(c for c in text if c not in PUNCTUATION and not c.isspace())
+
+
+def char_diff_rate(reference: str, hypothesis: str) -> float:
+    """去掉标点后的字符差异率（替换、插入、删除的字符数之和 / 参照字符数）"""
+    reference, hypothesis = normalize(reference), normalize(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    matcher = difflib.SequenceMatcher(None, reference, hypothesis, autojunk=False)
+    changed = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal")
+    return changed / len(reference)
+
+
+def run_one(audio_path: str, config: dict, repeat: int) -> dict:
+    """在当前进程中运行一种配置（由子进程调用），返回耗时、内存与识别文本"""
+    from meeting.asr import recognize
+    from meeting.asr_batch import audio_duration
+    from meeting.asr_parallel import recognize_parallel, shutdown_executor
+
+    if config["mode"] == "generate":
+        func = lambda: recognize(audio_path)
+    else:
+        func = lambda: recognize_parallel(audio_path, config["workers"], config["threads"],
+                                          backend=config["backend"])
+    start = time.perf_counter()
+    sentence_info = func()
+    cold = time.perf_counter() - start
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        sentence_info = func()
+        warm.append(time.perf_counter() - start)
+    shutdown_executor()
+    return {
+        "cold_seconds": round(cold, 3),
+        "warm_seconds": round(min(warm) if warm else cold, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_peak_rss_mb": children_peak_rss_mb(),
+        "sentences": len(sentence_info),
+        "audio_seconds": audio_duration(audio_path, sentence_info),
+        "text": sentence_text(sentence_info),
+    }
+
+
+def config_env(config: dict) -> dict:
+    env = dict(os.environ, ASR_BACKEND=config["backend"])
+    if config["backend"] == "onnx":
+        env.update(ASR_ONNX_QUANTIZE="1" if config["quantize"] else "0",
+                   ASR_ONNX_INTRA_THREADS=str(config["threads"]),
+                   ASR_ONNX_INTER_THREADS=str(config["inter_threads"]))
+    return env
+
+
+def run_config(audio_path: str, config: dict, repeat: int) -> dict:
+    """在新的Python进程中运行一种配置"""
+    command = [sys.executable, "-m", "bench.asr_backends", audio_path,
+               "--run-one", json.dumps(config), "--repeat", str(repeat)]
+    completed = subprocess.run(command, env=config_env(config), capture_output=True, text=True, check=True)
+    # 最后一行是结果JSON，之前的输出来自模型加载日志
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compared_models() -> dict:
+    """各后端实际使用的模型：torch为MODEL_CONFIG，onnx为各模型的导出来源，torch_only为没有ONNX导出的模型"""
+    from meeting.asr import MODEL_CONFIG
+    from meeting.asr_backend import MODEL_KEYS, TORCH_ONLY_MODELS, onnx_model_source
+    torch_models = {name: f"{MODEL_CONFIG[key]} {MODEL_CONFIG[f'{key}_revision']}" for name, key in MODEL_KEYS.items()}
+    onnx_models = {}
+    for name in MODEL_KEYS:
+        try:
+            model, revision = onnx_model_source(name)
+            onnx_models[name] = f"{model} {revision}" if revision else model
+        except ValueError as e:
+            onnx_models[name] = f"无ONNX导出: {e}"
+    return {"torch": torch_models, "onnx": onnx_models, "torch_only": TORCH_ONLY_MODELS}
+
+
+def backend_configs(workers: int, intra_threads: list, inter_threads: list) -> list:
+    configs = [
+        {"name": "torch generate", "mode": "generate", "backend": "torch", "workers": 1, "threads": 0},
+        {"name": "torch segmented", "mode": "segmented", "backend": "torch", "workers": workers, "threads": 0},
+    ]
+    for quantize in (False, True):
+        for intra in intra_threads:
+            for inter in inter_threads:
+                configs.append({"name": f"onnx {'int8' if quantize else 'fp32'} {intra}x{inter}",
+                                "mode": "segmented", "backend": "onnx", "workers": workers,
+                                "threads": intra, "inter_threads": inter, "quantize": quantize})
+    return configs
+
+
+def bench_backends(audio_path: str, workers: int, intra_threads: list, inter_threads: list,
+                   repeat: int = 1) -> dict:
+    rows, reference, duration = [], None, 0.0
+    for config in backend_configs(workers, intra_threads, inter_threads):
+        print(f"运行 {config['name']} ...")
+        try:
+            result = run_config(audio_path, config, repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{config['name']} 失败: {e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e}")
+            rows.append({**config, "error": True})
+            continue
+        text = result.pop("text")
+        duration = result.pop("audio_seconds") or duration
+        if config["mode"] == "generate":
+            reference = text
+        rows.append({**config, **result,
+                     "rtf": round(result["warm_seconds"] / duration, 4) if duration else 0.0,
+                     "char_diff_rate": round(char_diff_rate(reference, text), 4) if reference is not None else None})
+    return {
+        "commit": git_commit(),
+        "audio": audio_path,
+        "audio_seconds": round(duration, 3),
+        "cpu_count": os.cpu_count(),
+        "models": compared_models(),
+        "results": rows,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="语音识别后端基准")
+    parser.add_argument("audio_path", nargs="?", default="dataset/interview.m4a")
+    parser.add_argument("--workers", type=int, default=2, help="分段识别的进程数")
+    parser.add_argument("--intra", default="4", help="ONNX算子内线程数，逗号分隔")
+    parser.add_argument("--inter", default="1", help="ONNX算子间线程数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=1, help="热启动运行次数，取最小值")
+    parser.add_argument("--output", default="", help="结果JSON文件（默认 output/bench/asr_backends_<提交>.json）")
+    parser.add_argument("--run-one", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        print(json.dumps(run_one(args.audio_path, json.loads(args.run_one), args.repeat), ensure_ascii=False))
+        sys.exit(0)
+
+    report = bench_backends(args.audio_path, args.workers, [int(t) for t in args.intra.split(",")],
+                            [int(t) for t in args.inter.split(",")], args.repeat)
+    output = args.output or os.path.join("output", "bench", f"asr_backends_{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    print(f"\n音频时长 {report['audio_seconds']:.1f}秒, CPU核数 {report['cpu_count']}")
+    models = report["models"]
+    for name in models["torch"]:
+        print(f"{name}模型: torch {models['torch'][name]} / onnx {models['onnx'][name]}")
+    for name, model in models["torch_only"].items():
+        print(f"{name}模型: {model} 没有ONNX导出，两种后端都使用PyTorch版本")
+    print(f"{'配置':<22}{'冷启动(秒)':>12}{'热启动(秒)':>12}{'RTF':>10}{'主进程(MB)':>12}{'工作进程(MB)':>14}{'字符差异':>10}")
+    for row in report["results"]:
+        if row.get("error"):
+            print(f"{row['name']:<22}{'失败':>12}")
+            continue
+        print(f"{row['name']:<22}{row['cold_seconds']:>12.2f}{row['warm_seconds']:>12.2f}{row['rtf']:>10.4f}"
+              f"{row['peak_rss_mb']:>12.1f}{row['worker_peak_rss_mb']:>14.1f}"
+              f"{row['char_diff_rate'] if row['char_diff_rate'] is not None else float('nan'):>10.2%}")
+    print(f"结果已写入 {output}")
@@ -0,0 +1,100 @@
+"""
+语音识别实时率（RTF）基准：对比整文件识别（model.generate）与不同进程数的并行识别
+
+RTF = 识别耗时 / 音频时长，越小越快。每种配置先运行一次（含模型加载，记为冷启动），
+再运行repeat次取中位数作为热启动耗时；并给出与整文件识别结果的字符相似度，便于确认并行识别的结果可用
+
+用法：python -m bench.asr_rtf dataset/interview.m4a --workers 1,2,4,8
+"""
+import argparse
+import difflib
+import json
+import os
+import statistics
+import time
+
+from bench.run_bench import git_commit, peak_rss_mb
+from meeting.asr import recognize
+from meeting.asr_batch import audio_duration
+
+
+def sentence_text(sentence_info: list) -> str:
+    return "".join(sentence["text"] for sentence in sentence_info)
+
+
+def timed_runs(func, repeat: int) -> tuple:
+    """返回(冷启动耗时, 热启动耗时中位数, 最后一次的结果)"""
+    start = time.perf_counter()
+    result = func()
+    cold = time.perf_counter() - start
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        warm.append(time.perf_counter() - start)
+    return cold, statistics.median(warm) if warm else cold, result
+
+
+def bench_rtf(audio_path: str, worker_counts: list, threads_per_worker: int = 0, repeat: int = 1) -> dict:
+    from meeting.asr_parallel import default_threads, recognize_parallel, shutdown_executor
+
+    rows = []
+    cold, warm, baseline = timed_runs(lambda: recognize(audio_path), repeat)
+    duration = audio_duration(audio_path, baseline)
+    baseline_text = sentence_text(baseline)
+    rows.append({"mode": "generate", "workers": 1, "threads_per_worker": 0,
+                 "cold_seconds": round(cold, 3), "warm_seconds": round(warm, 3),
+                 "rtf": round(warm / duration, 4), "sentences": len(baseline),
+                 "speakers": len({s["spk"] for s in baseline}), "text_similarity": 1.0})
+    print(f"整文件识别: {warm:.2f}秒, RTF {warm / duration:.4f}")
+
+    for workers in worker_counts:
+        threads = threads_per_worker or default_threads(workers)
+        cold, warm, sentence_info = timed_runs(
+            lambda: recognize_parallel(audio_path, workers, threads), repeat)
+        # 释放本配置的进程池，避免影响下一配置的内存与CPU
+        shutdown_executor()
+        similarity = difflib.SequenceMatcher(None, baseline_text, sentence_text(sentence_info),
+                                             autojunk=False).ratio()
+        rows.append({"mode": "parallel", "workers": workers, "threads_per_worker": threads,
+                     "cold_seconds": round(cold, 3), "warm_seconds": round(warm, 3),
+                     "rtf": round(warm / duration, 4), "sentences": len(sentence_info),
+                     "speakers": len({s["spk"] for s in sentence_info}),
+                     "text_similarity": round(similarity, 4)})
+        print(f"并行识别 {workers}进程x{threads}线程: {warm:.2f}秒, RTF {warm / duration:.4f}, "
+              f"文本相似度 {similarity:.4f}")
+
+    for row in rows:
+        row["speedup"] = round(rows[0]["warm_seconds"] / row["warm_seconds"], 2) if row["warm_seconds"] else 0.0
+    return {
+        "commit": git_commit(),
+        "audio": audio_path,
+        "audio_seconds": round(duration, 3),
+        "cpu_count": os.cpu_count(),
+        "peak_rss_mb": peak_rss_mb(),
+        "results": rows,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="语音识别实时率基准")
+    parser.add_argument("audio_path", nargs="?", default="dataset/interview.m4a")
+    parser.add_argument("--workers", default="1,2,4", help="并行识别的进程数，逗号分隔")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="每个进程的计算线程数，0为平分CPU核数")
+    parser.add_argument("--repeat", type=int, default=1, help="热启动运行次数，取中位数")
+    parser.add_argument("--output", default="", help="结果JSON文件（默认 output/bench/asr_rtf_<提交>.json）")
+    args = parser.parse_args()
+
+    report = bench_rtf(args.audio_path, [int(w) for w in args.workers.split(",")],
+                       args.threads_per_worker, args.repeat)
+    output = args.output or os.path.join("output", "bench", f"asr_rtf_{report['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    print(f"\n音频时长 {report['audio_seconds']:.1f}秒, CPU核数 {report['cpu_count']}")
+    print(f"{'方式':<10}{'进程':>6}{'线程':>6}{'冷启动(秒)':>12}{'热启动(秒)':>12}{'RTF':>10}{'加速比':>8}{'相似度':>8}")
+    for row in report["results"]:
+        print(f"{row['mode']:<10}{row['workers']:>6}{row['threads_per_worker']:>6}{row['cold_seconds']:>12.2f}"
+              f"{row['warm_seconds']:>12.2f}{row['rtf']:>10.4f}{row['speedup']:>8.2f}{row['text_similarity']:>8.4f}")
+    print(f"结果已写入 {output}")
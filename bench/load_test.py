@@ -0,0 +1,116 @@
+"""
+接口并发压测：在本地启动一个模拟DeepSeek上游和待测服务，
+按不同并发度发送请求，输出吞吐量与延迟，验证单进程可同时服务多个会议
+
+用法：python -m bench.load_test --app summary --latency 1.0 --concurrency 1,4,16,64
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+
+from bench.mock_server import start_mock_server
+
+SAMPLE_TEXT = (
+    "日期：2025-08-26\n"
+    "00:05 发言人1: 大家好，我们开始今天的会议\n"
+    "00:15 发言人2: 我先介绍一下项目进度\n"
+    "05:30 发言人1: 这个方案需要修改\n"
+    "12:45 发言人3: 我同意这个观点\n"
+    "18:20 发言人2: 预算方面可能有问题\n"
+    "25:10 发言人1: 我们下次会议再讨论细节"
+)
+
+APPS = {
+    "preprocess": ("meeting.preprocess", "/preprocess"),
+    "summary": ("meeting.summary", "/summary"),
+    "introduction": ("meeting.introduction", "/introduction"),
+}
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """最近秩法计算百分位数"""
+    index = max(0, math.ceil(len(sorted_values) * pct / 100) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def start_app(module_name: str, port: int):
+    """在后台线程中以uvicorn运行待测服务"""
+    import importlib
+    import uvicorn
+
+    app = importlib.import_module(module_name).app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_level(url: str, payload: dict, concurrency: int, requests_per_level: int) -> dict:
+    """以固定并发度发送请求，统计吞吐与延迟"""
+    import httpx
+
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, json=payload)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests_per_level)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests_per_level,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(requests_per_level / wall, 2),
+        "p50_seconds": round(percentile(latencies, 50), 3),
+        "p95_seconds": round(percentile(latencies, 95), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会议接口并发压测")
+    parser.add_argument("--app", choices=sorted(APPS), default="summary")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟上游每次调用的延迟（秒）")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="逗号分隔的并发度列表")
+    parser.add_argument("--requests", type=int, default=0, help="每个并发度的请求数，默认为并发度的2倍")
+    parser.add_argument("--upstream-port", type=int, default=18001)
+    parser.add_argument("--app-port", type=int, default=18002)
+    args = parser.parse_args()
+
+    # 必须在导入meeting模块前设置，使客户端指向模拟上游
+    os.environ["DEFAULT_API_KEY"] = os.environ.get("DEFAULT_API_KEY") or "load-test"
+    os.environ["DEEPSEEK_ENDPOINT"] = f"http://127.0.0.1:{args.upstream_port}/chat/completions"
+
+    start_mock_server(args.upstream_port, args.latency)
+    module_name, path = APPS[args.app]
+    start_app(module_name, args.app_port)
+
+    url = f"http://127.0.0.1:{args.app_port}{path}"
+    payload = {"meeting_text": SAMPLE_TEXT}
+    print(f"压测 {url}，上游延迟 {args.latency}s")
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        total = args.requests or level * 2
+        result = asyncio.run(run_level(url, payload, level, total))
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+本地模拟DeepSeek /chat/completions 接口：延迟、抖动、错误率可配置，
+按请求的系统提示词（prompt/*.txt）返回与之输出格式一致的固定内容，无需API密钥与网络即可运行各模块
+请求体含 stream=true 时以SSE分段返回（先推理内容后回答，延迟分摊到各段）
+设置max_concurrency后，超出并发容量的请求返回429并带Retry-After，模拟上游限流
+可按模型设置不同延迟；给定录制文件（bench.routing --record生成）时，与录制请求相同的请求按录制的响应与耗时回放
+
+用法：python -m bench.mock_server --port 18001 --latency 0.5 --jitter 0.2 --error-rate 0.05 --max-concurrency 4
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from meeting.tokenizer import estimate_tokens
+
+PROMPT_DIR = "prompt"
+
+CHAPTER_SUMMARY = (
+    "会议围绕项目进度与预算安排展开讨论。发言人介绍了当前阶段的工作进展及存在的问题，"
+    "与会人员就方案修改、资源协调与后续计划交换了意见，明确了相关工作的负责人员与时间节点，"
+    "并约定在后续会议中继续跟进落实情况。"
+)
+
+KEY_POINTS = [
+    {"point": "修改项目方案", "overview": "会议明确需对现有方案进行修改，由项目组牵头整理修改意见并在下次会议前提交。"},
+    {"point": "核实预算安排", "overview": "会议指出预算方面可能存在问题，由财务相关人员核实后反馈。"},
+]
+
+
+def _json_content(value: dict) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _meeting_date(user_input: str) -> str:
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', user_input)
+    return match.group(1) if match else ""
+
+
+def reply_preprocess(user_input: str) -> str:
+    # 原样返回待处理文本（不含上文），相当于"已清洗"的结果
+    # 延迟导入：meeting.preprocess会读取接口配置，调用方需先设置好环境变量
+    from meeting.preprocess import CONTENT_MARKER
+    if CONTENT_MARKER in user_input:
+        return user_input.split(CONTENT_MARKER + "\n", 1)[-1]
+    return user_input
+
+
+def reply_summary(user_input: str) -> str:
+    return _json_content({
+        "subject": "项目进度与预算讨论会",
+        "date": _meeting_date(user_input),
+        "participants": ["张三", "李四"],
+        "tasks": [{"id": 1, "topic": "汇报项目进度", "reporter": "张三"}],
+        "decisions": [{"description": "修改项目方案", "plan": "由项目组整理修改意见",
+                       "executor": "李四", "due_date": ""}],
+    })
+
+
+def reply_segment(user_input: str) -> str:
+    return "讨论议题：汇报项目进度\n决策事项：修改项目方案\n参会人员：张三、李四\n关键信息：无"
+
+
+def reply_introduction(user_input: str) -> str:
+    first = re.search(r'^(\d+:\d{2}) ', user_input, re.MULTILINE)
+    return _json_content({
+        "keywords": "项目进度 方案修改 预算核实",
+        "conclusion": CHAPTER_SUMMARY,
+        "chapter_overview": [{"timestamp": first.group(1) if first else "未知",
+                              "title": "汇报项目进度", "detailed_summary": CHAPTER_SUMMARY}],
+        "key_points_review": KEY_POINTS,
+    })
+
+
+def reply_chapter(user_input: str) -> str:
+    return _json_content({"title": "讨论项目进度与预算", "detailed_summary": CHAPTER_SUMMARY})
+
+
+def reply_overall(user_input: str) -> str:
+    return _json_content({
+        "keywords": "项目进度 方案修改 预算核实",
+        "conclusion": CHAPTER_SUMMARY,
+        "key_points_review": KEY_POINTS,
+    })
+
+
+# 提示词文件 -> 回复生成函数
+REPLIES = {
+    "preprocess.txt": reply_preprocess,
+    "summary.txt": reply_summary,
+    "summary_map.txt": reply_segment,
+    "summary_reduce.txt": reply_segment,
+    "introduction.txt": reply_introduction,
+    "introduction_chapter.txt": reply_chapter,
+    "introduction_overall.txt": reply_overall,
+}
+
+
+def load_prompt_replies(prompt_dir: str = PROMPT_DIR) -> dict:
+    """系统提示词全文 -> 回复生成函数，未知提示词原样回显输入"""
+    replies = {}
+    for name, reply in REPLIES.items():
+        path = os.path.join(prompt_dir, name)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                replies[f.read()] = reply
+    return replies
+
+
+def recording_key(payload: dict) -> str:
+    """录制请求的键：请求体去掉stream字段（流式与非流式请求回放同一条录制）"""
+    # 延迟导入：调用方可能在导入本模块之后才设置缓存相关的环境变量
+    from meeting.cache import make_key
+    return make_key({name: value for name, value in payload.items() if name != "stream"})
+
+
+def load_recordings(path: str) -> dict:
+    """读取录制文件（每行 {"request", "response", "latency"}），返回 键 -> 录制"""
+    recordings = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[recording_key(record["request"])] = record
+    return recordings
+
+
+def parse_model_latency(value: str) -> dict:
+    """解析 "模型=秒数,模型=秒数" """
+    latencies = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        model, _, seconds = item.partition("=")
+        latencies[model.strip()] = float(seconds)
+    return latencies
+
+
+class MockStats:
+    """
+    模拟上游的调用统计，线程安全：各处理线程并发更新，所有计数都在同一把锁内修改
+    请求数在到达时与并发数一起登记，负载下任意时刻的快照都满足 requests = 已完成 + in_flight + throttled
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def enter(self, capacity: int = 0) -> bool:
+        """登记一次请求并占用一个并发位置；超出容量（capacity>0时）记为限流并返回False"""
+        with self._lock:
+            self.requests += 1
+            if capacity and self.in_flight >= capacity:
+                self.throttled += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record(self, error: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """记录已登记请求的结果"""
+        with self._lock:
+            self.errors += int(error)
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "throttled": self.throttled,
+                    "in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight,
+                    "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    # 默认监听队列只有5，压测并发较高时连接在计数前即被重置
+    request_queue_size = 256
+    daemon_threads = True
+
+
+def start_mock_server(port: int, latency: float = 0.5, jitter: float = 0.0, error_rate: float = 0.0,
+                      seed: int = None, prompt_dir: str = PROMPT_DIR, max_concurrency: int = 0,
+                      retry_after: float = 1.0, token_latency: float = 0.0, model_latency: dict = None,
+                      recordings: dict = None) -> ThreadingHTTPServer:
+    """
+    在后台线程中启动模拟上游
+    :param latency: 每次调用的平均延迟（秒）
+    :param jitter: 延迟在[latency-jitter, latency+jitter]内均匀分布
+    :param error_rate: 返回500（可重试错误）的概率
+    :param max_concurrency: 同时处理的请求数上限，超出时返回429，0表示不限制
+    :param retry_after: 429响应的Retry-After秒数
+    :param token_latency: 每千token（输入+输出）额外增加的延迟（秒），模拟耗时随输入长度增长
+    :param model_latency: 模型 -> 平均延迟（秒），未列出的模型使用latency
+    :param recordings: load_recordings的结果，命中的请求按录制的响应与耗时回放
+    :return: 服务对象，调用统计在其stats属性中
+    """
+    replies = load_prompt_replies(prompt_dir)
+    stats = MockStats()
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            messages = payload.get("messages", [])
+            system_prompt = next((m["content"] for m in messages if m.get("role") == "system"), "")
+            user_input = next((m["content"] for m in messages if m.get("role") == "user"), "")
+
+            if not stats.enter(max_concurrency):
+                self._send(429, {"error": {"message": "mock rate limit exceeded"}},
+                           {"Retry-After": f"{retry_after:g}"})
+                return
+            try:
+                self._handle(payload, system_prompt, user_input)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 调用方已取消请求（如超出延迟预算改用备用模型）
+            finally:
+                stats.leave()
+
+        def _handle(self, payload: dict, system_prompt: str, user_input: str):
+            base_latency = (model_latency or {}).get(payload.get("model"), latency)
+            with rng_lock:
+                delay = max(0.0, base_latency + rng.uniform(-jitter, jitter))
+                failed = rng.random() < error_rate
+
+            record = recordings.get(recording_key(payload)) if recordings else None
+            if record is not None:
+                self._reply(payload, record["response"], record["latency"])
+                return
+
+            if failed:
+                time.sleep(delay)
+                stats.record(error=True)
+                self._send(500, {"error": {"message": "mock upstream error"}})
+                return
+            content = replies.get(system_prompt, reply_preprocess)(user_input)
+            usage = {"prompt_tokens": estimate_tokens(system_prompt + user_input),
+                     "completion_tokens": estimate_tokens(content)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            delay += token_latency * usage["total_tokens"] / 1000
+            self._reply(payload, {
+                "model": payload.get("model", ""),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            }, delay)
+
+        def _reply(self, payload: dict, result: dict, delay: float):
+            usage = result.get("usage") or {}
+            stats.record(prompt_tokens=usage.get("prompt_tokens", 0),
+                         completion_tokens=usage.get("completion_tokens", 0))
+            if payload.get("stream"):
+                content = next((choice["message"].get("content") or "" for choice in result.get("choices", [])), "")
+                self._stream(content, usage, delay)
+                return
+            time.sleep(delay)
+            self._send(200, result)
+
+        def _stream(self, content: str, usage: dict, delay: float, pieces: int = 10):
+            """以分块传输编码发送SSE：一段推理内容，随后回答内容分为pieces段"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            size = max(1, -(-len(content) // pieces))
+            deltas = [{"reasoning_content": "分析会议内容。"}]
+            deltas += [{"content": content[i:i + size]} for i in range(0, len(content), size)]
+            for delta in deltas:
+                time.sleep(delay / len(deltas))
+                self._write_chunk({"choices": [{"index": 0, "delta": delta}]})
+            self._write_chunk({"choices": [], "usage": usage})
+            self._write_chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, data):
+            text = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+            body = f"data: {text}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+            self.wfile.flush()
+
+        def _send(self, status: int, data: dict, headers: dict = None):
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = MockHTTPServer(("127.0.0.1", port), Handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟DeepSeek对话接口")
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--latency", type=float, default=0.5, help="平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动幅度（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="并发容量，超出时返回429（0为不限制）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429响应的Retry-After秒数")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="每千token额外增加的延迟（秒）")
+    parser.add_argument("--model-latency", default="", help="按模型的平均延迟，如 deepseek-chat=0.3,deepseek-reasoner=2")
+    parser.add_argument("--recordings", default="", help="录制文件，相同请求按录制的响应与耗时回放")
+    args = parser.parse_args()
+
+    start_mock_server(args.port, args.latency, args.jitter, args.error_rate, args.seed,
+                      max_concurrency=args.max_concurrency, retry_after=args.retry_after,
+                      token_latency=args.token_latency, model_latency=parse_model_latency(args.model_latency),
+                      recordings=load_recordings(args.recordings) if args.recordings else None)
+    print(f"模拟上游已启动: http://127.0.0.1:{args.port}/chat/completions")
+    print("设置 DEEPSEEK_ENDPOINT 指向该地址后运行各模块，按Ctrl+C退出")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
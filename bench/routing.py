@@ -0,0 +1,196 @@
+"""
+模型路由基准：用同一份会议文本依次运行各路由方案（预处理 -> 摘要 -> 导读），
+对比各阶段耗时、改用备用模型的次数，以及输出相对第一个方案（基准）的差异
+
+上游有三种：
+- 模拟上游（默认）：按 --model-latency 为各模型设置延迟，输出与模型无关，只比较耗时
+- --record FILE：调用真实接口（DEEPSEEK_ENDPOINT），并将每次请求、响应与耗时录制到FILE
+- --replay FILE：模拟上游按录制的响应与耗时回放（未录制的请求使用模拟回复），可离线重复对比真实输出差异
+
+用法：python -m bench.routing --model-latency deepseek-chat=0.3,deepseek-reasoner=2 --budget 1
+      python -m bench.routing --routes schemes.json   # {方案名: 路由配置（格式同LLM_ROUTES）}
+"""
+import argparse
+import difflib
+import json
+import os
+import threading
+import time
+
+from bench.mock_server import load_recordings, parse_model_latency, start_mock_server
+from bench.run_bench import git_commit, quiet
+
+
+def default_schemes(budget: float) -> dict:
+    """基准方案（全部使用推理模型）与几种常见的路由方案"""
+    chat = {"model": "deepseek-chat"}
+    return {
+        "reasoner": {},
+        "chat-preprocess": {"preprocess": {"model": "deepseek-chat", "temperature": 0.2}},
+        "chat-all": {
+            "default": chat,
+            # 摘要与导读的提示词要求JSON输出，可使用JSON格式；分段总结为纯文本
+            "summary": dict(chat, json=True), "summary.map": chat, "summary.reduce": chat,
+            "introduction": dict(chat, json=True),
+        },
+        "fallback": {"default": {"model": "deepseek-reasoner", "fallback_model": "deepseek-chat",
+                                 "latency_budget": budget}},
+    }
+
+
+def record_calls(client, path: str):
+    """录制客户端的每次请求：在发送请求的方法外层记录请求体、响应与耗时"""
+    lock = threading.Lock()
+    post, apost = client._post, client._apost
+
+    def write(data: dict, result: dict, start: float):
+        line = json.dumps({"request": data, "response": result,
+                           "latency": round(time.perf_counter() - start, 3)}, ensure_ascii=False)
+        with lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    def recorded_post(headers: dict, data: dict) -> dict:
+        start = time.perf_counter()
+        result = post(headers, data)
+        write(data, result, start)
+        return result
+
+    async def recorded_apost(headers: dict, data: dict) -> dict:
+        start = time.perf_counter()
+        result = await apost(headers, data)
+        write(data, result, start)
+        return result
+
+    client._post, client._apost = recorded_post, recorded_apost
+
+
+def similarity(a, b) -> float:
+    """两个输出的字符相似度，JSON结果按排序后的键序列化后比较"""
+    if not isinstance(a, str):
+        a, b = (json.dumps(value, ensure_ascii=False, sort_keys=True) for value in (a, b))
+    return round(difflib.SequenceMatcher(None, a, b, autojunk=False).ratio(), 4)
+
+
+def run_scheme(text: str, summary_mode: str, intro_mode: str, verbose: bool) -> tuple:
+    """运行一遍预处理、摘要与导读，返回(各阶段耗时, 各阶段输出)"""
+    from meeting.introduction import generate_intro
+    from meeting.preprocess import preprocess_text
+    from meeting.summary import generate_summary
+    from meeting.transcript import parse_transcript
+
+    seconds, outputs = {}, {}
+    with quiet(not verbose):
+        start = time.perf_counter()
+        outputs["preprocess"] = preprocess_text(text, max_tokens=2000, overlap_lines=2)
+        seconds["preprocess"] = time.perf_counter() - start
+        transcript = parse_transcript(outputs["preprocess"])
+
+        start = time.perf_counter()
+        outputs["summary"] = generate_summary(outputs["preprocess"], 30, mode=summary_mode, transcript=transcript)
+        seconds["summary"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        outputs["introduction"] = generate_intro(outputs["preprocess"], 25, mode=intro_mode, transcript=transcript)
+        seconds["introduction"] = time.perf_counter() - start
+    return {stage: round(value, 3) for stage, value in seconds.items()}, outputs
+
+
+def bench_routing(text: str, schemes: dict, summary_mode: str, intro_mode: str,
+                  upstream=None, verbose: bool = False) -> dict:
+    from meeting.routing import set_routes
+
+    rows, baseline = [], None
+    for name, config in schemes.items():
+        router = set_routes(config)
+        before = upstream.stats.snapshot() if upstream else None
+        print(f"运行方案 {name} ...")
+        try:
+            seconds, outputs = run_scheme(text, summary_mode, intro_mode, verbose)
+        except Exception as e:
+            print(f"方案 {name} 失败: {e}")
+            rows.append({"scheme": name, "routes": config, "error": str(e)})
+            continue
+        baseline = baseline or outputs
+        row = {
+            "scheme": name,
+            "routes": config,
+            "seconds": seconds,
+            "total_seconds": round(sum(seconds.values()), 3),
+            "fallbacks": dict(router.fallbacks),
+            "similarity": {stage: similarity(baseline[stage], outputs[stage]) for stage in outputs},
+            "error": None,
+        }
+        if upstream:
+            after = upstream.stats.snapshot()
+            row["upstream_calls"] = after["requests"] - before["requests"]
+            row["prompt_tokens"] = after["prompt_tokens"] - before["prompt_tokens"]
+        rows.append(row)
+    return {"commit": git_commit(), "summary_mode": summary_mode, "intro_mode": intro_mode, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型路由基准")
+    parser.add_argument("input", nargs="?", default="output/interview.txt", help="会议文本")
+    parser.add_argument("--routes", default="", help="方案文件：{方案名: 路由配置}，默认使用内置方案")
+    parser.add_argument("--budget", type=float, default=1.0, help="内置fallback方案的延迟预算（秒）")
+    parser.add_argument("--summary-mode", default="map_reduce", help="摘要模式")
+    parser.add_argument("--intro-mode", default="per_chapter", help="导读模式")
+    parser.add_argument("--model-latency", default="deepseek-chat=0.3,deepseek-reasoner=2",
+                        help="模拟上游按模型的平均延迟（秒）")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟上游未列出模型的平均延迟（秒）")
+    parser.add_argument("--record", default="", help="调用真实接口并录制到该文件")
+    parser.add_argument("--replay", default="", help="按录制文件回放")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="回放加速倍数（录制耗时除以该值）")
+    parser.add_argument("--upstream-port", type=int, default=18201)
+    parser.add_argument("--output", default="", help="结果文件，默认 output/bench/routing_<提交>.json")
+    parser.add_argument("--verbose", action="store_true", help="显示被测模块的进度输出")
+    args = parser.parse_args()
+
+    # 接口与缓存配置在导入meeting模块时读取，需先设置；响应缓存会掩盖各方案的真实耗时
+    os.environ["LLM_CACHE"] = "0"
+    upstream = None
+    if not args.record:
+        os.environ["DEFAULT_API_KEY"] = os.environ.get("DEFAULT_API_KEY") or "bench"
+        os.environ["DEEPSEEK_ENDPOINT"] = f"http://127.0.0.1:{args.upstream_port}/chat/completions"
+        recordings = None
+        if args.replay:
+            recordings = load_recordings(args.replay)
+            for record in recordings.values():
+                record["latency"] /= args.replay_speed
+        upstream = start_mock_server(args.upstream_port, args.latency, model_latency=parse_model_latency(
+            args.model_latency), recordings=recordings)
+
+    from meeting.llm_client import get_client
+    if args.record:
+        os.makedirs(os.path.dirname(args.record) or ".", exist_ok=True)
+        record_calls(get_client(), args.record)
+
+    if args.routes:
+        with open(args.routes, 'r', encoding='utf-8') as f:
+            schemes = json.load(f)
+    else:
+        schemes = default_schemes(args.budget)
+    with open(args.input, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    report = bench_routing(text, schemes, args.summary_mode, args.intro_mode, upstream, args.verbose)
+    report.update(input=args.input, upstream="real" if args.record else "replay" if args.replay else "mock")
+    output = args.output or os.path.join("output", "bench", f"routing_{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2))
+
+    print(f"\n{'方案':<18}{'预处理(秒)':>12}{'摘要(秒)':>10}{'导读(秒)':>10}{'合计(秒)':>10}{'备用':>6}  相似度(预处理/摘要/导读)")
+    for row in report["results"]:
+        if row["error"]:
+            print(f"{row['scheme']:<18}失败: {row['error']}")
+            continue
+        s, sim = row["seconds"], row["similarity"]
+        print(f"{row['scheme']:<18}{s['preprocess']:>12.2f}{s['summary']:>10.2f}{s['introduction']:>10.2f}"
+              f"{row['total_seconds']:>10.2f}{sum(row['fallbacks'].values()):>6}  "
+              f"{sim['preprocess']:.3f}/{sim['summary']:.3f}/{sim['introduction']:.3f}")
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main()
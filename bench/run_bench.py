@@ -0,0 +1,260 @@
+"""
+离线基准测试：在本地模拟DeepSeek上游，用合成会议文本（10行至1万行）在不同并发度下测试
+preprocess_text、generate_summary、generate_intro与各FastAPI接口，结果写入JSON文件，便于跨提交对比
+
+用法：python -m bench.run_bench --sizes 10,100,1000,10000 --concurrency 1,4,16
+      python -m bench.run_bench --compare output/bench/old.json output/bench/new.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from bench.load_test import APPS, percentile, run_level, start_app
+from bench.mock_server import start_mock_server
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHRASES = [
+    "我先介绍一下项目的整体进度", "这个方案还需要再修改一下", "预算方面可能有点问题",
+    "嗯那个我们下周再确认一下时间", "测试环境已经部署完成了", "就是就是这个接口的性能还不太够",
+    "我同意这个观点", "数据迁移计划在月底之前完成", "客户那边反馈了几个新的需求",
+    "啊这个需要跟财务部再核实一下", "我们下次会议再讨论细节", "服务器的配置需要升级",
+]
+
+
+def synthetic_transcript(num_lines: int, seed: int = 0, speakers: int = 4) -> str:
+    """生成 "MM:SS 发言人N: 内容" 格式的合成会议文本，相同参数生成的文本相同"""
+    rng = random.Random(seed)
+    lines = ["日期：2025-08-26"]
+    seconds = 0
+    for _ in range(num_lines):
+        seconds += rng.randint(2, 15)
+        sentence = "，".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 3)))
+        lines.append(f"{seconds // 60:02d}:{seconds % 60:02d} 发言人{rng.randint(1, speakers)}: {sentence}")
+    return "\n".join(lines)
+
+
+def peak_rss_mb() -> float:
+    """进程启动以来的峰值常驻内存（MB），不支持时返回0"""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool = True):
+    """屏蔽被测模块的逐块进度输出"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def function_cases() -> dict:
+    """函数级测试项：名称 -> func(meeting_text, concurrency)，在设置好环境变量后导入"""
+    from meeting.introduction import aper_chapter_intro, generate_intro
+    from meeting.llm_client import run_async
+    from meeting.preprocess import preprocess_text
+    from meeting.summary import amap_reduce_summary, generate_summary
+
+    return {
+        "preprocess_text": lambda text, c: preprocess_text(text, max_concurrency=c,
+                                                           max_tokens=2000, overlap_lines=2),
+        "generate_summary.single": lambda text, c: generate_summary(text, 30, mode="single"),
+        "generate_summary.map_reduce": lambda text, c: run_async(
+            amap_reduce_summary(text, 30, max_concurrency=c)),
+        "generate_intro.single": lambda text, c: generate_intro(text, 25, mode="single"),
+        "generate_intro.per_chapter": lambda text, c: run_async(
+            aper_chapter_intro(text, 25, max_concurrency=c)),
+    }
+
+# 与并发度无关的测试项，每个规模只在最低并发度下运行一次
+SEQUENTIAL_CASES = {"generate_summary.single", "generate_intro.single"}
+
+
+def bench_function(name: str, func, text: str, num_lines: int, concurrency: int,
+                   repeat: int, upstream) -> dict:
+    """重复调用repeat次，统计单次耗时分布、吞吐（行/秒）与上游调用次数"""
+    before = upstream.stats.snapshot()
+    latencies = []
+    error = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            func(text, concurrency)
+        except Exception as e:
+            error = str(e)
+            break
+        latencies.append(time.perf_counter() - start)
+    after = upstream.stats.snapshot()
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "case": name,
+        "kind": "function",
+        "lines": num_lines,
+        "concurrency": concurrency,
+        "runs": len(latencies),
+        "error": error,
+        "p50_seconds": round(percentile(latencies, 50), 4) if latencies else None,
+        "p95_seconds": round(percentile(latencies, 95), 4) if latencies else None,
+        "max_seconds": round(latencies[-1], 4) if latencies else None,
+        "throughput_lines_per_second": round(num_lines * len(latencies) / total, 1) if total else None,
+        "upstream_calls": (after["requests"] - before["requests"]) // max(1, len(latencies)),
+        "upstream_errors": after["errors"] - before["errors"],
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_endpoint(name: str, url: str, text: str, num_lines: int, concurrency: int,
+                   requests_per_level: int) -> dict:
+    result = asyncio.run(run_level(url, {"meeting_text": text}, concurrency, requests_per_level))
+    result.update({
+        "case": name,
+        "kind": "endpoint",
+        "lines": num_lines,
+        "throughput_lines_per_second": round(result["throughput_rps"] * num_lines, 1),
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    return result
+
+
+def run_suite(args) -> dict:
+    # 必须在导入meeting模块前设置：客户端指向模拟上游，关闭响应缓存以免重复运行直接命中
+    os.environ["DEFAULT_API_KEY"] = os.environ.get("DEFAULT_API_KEY") or "bench"
+    os.environ["DEEPSEEK_ENDPOINT"] = f"http://127.0.0.1:{args.upstream_port}/chat/completions"
+    os.environ["LLM_CACHE"] = "0"
+
+    upstream = start_mock_server(args.upstream_port, args.latency, args.jitter,
+                                 args.error_rate, args.seed)
+    sizes = [int(s) for s in args.sizes.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    selected = set(args.cases.split(",")) if args.cases else None
+    results = []
+
+    def report(result: dict):
+        results.append(result)
+        status = f"失败: {result['error']}" if result.get("error") else (
+            f"p50 {result['p50_seconds']}s, p95 {result['p95_seconds']}s, "
+            f"{result['throughput_lines_per_second']} 行/秒")
+        print(f"[{result['case']}] {result['lines']}行 并发{result['concurrency']}: {status}")
+
+    cases = function_cases()
+    for num_lines in sizes:
+        text = synthetic_transcript(num_lines, args.seed or 0)
+        for name, func in cases.items():
+            if selected and name not in selected:
+                continue
+            for level in levels[:1] if name in SEQUENTIAL_CASES else levels:
+                with quiet(not args.verbose):
+                    result = bench_function(name, func, text, num_lines, level, args.repeat, upstream)
+                report(result)
+
+    for app_index, (module_name, path) in enumerate(APPS[key] for key in sorted(APPS)):
+        name = f"api{path}"
+        if selected and name not in selected:
+            continue
+        with quiet(not args.verbose):
+            start_app(module_name, args.app_port + app_index)
+        url = f"http://127.0.0.1:{args.app_port + app_index}{path}"
+        for num_lines in sizes:
+            text = synthetic_transcript(num_lines, args.seed or 0)
+            for level in levels:
+                with quiet(not args.verbose):
+                    result = bench_endpoint(name, url, text, num_lines, level, args.requests or level * 2)
+                report(result)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "sizes": sizes,
+            "concurrency": levels,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "upstream": upstream.stats.snapshot(),
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    """按(测试项, 行数, 并发度)对比两次结果的p95与吞吐"""
+    with open(old_path, 'r', encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    old_results = {(r["case"], r["lines"], r["concurrency"]): r for r in old["results"]}
+    print(f"{old.get('commit') or old_path} -> {new.get('commit') or new_path}")
+    for result in new["results"]:
+        key = (result["case"], result["lines"], result["concurrency"])
+        before = old_results.get(key)
+        if before is None or not before.get("p95_seconds") or not result.get("p95_seconds"):
+            continue
+        p95_ratio = result["p95_seconds"] / before["p95_seconds"]
+        throughput_ratio = (result["throughput_lines_per_second"] or 0) / (
+            before["throughput_lines_per_second"] or 1)
+        print(f"  {key[0]} {key[1]}行 并发{key[2]}: p95 {before['p95_seconds']}s -> "
+              f"{result['p95_seconds']}s ({p95_ratio:.2f}x), 吞吐 {throughput_ratio:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会议智能体离线基准测试")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="逗号分隔的合成文本行数")
+    parser.add_argument("--concurrency", default="1,4,16", help="逗号分隔的并发度列表")
+    parser.add_argument("--cases", default="", help="逗号分隔的测试项，默认全部（如 preprocess_text,api/summary）")
+    parser.add_argument("--latency", type=float, default=0.2, help="模拟上游平均延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模拟上游延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模拟上游返回500的概率")
+    parser.add_argument("--repeat", type=int, default=3, help="函数级测试每项重复次数")
+    parser.add_argument("--requests", type=int, default=0, help="接口测试每个并发度的请求数，默认为并发度的2倍")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--upstream-port", type=int, default=18101)
+    parser.add_argument("--app-port", type=int, default=18102)
+    parser.add_argument("--output", default="", help="结果文件，默认 output/bench/bench_<提交>.json")
+    parser.add_argument("--verbose", action="store_true", help="显示被测模块的进度输出")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两次结果文件")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args)
+    output = args.output or os.path.join("output", "bench", f"bench_{report['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"结果已保存到 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,93 +1,193 @@
+import argparse
 import json
+import os
 import time  # 导入时间模块
+from functools import partial
+from meeting.pipeline import Pipeline
 from meeting.preprocess import preprocess_text
 from meeting.summary import generate_summary
 from meeting.introduction import generate_intro
-from meeting.asr import audio_to_text
+from meeting.asr import MODEL_CONFIG, asr_backend, asr_workers, audio_to_text, write_text_atomic
+from meeting.checkpoint import Checkpoint, checkpoint_dir, hash_file, llm_inputs
+from meeting.llm_client import get_client
+from meeting.preclean import get_cleaner, preclean_enabled, skip_clean_chunks
+from meeting.tracing import span, tracer
+from meeting.transcript import parse_transcript
 
-def main():
+def run_asr(audio_path, checkpoint, workers=0):
     # 1. 语音转文字（示例：处理音频文件）
-    try:
-        print("开始语音转文字...")
-        start_time = time.time()  # 记录开始时间
-        
-        meeting_text = audio_to_text("dataset/interview.m4a")  # 调用asr模块
-        
-        end_time = time.time()  # 记录结束时间
-        elapsed = end_time - start_time  # 计算耗时
-        print(f"语音转文字完成，内容长度: {len(meeting_text)}, 耗时: {elapsed:.2f}秒")
-        
-        # 将生成的文本保存到文件
-        # meeting_text_file = "output/meeting_text.txt"
-        # with open(meeting_text_file, 'w', encoding='utf-8') as f:
-        #     f.write(meeting_text)
-    except Exception as e:
-        print(f"语音转文字失败: {e}")
-        return
+    print("开始语音转文字...")
+    start_time = time.time()  # 记录开始时间
+
+    # 检查点目录已按音频内容区分，这里只需区分模型配置与识别方式
+    meeting_text, resumed = checkpoint.stage(
+        "asr", {"model": MODEL_CONFIG, "parallel": workers > 1, "backend": asr_backend},
+        lambda: audio_to_text(audio_path, workers=workers))  # 调用asr模块
+    if resumed:
+        write_text_atomic("output/interview.txt", meeting_text + '\n')
+        print("语音转文字: 使用检查点结果")
+
+    elapsed = time.time() - start_time  # 计算耗时
+    print(f"语音转文字完成，内容长度: {len(meeting_text)}, 耗时: {elapsed:.2f}秒")
+    return meeting_text
 
+def run_preprocess(checkpoint, meeting_text):
     # 2. 预处理文本
-    try:
-        print("开始文本预处理...")
-        start_time = time.time()  # 记录开始时间
-        
-        processed_text = preprocess_text(
-            meeting_text=meeting_text,
-            chunk_size=120  # 可自定义分块大小
-        )
-        
-        end_time = time.time()  # 记录结束时间
-        elapsed = end_time - start_time  # 计算耗时
-        print(f"预处理完成, 耗时: {elapsed:.2f}秒")
-        
-        # 将处理后的文本保存到文件
-        processed_text_file = "output/processed_text.txt"
-        with open(processed_text_file, 'w', encoding='utf-8') as f:
-            f.write(processed_text)
-    except Exception as e:
-        print(f"预处理失败: {e}")
-        return
+    print("开始文本预处理...")
+    start_time = time.time()  # 记录开始时间
+
+    params = dict(
+        max_tokens=2000,  # 每块的token预算
+        overlap_lines=2,  # 每块附带的上文行数
+        preclean=preclean_enabled,  # 分块前的本地规则清洗
+        skip_clean=skip_clean_chunks  # 规则清洗后已干净的块不调用模型
+    )
+    # 整体未完成时，已处理完的块仍会从块级检查点读取；
+    # 任一块失败时抛出异常（keep_failed=False），阶段结果不保存，重新运行时只重试失败的块
+    # 清洗规则（词表、短句合并上限）只影响阶段输入，不传给preprocess_text
+    rules = get_cleaner().identity() if preclean_enabled else None
+    processed_text, resumed = checkpoint.stage(
+        "preprocess", llm_inputs(meeting_text, preclean_rules=rules, **params),
+        lambda: preprocess_text(meeting_text=meeting_text, checkpoint=checkpoint, keep_failed=False, **params))
+    if resumed:
+        print("预处理: 使用检查点结果")
+
+    elapsed = time.time() - start_time  # 计算耗时
+    print(f"预处理完成, 耗时: {elapsed:.2f}秒")
+
+    # 将处理后的文本保存到文件
+    processed_text_file = "output/processed_text.txt"
+    with open(processed_text_file, 'w', encoding='utf-8') as f:
+        f.write(processed_text)
+    return processed_text
 
+def run_parse(processed_text):
+    # 解析一次会议文本，摘要与会议介绍共用同一份解析结果
+    transcript = parse_transcript(processed_text)
+    print(f"会议文本解析完成，有效发言 {len(transcript)} 条")
+    return transcript
+
+def run_summary(checkpoint, processed_text, transcript):
     # 3. 生成会议摘要
-    try:
-        print("开始生成会议摘要...")
-        start_time = time.time()  # 记录开始时间
-        
-        summary = generate_summary(
-            meeting_text=processed_text,
-            interval_minutes=30  # 时间间隔
-        )
-        
-        end_time = time.time()  # 记录结束时间
-        elapsed = end_time - start_time  # 计算耗时
-        print(f"摘要生成完成!, 耗时: {elapsed:.2f}秒")
-        
-        summary_file = "output/summary_text.txt"
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(summary, ensure_ascii=False, indent=2))
-    except Exception as e:
-        print(f"摘要生成失败: {e}")
-        return
+    print("开始生成会议摘要...")
+    start_time = time.time()  # 记录开始时间
+
+    params = dict(
+        interval_minutes=30,  # 时间间隔
+        mode="auto",  # 长会议自动改用分段总结
+    )
+    summary, resumed = checkpoint.stage(
+        "summary", llm_inputs(processed_text, **params),
+        lambda: generate_summary(meeting_text=processed_text, transcript=transcript,
+                                 checkpoint=checkpoint, **params))
+    if resumed:
+        print("摘要: 使用检查点结果")
+
+    elapsed = time.time() - start_time  # 计算耗时
+    print(f"摘要生成完成!, 耗时: {elapsed:.2f}秒")
 
+    summary_file = "output/summary_text.txt"
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+def run_intro(checkpoint, processed_text, transcript):
     # 4. 生成会议介绍
-    try:
-        print("开始生成会议介绍...")
-        start_time = time.time()  # 记录开始时间
-        
-        intro = generate_intro(
-            meeting_text=processed_text,
-            time_interval=25  # 章节间隔
-        )
-        
-        end_time = time.time()  # 记录结束时间
-        elapsed = end_time - start_time  # 计算耗时
-        print(f"会议介绍生成完成!, 耗时: {elapsed:.2f}秒")
-        
-        intro_file = "output/introduction_text.txt"
-        with open(intro_file, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(intro, ensure_ascii=False, indent=2))
-    except Exception as e:
-        print(f"会议介绍生成失败: {e}")
-        return
+    print("开始生成会议介绍...")
+    start_time = time.time()  # 记录开始时间
+
+    params = dict(
+        time_interval=25,  # 章节间隔
+        mode="per_chapter",  # 各章节按时间段并发生成
+    )
+    intro, resumed = checkpoint.stage(
+        "introduction", llm_inputs(processed_text, **params),
+        lambda: generate_intro(meeting_text=processed_text, transcript=transcript,
+                               checkpoint=checkpoint, **params))
+    if resumed:
+        print("会议介绍: 使用检查点结果")
+
+    elapsed = time.time() - start_time  # 计算耗时
+    print(f"会议介绍生成完成!, 耗时: {elapsed:.2f}秒")
+
+    intro_file = "output/introduction_text.txt"
+    with open(intro_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(intro, ensure_ascii=False, indent=2))
+    return intro
+
+STAGE_LABELS = {
+    "asr": "语音转文字",
+    "preprocess": "预处理",
+    "transcript": "文本解析",
+    "summary": "摘要生成",
+    "introduction": "会议介绍生成",
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="会议智能体")
+    parser.add_argument("--audio", default="dataset/interview.m4a", help="会议音频文件路径")
+    parser.add_argument("--sequential", action="store_true",
+                        help="按顺序逐个执行各阶段（默认并发执行互不依赖的阶段）")
+    parser.add_argument("--no-cache", action="store_true", help="不读取LLM响应缓存，全部重新调用")
+    parser.add_argument("--trace", default="", help="将各阶段的span以JSON Lines追加写入该文件")
+    parser.add_argument("--asr-workers", type=int, default=asr_workers,
+                        help="语音转文字的并行进程数，大于1时VAD分段后多进程识别")
+    parser.add_argument("--checkpoint-dir", default=checkpoint_dir, help="检查点目录，按音频内容哈希分子目录")
+    parser.add_argument("--no-resume", action="store_true", help="不读取已有检查点，全部阶段重新执行")
+    args = parser.parse_args()
+    # 检查点目录按音频内容哈希命名，需先确认文件存在
+    if not os.path.isfile(args.audio):
+        parser.error(f"音频文件 {args.audio} 不存在")
+
+    if args.trace:
+        tracer.configure(args.trace)
+
+    cache = get_client().cache
+    if cache is not None and args.no_cache:
+        cache.bypass = True
+
+    # 各阶段结果按输入保存为检查点，失败后重新运行从第一个缺失的部分继续
+    checkpoint = Checkpoint(os.path.join(args.checkpoint_dir, hash_file(args.audio)[:16]),
+                            resume=not args.no_resume)
+
+    # 摘要与会议介绍都只依赖预处理结果，输入就绪后并发执行
+    pipeline = Pipeline(max_workers=1 if args.sequential else 4)
+    pipeline.add("asr", partial(run_asr, args.audio, checkpoint, args.asr_workers))
+    pipeline.add("preprocess", partial(run_preprocess, checkpoint), deps=("asr",))
+    pipeline.add("transcript", run_parse, deps=("preprocess",))
+    pipeline.add("summary", partial(run_summary, checkpoint), deps=("preprocess", "transcript"))
+    pipeline.add("introduction", partial(run_intro, checkpoint), deps=("preprocess", "transcript"))
+
+    start_time = time.time()
+    with span("meeting", audio=args.audio):
+        results = pipeline.run()
+    elapsed = time.time() - start_time
+
+    # 汇总各阶段耗时，失败阶段不影响其他阶段已得到的结果
+    print("\n各阶段耗时:")
+    for name, label in STAGE_LABELS.items():
+        result = results[name]
+        if result.skipped:
+            print(f"  {label}: 跳过（依赖阶段失败）")
+        elif result.error is not None:
+            print(f"  {label}失败: {result.error}, 耗时: {result.elapsed:.2f}秒")
+        else:
+            print(f"  {label}: {result.elapsed:.2f}秒")
+    print(f"总耗时: {elapsed:.2f}秒")
+    if checkpoint.loaded:
+        print(f"检查点: 复用 {checkpoint.loaded} 项（{checkpoint.root}）")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"LLM缓存: 命中 {stats['hits']}, 未命中 {stats['misses']}")
+    llm = tracer.summary().get("llm.chat")
+    if llm:
+        print(f"LLM调用: {llm['count']}次, 输入 {llm.get('prompt_tokens', 0)} tokens, "
+              f"输出 {llm.get('completion_tokens', 0)} tokens, 重试 {llm.get('retries', 0)}次")
+    limiter = get_client().limiter
+    if limiter is not None and limiter.throttled:
+        print(f"限流: 收到429 {limiter.throttled}次, 当前并发上限 {limiter.snapshot()['limit']}")
+    if args.trace:
+        print(f"追踪记录已写入 {args.trace}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
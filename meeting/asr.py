@@ -1,67 +1,199 @@
-from funasr import AutoModel
-from datetime import datetime
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import os
+import shutil
+import tempfile
+import threading
+import time
+from meeting.tracing import add_metrics_route, span
 
-# 初始化模型
-model = AutoModel(
+# 模型配置
+MODEL_CONFIG = dict(
     model="paraformer-zh", model_revision="v2.0.4",
     vad_model="fsmn-vad", vad_model_revision="v2.0.4",
     punc_model="ct-punc-c", punc_model_revision="v2.0.4",
     spk_model="cam++", spk_model_revision="v2.0.2",
 )
 
-def audio_to_text(audio_path: str, output_txt: str = "output/interview.txt") -> str:
+# 热词，空格分隔（paraformer-zh为SeACo-Paraformer，按热词提高识别率），整文件识别与各后端的分段识别使用同一设置
+asr_hotwords = os.getenv("ASR_HOTWORDS", "")
+# 单个文件的并行识别进程数，大于1时改用meeting.asr_parallel（VAD分段后多进程识别）
+asr_workers = int(os.getenv("ASR_WORKERS", "0"))
+# 识别模型后端：torch（默认）或onnx（funasr_onnx，可用int8量化），onnx后端总是使用分段识别
+asr_backend = os.getenv("ASR_BACKEND", "torch")
+
+# 模型在首次使用时加载，之后常驻内存
+_model = None
+_model_lock = threading.Lock()
+# 同一模型实例的推理串行执行
+_infer_lock = threading.Lock()
+# 本线程识别时等待推理锁的累计秒数，transcribe将其从推理耗时中分开统计
+_local = threading.local()
+
+def get_model():
+    """获取模型实例（线程安全的延迟初始化），返回(model, 本次调用的加载耗时秒数)"""
+    global _model
+    if _model is not None:
+        return _model, 0.0
+    with _model_lock:
+        if _model is not None:
+            return _model, 0.0
+        from funasr import AutoModel
+        start_time = time.time()
+        with span("asr.load_model", model=MODEL_CONFIG["model"]):
+            _model = AutoModel(**MODEL_CONFIG)
+        return _model, time.time() - start_time
+
+def use_segmented(workers: int = None) -> bool:
+    """并行进程数大于1或使用onnx后端时分段识别（meeting.asr_parallel），否则整文件识别"""
+    workers = asr_workers if workers is None else workers
+    return workers > 1 or asr_backend != "torch"
+
+def load_models(workers: int = None) -> float:
     """
-    语音转文字核心函数
-    :param audio_path: 音频文件路径（如 "dataset/interview.m4a"）
-    :param output_txt: 输出文本文件路径（默认保存到 output/interview.txt）
-    :return: 带时间戳和发言人的识别文本内容
+    加载当前识别方式实际使用的模型，返回本次调用承担的加载耗时（已加载时为0）
+    整文件识别加载PyTorch模型；分段识别加载主进程的VAD模型并启动工作进程（各进程加载所选后端的模型）
     """
-    # 获取当前日期
-    current_date = datetime.now().strftime("%Y-%m-%d")
+    workers = asr_workers if workers is None else workers
+    if not use_segmented(workers):
+        return get_model()[1]
+    from meeting.asr_parallel import warm_up
+    return warm_up(max(1, workers), backend=asr_backend)
+
+def recognize(audio_path: str) -> list:
+    """识别音频，返回模型输出的sentence_info（毫秒时间戳、发言人、文本）"""
+    model, _ = get_model()
     
     # 调用模型识别音频
-    res = model.generate(
-        input=audio_path,
-        batch_size_s=300,
-        hotword=''
-    )
+    audio_bytes = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
+    queued = time.time()
+    with _infer_lock, span("asr.recognize", bytes_in=audio_bytes) as s:
+        wait_seconds = time.time() - queued
+        _local.lock_wait = getattr(_local, "lock_wait", 0.0) + wait_seconds
+        s.set(wait_seconds=round(wait_seconds, 6))
+        res = model.generate(
+            input=audio_path,
+            batch_size_s=300,
+            hotword=asr_hotwords
+        )
+        s.set(sentences=len(res[0].get('sentence_info', [])))
     
     # 检查是否有说话人信息
     if 'sentence_info' not in res[0]:
         raise ValueError("未检测到说话人信息，请检查：\n1. 模型配置是否包含spk_embed_postnet设置\n2. 音频是否包含多人对话")
+    return res[0]['sentence_info']
+
+def format_sentence(sentence: dict) -> str:
+    """将一条语句格式化为 "MM:SS 发言人N: 内容" """
+    # 转换开始时间为 MM:SS 格式
+    start_seconds = sentence['start'] / 1000.0
+    minutes = int(start_seconds // 60)
+    seconds = int(start_seconds % 60)
+    timestamp = f"{minutes:02d}:{seconds:02d}"
+    return f"{timestamp} 发言人{sentence['spk']}: {sentence['text']}"
+
+def write_text_atomic(path: str, text: str):
+    """一次性写入临时文件后原子替换，读取方不会看到写了一半的内容"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".txt")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # mkstemp创建的文件仅属主可读，改为常规文件权限
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def audio_to_text(audio_path: str, output_txt: str = "output/interview.txt", workers: int = None) -> str:
+    """
+    语音转文字核心函数
+    :param audio_path: 音频文件路径（如 "dataset/interview.m4a"）
+    :param output_txt: 输出文本文件路径（默认保存到 output/interview.txt），为None时不写文件
+    :param workers: 并行识别的进程数（默认取ASR_WORKERS），大于1（或使用onnx后端）时分段后多进程识别
+    :return: 带时间戳和发言人的识别文本内容
+    """
+    from meeting.asr_store import recognize_stored, render
+
+    # 同一音频与模型配置的识别结果已存储时直接读取，日期为首次识别的日期
+    sentence_info, current_date = recognize_stored(audio_path, workers)
     
-    # 写入识别结果到文件并拼接返回文本
-    full_text = []
-    # 写入日期作为第一行
-    full_text.append(f"日期：{current_date}")
-    
-    with open(output_txt, 'w', encoding='utf-8') as f:
-        f.write(f"日期：{current_date}\n")
+    # 日期作为第一行，随后每条语句一行
+    text = render(sentence_info, "txt", current_date)
     
-    # 处理每条语句
-    for sentence in res[0]['sentence_info']:
-        # 转换开始时间为 MM:SS 格式
-        start_seconds = sentence['start'] / 1000.0
-        minutes = int(start_seconds // 60)
-        seconds = int(start_seconds % 60)
-        timestamp = f"{minutes:02d}:{seconds:02d}"
-        
-        # 生成文本行
-        line = f"{timestamp} 发言人{sentence['spk']}: {sentence['text']}"
-        full_text.append(line)
-        
-        # 追加到文件
-        with open(output_txt, 'a', encoding='utf-8') as f:
-            f.write(f"{line}\n")
+    # 单次写入识别结果
+    if output_txt:
+        write_text_atomic(output_txt, text + '\n')
     
     # 返回完整文本（按行拼接）
-    return '\n'.join(full_text)
+    return text
 
-if __name__ == "__main__":
+def transcribe(audio_path: str, output_txt: str = None) -> dict:
+    """识别音频并分别统计模型加载耗时、等待其他请求推理完成的耗时与推理耗时"""
+    load_seconds = load_models()
+    _local.lock_wait = 0.0
+    start_time = time.time()
+    text = audio_to_text(audio_path, output_txt)
+    elapsed = time.time() - start_time
+    return {
+        "text": text,
+        "model_load_seconds": round(load_seconds, 3),
+        "lock_wait_seconds": round(_local.lock_wait, 3),
+        "inference_seconds": round(elapsed - _local.lock_wait, 3),
+    }
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 服务模式下启动时预加载模型，避免首个请求承担加载耗时
+    if os.getenv("ASR_PRELOAD", "1") == "1":
+        load_seconds = await run_in_threadpool(load_models)
+        print(f"ASR模型加载完成, 耗时: {load_seconds:.2f}秒")
+    yield
+
+# 初始化FastAPI应用
+app = FastAPI(lifespan=lifespan)
+add_metrics_route(app)
+
+# FastAPI接口：上传音频文件或指定服务端音频路径
+@app.post("/asr")
+async def asr_api(file: UploadFile = File(None), audio_path: str = Form(None)):
+    if file is None and not audio_path:
+        raise HTTPException(status_code=400, detail="请上传音频文件或提供audio_path")
+    if file is None and not os.path.exists(audio_path):
+        raise HTTPException(status_code=404, detail=f"音频文件 {audio_path} 不存在")
+
+    work_dir = tempfile.mkdtemp(prefix="asr_")
     try:
-        # 示例：处理默认音频文件
-        result = audio_to_text("dataset/interview.m4a")
-        print("语音转文字已完成!")
+        if file is not None:
+            # 保存上传文件，保留扩展名供解码器识别格式
+            suffix = os.path.splitext(file.filename or "")[1]
+            audio_path = os.path.join(work_dir, f"upload{suffix}")
+            with open(audio_path, 'wb') as f:
+                shutil.copyfileobj(file.file, f)
+        # 识别为阻塞的CPU计算，放到线程池中执行；服务模式只返回文本，不写文件
+        return await run_in_threadpool(transcribe, audio_path)
     except Exception as e:
-        print(f"处理失败：{str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="语音转文字")
+    parser.add_argument("--serve", action="store_true", help="以服务模式运行，模型常驻内存")
+    parser.add_argument("--port", type=int, default=8002, help="服务端口（预处理、摘要与会议介绍服务使用8001）")
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
+    else:
+        try:
+            # 示例：处理默认音频文件
+            result = audio_to_text("dataset/interview.m4a")
+            print("语音转文字已完成!")
+        except Exception as e:
+            print(f"处理失败：{str(e)}")
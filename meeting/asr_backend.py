@@ -0,0 +1,179 @@
+"""
+分段识别（meeting.asr_parallel）使用的模型后端：VAD、识别、标点三个模型的统一接口
+
+- torch：FunASR默认的PyTorch模型（MODEL_CONFIG）
+- onnx：funasr_onnx由MODEL_CONFIG中同一模型及版本导出的ONNX模型，可使用int8量化版本，并可设置ONNX Runtime的算子内/算子间线程数；
+  识别模型为SeACo-Paraformer（paraformer-zh），两种后端使用相同的热词（ASR_HOTWORDS）
+声纹模型（cam++）没有ONNX导出，两种后端都使用PyTorch版本，保证发言人聚类结果一致
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+from meeting.asr import MODEL_CONFIG, asr_backend, asr_hotwords
+
+ASR_BACKENDS = ("torch", "onnx")
+
+# 后端模型名 -> MODEL_CONFIG中的键
+MODEL_KEYS = {"asr": "model", "vad": "vad_model", "punc": "punc_model"}
+# MODEL_CONFIG中的模型简称对应的ModelScope模型（与FunASR的简称映射一致），ONNX后端由同一模型导出
+MODELSCOPE_MODELS = {
+    "paraformer-zh": "iic/speech_seaco_paraformer_large_asr_nat-zh-cn-16k-common-vocab8404-pytorch",
+    "fsmn-vad": "iic/speech_fsmn_vad_zh-cn-16k-common-pytorch",
+    "ct-punc-c": "iic/punc_ct-transformer_zh-cn-common-vocab272727-pytorch",
+}
+# 没有ONNX导出、两种后端都使用PyTorch版本的模型
+TORCH_ONLY_MODELS = {"spk": MODEL_CONFIG["spk_model"]}
+
+# ONNX模型目录或ModelScope模型名，为空时使用MODEL_CONFIG中的同一模型及版本；
+# funasr_onnx在目录中没有导出文件时自动导出
+onnx_model_dirs = {
+    "asr": os.getenv("ASR_ONNX_MODEL", ""),
+    "vad": os.getenv("ASR_ONNX_VAD_MODEL", ""),
+    "punc": os.getenv("ASR_ONNX_PUNC_MODEL", ""),
+}
+onnx_quantize = os.getenv("ASR_ONNX_QUANTIZE", "1") == "1"
+# 算子内线程数（单个算子的并行度），0表示按工作进程数平分CPU核数
+onnx_intra_threads = int(os.getenv("ASR_ONNX_INTRA_THREADS", "0"))
+# 算子间线程数，大于1时以并行执行模式重建会话（默认顺序执行，该设置不生效）
+onnx_inter_threads = int(os.getenv("ASR_ONNX_INTER_THREADS", "0"))
+
+
+def onnx_model_source(name: str, model_dirs: dict = None) -> tuple:
+    """ONNX后端模型name（asr/vad/punc）的来源：(模型目录或ModelScope模型名, 版本)，未单独指定时与MODEL_CONFIG一致"""
+    configured = (model_dirs or onnx_model_dirs).get(name)
+    if configured:
+        return configured, None
+    key = MODEL_KEYS[name]
+    model = MODEL_CONFIG[key]
+    if model not in MODELSCOPE_MODELS:
+        raise ValueError(f"{model} 没有对应的ONNX模型，请通过环境变量指定{name}模型的目录或ModelScope模型名")
+    return MODELSCOPE_MODELS[model], MODEL_CONFIG[f"{key}_revision"]
+
+
+def read_model_type(model_dir: str) -> str:
+    """模型目录config.yaml中的模型类型（如SeacoParaformer），没有时返回空串"""
+    config_file = os.path.join(model_dir, "config.yaml")
+    if not os.path.exists(config_file):
+        return ""
+    with open(config_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.startswith("model:"):
+                return line.split(":", 1)[1].strip()
+    return ""
+
+
+class ModelBackend(ABC):
+    """各模型（asr/vad/punc）在首次使用时加载，线程安全"""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self, name: str):
+        """加载名为name（asr/vad/punc）的模型"""
+
+    def _model(self, name: str):
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._load(name)
+            return self._models[name]
+
+    def preload(self, *names: str):
+        for name in names:
+            self._model(name)
+
+
+class TorchBackend(ModelBackend):
+    """PyTorch版FunASR模型，计算线程数由调用方通过torch.set_num_threads设置"""
+
+    def _load(self, name: str):
+        from funasr import AutoModel
+        key = MODEL_KEYS[name]
+        return AutoModel(model=MODEL_CONFIG[key], model_revision=MODEL_CONFIG[f"{key}_revision"])
+
+    def vad(self, samples) -> list:
+        """返回语音段 [[开始毫秒, 结束毫秒], ...]"""
+        return self._model("vad").generate(input=samples)[0]["value"]
+
+    def recognize(self, samples) -> tuple:
+        """返回(不含标点的文本, 字级时间戳)"""
+        result = self._model("asr").generate(input=samples, hotword=asr_hotwords)[0]
+        return result.get("text", "").strip(), result.get("timestamp")
+
+    def punctuate(self, text: str) -> str:
+        return self._model("punc").generate(input=text)[0]["text"]
+
+
+class OnnxBackend(ModelBackend):
+    """funasr_onnx加载的ONNX模型，quantize为True时使用int8量化导出"""
+
+    def __init__(self, threads: int = 0, quantize: bool = onnx_quantize,
+                 inter_threads: int = onnx_inter_threads, model_dirs: dict = None):
+        super().__init__()
+        self.intra_threads = onnx_intra_threads or threads or 4
+        self.inter_threads = inter_threads
+        self.quantize = quantize
+        self.model_dirs = model_dirs or onnx_model_dirs
+        # 识别模型为SeACo-Paraformer时按热词识别
+        self.seaco = False
+
+    def _model_dir(self, name: str) -> str:
+        """本地模型目录：配置为ModelScope模型名时先下载（与funasr_onnx使用同一缓存目录）"""
+        model_dir, revision = onnx_model_source(name, self.model_dirs)
+        if os.path.isdir(model_dir):
+            return model_dir
+        from modelscope.hub.snapshot_download import snapshot_download
+        return snapshot_download(model_dir, revision=revision)
+
+    def _load(self, name: str):
+        from funasr_onnx import CT_Transformer, Fsmn_vad, Paraformer, SeacoParaformer
+        model_dir = self._model_dir(name)
+        model_class = {"asr": Paraformer, "vad": Fsmn_vad, "punc": CT_Transformer}[name]
+        if name == "asr" and read_model_type(model_dir) == "SeacoParaformer":
+            model_class, self.seaco = SeacoParaformer, True
+        elif name == "asr" and asr_hotwords:
+            print(f"警告: ONNX识别模型 {model_dir} 不是SeACo-Paraformer，不支持热词，ASR_HOTWORDS不生效")
+        # 目录中没有导出文件时funasr_onnx在构造时导出到该目录
+        model = model_class(model_dir, quantize=self.quantize, intra_op_num_threads=self.intra_threads)
+        if self.inter_threads > 1:
+            model_file = os.path.join(model_dir, "model_quant.onnx" if self.quantize else "model.onnx")
+            self._enable_inter_op(model, model_file)
+        return model
+
+    def _enable_inter_op(self, model, model_file: str):
+        """funasr_onnx不暴露算子间线程数，以相同模型文件与并行执行模式重建会话"""
+        import onnxruntime
+        session = model.ort_infer.session
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = self.intra_threads
+        options.inter_op_num_threads = self.inter_threads
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model.ort_infer.session = onnxruntime.InferenceSession(
+            model_file, sess_options=options, providers=session.get_providers())
+
+    def vad(self, samples) -> list:
+        return self._model("vad")(samples)[0]
+
+    def recognize(self, samples) -> tuple:
+        model = self._model("asr")
+        result = (model(samples, asr_hotwords) if self.seaco else model(samples))[0]
+        # 不同版本的funasr_onnx返回 {"preds": 文本或(文本, 词元)}，含时间戳的模型另带timestamp
+        if isinstance(result, dict):
+            text, timestamps = result.get("preds", ""), result.get("timestamp")
+        else:
+            text, timestamps = result, None
+        if isinstance(text, (list, tuple)):
+            text = text[0]
+        return text.strip(), timestamps
+
+    def punctuate(self, text: str) -> str:
+        return self._model("punc")(text)[0]
+
+
+def load_backend(name: str = asr_backend, threads: int = 0) -> ModelBackend:
+    """按名称创建后端，threads为onnx后端的算子内线程数"""
+    if name not in ASR_BACKENDS:
+        raise ValueError(f"不支持的ASR后端: {name}，可选: {', '.join(ASR_BACKENDS)}")
+    return OnnxBackend(threads) if name == "onnx" else TorchBackend()
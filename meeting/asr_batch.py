@@ -0,0 +1,181 @@
+"""
+批量语音转文字：将多个音频文件分发到多个工作进程，每个进程持有独立的模型实例
+
+用法：python -m meeting.asr_batch dataset/ --output-dir output/batch --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = {".m4a", ".mp3", ".wav", ".flac", ".aac", ".ogg", ".opus", ".wma", ".amr", ".mp4"}
+
+
+def collect_audio_files(inputs: list) -> list:
+    """展开输入：目录取其中的音频文件，.txt文件视为每行一个路径的列表，其余按音频文件处理"""
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for name in sorted(os.listdir(item)):
+                if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                    files.append(os.path.join(item, name))
+        elif item.endswith(".txt"):
+            with open(item, 'r', encoding='utf-8') as f:
+                files.extend(line.strip() for line in f if line.strip())
+        else:
+            files.append(item)
+    # 同一文件出现多次时只处理一次
+    unique = {}
+    for path in files:
+        unique.setdefault(os.path.abspath(path), path)
+    return list(unique.values())
+
+
+def output_paths(files: list, output_dir: str) -> dict:
+    """
+    确定每个音频的输出文件：按相对于所有文件共同上级目录的路径镜像到output_dir下（a/x.wav -> a/x.txt），
+    同一目录中只有扩展名不同的文件保留扩展名（x.wav.txt、x.m4a.txt），避免结果互相覆盖
+    """
+    absolute = [os.path.abspath(path) for path in files]
+    root = os.path.commonpath([os.path.dirname(path) for path in absolute])
+    relative = [os.path.relpath(path, root) for path in absolute]
+    stems = Counter(os.path.splitext(path)[0] for path in relative)
+    outputs = {}
+    for path, name in zip(files, relative):
+        stem = os.path.splitext(name)[0]
+        outputs[path] = os.path.join(output_dir, (name if stems[stem] > 1 else stem) + ".txt")
+    # 提交前检查，任何情况下都不允许两个文件写入同一结果
+    seen = {}
+    for path, output in outputs.items():
+        other = seen.setdefault(output, path)
+        if other != path:
+            raise ValueError(f"{other} 与 {path} 的输出文件重名: {output}")
+    return outputs
+
+
+def audio_duration(audio_path: str, sentence_info: list) -> float:
+    """获取音频时长（秒）：优先使用ffprobe，不可用时以最后一句的结束时间估算"""
+    if shutil.which("ffprobe"):
+        try:
+            output = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                 "-of", "default=noprint_wrappers=1:nokey=1", audio_path],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+            return float(output)
+        except (subprocess.CalledProcessError, ValueError):
+            pass
+    return max((s['end'] for s in sentence_info), default=0) / 1000.0
+
+
+def _init_worker(threads_per_worker: int):
+    """工作进程初始化：限制计算线程数并加载本进程的模型实例"""
+    if threads_per_worker:
+        try:
+            import torch
+            torch.set_num_threads(threads_per_worker)
+        except ImportError:
+            pass
+    from meeting.asr import get_model
+    get_model()
+
+
+def _transcribe_file(audio_path: str, output_txt: str) -> dict:
+    """在工作进程中识别单个文件，异常以结果形式返回而不中断批处理"""
+    from meeting.asr import write_text_atomic
+    from meeting.asr_store import recognize_stored, render
+
+    start_time = time.time()
+    try:
+        # 工作进程内只做整文件识别，已存储的结果直接读取
+        sentence_info, current_date = recognize_stored(audio_path, segmented=False)
+        write_text_atomic(output_txt, render(sentence_info, "txt", current_date) + '\n')
+        return {
+            "audio": audio_path,
+            "output": output_txt,
+            "audio_seconds": round(audio_duration(audio_path, sentence_info), 3),
+            "elapsed_seconds": round(time.time() - start_time, 3),
+            "error": None,
+        }
+    except Exception as e:
+        return {
+            "audio": audio_path,
+            "output": None,
+            "audio_seconds": 0.0,
+            "elapsed_seconds": round(time.time() - start_time, 3),
+            "error": str(e),
+        }
+
+
+def batch_audio_to_text(inputs: list, output_dir: str = "output/batch",
+                        workers: int = 2, threads_per_worker: int = 0) -> dict:
+    """
+    批量语音转文字
+    :param inputs: 音频文件、目录或路径列表文件
+    :param output_dir: 识别结果保存目录，按输入文件的相对路径保存为 <相对路径>/<文件名>.txt
+    :param workers: 工作进程数，每个进程加载一份模型
+    :param threads_per_worker: 每个进程的计算线程数，0表示不限制
+    :return: 包含逐文件结果与吞吐统计的报告
+    """
+    files = collect_audio_files(inputs)
+    if not files:
+        raise ValueError("未找到需要处理的音频文件")
+    outputs = output_paths(files, output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    start_time = time.time()
+    # 使用spawn启动，避免fork后的模型线程状态问题
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(threads_per_worker,)) as executor:
+        futures = {executor.submit(_transcribe_file, path, outputs[path]): path for path in files}
+        for done_num, future in enumerate(as_completed(futures), 1):
+            try:
+                result = future.result()
+            except Exception as e:
+                # 工作进程异常退出等情况
+                result = {"audio": futures[future], "output": None, "audio_seconds": 0.0,
+                          "elapsed_seconds": 0.0, "error": str(e)}
+            results.append(result)
+            status = "失败: " + result["error"] if result["error"] else "完成"
+            print(f"[{done_num}/{len(files)}] {result['audio']} {status}")
+    wall_seconds = time.time() - start_time
+
+    succeeded = [r for r in results if not r["error"]]
+    audio_seconds = sum(r["audio_seconds"] for r in succeeded)
+    report = {
+        "files": len(files),
+        "succeeded": len(succeeded),
+        "failed": [{"audio": r["audio"], "error": r["error"]} for r in results if r["error"]],
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 3),
+        "audio_seconds": round(audio_seconds, 3),
+        # 每秒墙钟时间处理的音频秒数
+        "throughput": round(audio_seconds / wall_seconds, 3) if wall_seconds else 0.0,
+        "results": sorted(results, key=lambda r: r["audio"]),
+    }
+    with open(os.path.join(output_dir, "batch_report.json"), 'w', encoding='utf-8') as f:
+        f.write(json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量语音转文字")
+    parser.add_argument("inputs", nargs="+", help="音频文件、目录或路径列表文件(.txt)")
+    parser.add_argument("--output-dir", default="output/batch")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="每个进程的计算线程数")
+    args = parser.parse_args()
+
+    report = batch_audio_to_text(args.inputs, args.output_dir, args.workers, args.threads_per_worker)
+    print(f"处理完成: 成功 {report['succeeded']}/{report['files']}, "
+          f"音频总时长 {report['audio_seconds']:.1f}秒, 耗时 {report['wall_seconds']:.1f}秒, "
+          f"吞吐 {report['throughput']:.2f} 音频秒/秒")
+    for failure in report["failed"]:
+        print(f"失败: {failure['audio']} - {failure['error']}")
@@ -0,0 +1,307 @@
+"""
+单个长录音的并行识别：音频只解码一次为PCM文件并以内存映射读取（各工作进程共享页缓存），
+主进程分块执行fsmn-vad得到语音段，按时长分组后分发到多个工作进程执行paraformer识别与ct-punc标点，
+每句提取cam++声纹嵌入，最后在主进程对整场会议的嵌入统一聚类，保证发言人编号前后一致
+VAD、识别与标点模型可使用PyTorch或ONNX后端（见meeting.asr_backend）
+
+返回与asr.recognize结构相同的sentence_info（毫秒时间戳、发言人、文本）
+用法：python -m meeting.asr_parallel dataset/interview.m4a --workers 4
+"""
+import argparse
+import atexit
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+from meeting.asr import MODEL_CONFIG, asr_backend, format_sentence
+from meeting.asr_backend import ASR_BACKENDS, load_backend
+from meeting.tracing import span
+
+SAMPLE_RATE = 16000
+SAMPLES_PER_MS = SAMPLE_RATE // 1000
+
+# 主进程每次执行VAD的音频时长，内存占用只与块大小有关
+vad_block_seconds = int(os.getenv("ASR_VAD_BLOCK_SECONDS", "600"))
+# 每个识别任务包含的语音时长，过小时进程间通信开销占比高，过大时各进程负载不均
+job_seconds = int(os.getenv("ASR_JOB_SECONDS", "60"))
+# 提取声纹嵌入的最短音频，短句向两侧扩展到该长度（不超出所在语音段）
+min_embedding_ms = 1000
+
+# 句末标点（拆句）与全部标点（不占字级时间戳）
+SENTENCE_END = "。？！?!"
+PUNCTUATION = "，。？！、；：,.?!;:"
+
+
+def decode_to_pcm(audio_path: str, pcm_path: str):
+    """用ffmpeg将音频解码为16kHz、16bit、单声道PCM裸数据"""
+    if not shutil.which("ffmpeg"):
+        raise RuntimeError("并行识别需要ffmpeg解码音频，请先安装ffmpeg")
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", audio_path,
+                    "-ar", str(SAMPLE_RATE), "-ac", "1", "-f", "s16le", pcm_path], check=True)
+
+
+def open_pcm(pcm_path: str) -> np.ndarray:
+    """以只读内存映射打开PCM文件，切片时才从页缓存读取对应采样"""
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+
+def to_float(samples: np.ndarray) -> np.ndarray:
+    """16bit采样转为[-1, 1]的float32"""
+    return np.asarray(samples, dtype=np.float32) / 32768.0
+
+
+def detect_segments(pcm: np.ndarray, backend, block_seconds: int = vad_block_seconds,
+                    tail_guard_ms: int = 1000) -> list:
+    """
+    分块执行VAD，返回整段音频中的语音段 [(开始毫秒, 结束毫秒), ...]
+    接近块末尾的语音段可能延续到下一块，从该段起点开始下一块
+    """
+    total_ms = len(pcm) // SAMPLES_PER_MS
+    segments = []
+    pos = 0
+    while pos < total_ms:
+        block_end = min(total_ms, pos + block_seconds * 1000)
+        final = block_end == total_ms
+        block_segments = backend.vad(to_float(pcm[pos * SAMPLES_PER_MS:block_end * SAMPLES_PER_MS]))
+        next_pos = block_end
+        for beg, end in block_segments:
+            # 从块起点开始的语音段即使接近末尾也直接接受，避免原地循环
+            if not final and beg > 0 and end >= block_end - pos - tail_guard_ms:
+                next_pos = pos + beg
+                break
+            segments.append((pos + beg, pos + end))
+        pos = next_pos
+    return segments
+
+
+def group_segments(segments: list, seconds: int = job_seconds) -> list:
+    """按累计语音时长将语音段分组，每组作为一个识别任务"""
+    jobs, current, duration = [], [], 0
+    for beg, end in segments:
+        current.append((beg, end))
+        duration += end - beg
+        if duration >= seconds * 1000:
+            jobs.append(current)
+            current, duration = [], 0
+    if current:
+        jobs.append(current)
+    return jobs
+
+
+def split_sentences(text: str, timestamps, beg_ms: int, end_ms: int) -> list:
+    """
+    按句末标点将一个语音段拆为多句，返回 [(开始毫秒, 结束毫秒, 文本), ...]
+    字与字级时间戳一一对应时用时间戳确定每句起止，否则（如含英文单词）整段作为一句
+    """
+    units = [c for c in text if c not in PUNCTUATION and not c.isspace()]
+    if not timestamps or len(units) != len(timestamps):
+        return [(beg_ms, end_ms, text)]
+
+    sentences = []
+    current, first, index = "", 0, 0
+    for c in text:
+        current += c
+        if c not in PUNCTUATION and not c.isspace():
+            index += 1
+        if c in SENTENCE_END and index > first:
+            sentences.append((beg_ms + timestamps[first][0], beg_ms + timestamps[index - 1][1], current))
+            current, first = "", index
+    if index > first:
+        sentences.append((beg_ms + timestamps[first][0], beg_ms + timestamps[index - 1][1], current))
+    elif current.strip() and sentences:
+        # 末尾只剩标点，并入上一句
+        start, stop, last = sentences[-1]
+        sentences[-1] = (start, stop, last + current)
+    return sentences
+
+
+def embedding_window(start: int, stop: int, beg: int, end: int) -> tuple:
+    """声纹嵌入使用的音频范围：不足min_embedding_ms时向两侧扩展，不超出语音段"""
+    missing = min_embedding_ms - (stop - start)
+    if missing <= 0:
+        return start, stop
+    start = max(beg, start - missing // 2)
+    return start, min(end, start + min_embedding_ms)
+
+
+# ---- 工作进程 ----
+
+_worker_models = None
+
+
+def _init_worker(threads_per_worker: int, backend: str):
+    """工作进程初始化：限制计算线程数，加载识别与标点模型（指定后端）及声纹模型"""
+    global _worker_models
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    recognizer = load_backend(backend, threads_per_worker)
+    recognizer.preload("asr", "punc")
+    from funasr import AutoModel
+    spk_model = AutoModel(model=MODEL_CONFIG["spk_model"], model_revision=MODEL_CONFIG["spk_model_revision"])
+    _worker_models = (recognizer, spk_model)
+
+
+def _ready(_) -> bool:
+    """工作进程初始化（加载模型）完成后才会执行，用于预热"""
+    return _worker_models is not None
+
+
+def _recognize_job(pcm_path: str, segments: list) -> list:
+    """在工作进程中识别一组语音段，返回各句的时间、文本与声纹嵌入"""
+    recognizer, spk_model = _worker_models
+    pcm = open_pcm(pcm_path)
+    sentences = []
+    for beg, end in segments:
+        raw_text, timestamps = recognizer.recognize(to_float(pcm[beg * SAMPLES_PER_MS:end * SAMPLES_PER_MS]))
+        if not raw_text:
+            continue
+        text = recognizer.punctuate(raw_text)
+        for start, stop, sentence in split_sentences(text, timestamps, beg, end):
+            lo, hi = embedding_window(start, stop, beg, end)
+            embedding = spk_model.generate(input=to_float(pcm[lo * SAMPLES_PER_MS:hi * SAMPLES_PER_MS]))[0]["spk_embedding"]
+            embedding = np.asarray(embedding.cpu() if hasattr(embedding, "cpu") else embedding,
+                                   dtype=np.float32).reshape(-1)
+            sentences.append({"start": start, "end": stop, "text": sentence, "embedding": embedding})
+    return sentences
+
+
+# ---- 主进程 ----
+
+_vad_backends = {}
+_executor = None
+_executor_config = None
+_lock = threading.Lock()
+# 已预热的进程池配置，相同配置再次预热时不重复计时
+_warm_config = None
+_warm_lock = threading.Lock()
+
+
+def get_vad_backend(backend: str = asr_backend):
+    """主进程中执行VAD的后端，只加载VAD模型"""
+    with _lock:
+        if backend not in _vad_backends:
+            _vad_backends[backend] = load_backend(backend)
+        return _vad_backends[backend]
+
+
+def default_threads(workers: int) -> int:
+    """未指定时平分CPU核数"""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def get_executor(workers: int, threads_per_worker: int = 0, backend: str = asr_backend) -> ProcessPoolExecutor:
+    """获取工作进程池，同一配置下复用（模型只在各进程首次启动时加载）"""
+    global _executor, _executor_config
+    config = (workers, threads_per_worker or default_threads(workers), backend)
+    with _lock:
+        if _executor is not None and _executor_config != config:
+            _executor.shutdown()
+            _executor = None
+        if _executor is None:
+            # 使用spawn启动，避免fork后的模型线程状态问题
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker, initargs=config[1:])
+            _executor_config = config
+        return _executor
+
+
+def warm_up(workers: int, threads_per_worker: int = 0, backend: str = asr_backend) -> float:
+    """加载主进程的VAD模型并启动全部工作进程（各进程在初始化时加载模型），返回本次调用承担的加载耗时"""
+    global _warm_config
+    config = (workers, threads_per_worker or default_threads(workers), backend)
+    with _warm_lock:
+        if _warm_config == config and _executor_config == config:
+            return 0.0
+        start_time = time.time()
+        with span("asr.load_model", backend=backend, workers=workers):
+            get_vad_backend(backend).preload("vad")
+            # 同时提交与进程数相同的任务，进程池会启动全部工作进程
+            list(get_executor(workers, threads_per_worker, backend).map(_ready, range(workers)))
+        _warm_config = config
+        return time.time() - start_time
+
+
+def shutdown_executor():
+    global _executor, _executor_config
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor, _executor_config = None, None
+
+
+atexit.register(shutdown_executor)
+
+
+def cluster_speakers(embeddings: list) -> list:
+    """用FunASR的cam++聚类后端对整场会议的声纹嵌入聚类，编号按首次出现顺序重排"""
+    if not embeddings:
+        return []
+    from funasr.models.campplus.cluster_backend import ClusterBackend
+    labels = ClusterBackend()(np.stack(embeddings), oracle_num=None)
+    order = {}
+    return [order.setdefault(int(label), len(order)) for label in labels]
+
+
+def recognize_parallel(audio_path: str, workers: int = 2, threads_per_worker: int = 0,
+                       seconds_per_job: int = job_seconds, backend: str = asr_backend) -> list:
+    """
+    并行识别单个音频文件
+    :param workers: 工作进程数，每个进程加载一份识别、标点与声纹模型
+    :param threads_per_worker: 每个进程的计算线程数，0表示平分CPU核数
+    :param seconds_per_job: 每个任务包含的语音时长（秒）
+    :param backend: VAD、识别与标点模型的后端，torch或onnx
+    :return: 与asr.recognize相同结构的sentence_info
+    """
+    if not os.path.exists(audio_path):
+        raise FileNotFoundError(f"音频文件 {audio_path} 不存在")
+    work_dir = tempfile.mkdtemp(prefix="asr_parallel_")
+    try:
+        pcm_path = os.path.join(work_dir, "audio.pcm")
+        with span("asr.parallel.decode", bytes_in=os.path.getsize(audio_path)):
+            decode_to_pcm(audio_path, pcm_path)
+        pcm = open_pcm(pcm_path)
+
+        with span("asr.parallel.vad") as s:
+            segments = detect_segments(pcm, get_vad_backend(backend))
+            s.set(segments=len(segments))
+        jobs = group_segments(segments, seconds_per_job)
+
+        executor = get_executor(workers, threads_per_worker, backend)
+        with span("asr.parallel.recognize", workers=workers, jobs=len(jobs), backend=backend) as s:
+            sentences = [sentence for job in executor.map(_recognize_job, repeat(pcm_path), jobs)
+                         for sentence in job]
+            s.set(sentences=len(sentences))
+
+        with span("asr.parallel.cluster", sentences=len(sentences)):
+            speakers = cluster_speakers([sentence["embedding"] for sentence in sentences])
+        return [{"start": sentence["start"], "end": sentence["end"], "spk": speaker, "text": sentence["text"]}
+                for sentence, speaker in zip(sentences, speakers)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="单文件并行语音转文字")
+    parser.add_argument("audio_path")
+    parser.add_argument("--workers", type=int, default=2, help="工作进程数")
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="每个进程的计算线程数，0为平分CPU核数")
+    parser.add_argument("--backend", choices=ASR_BACKENDS, default=asr_backend, help="模型后端")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    sentence_info = recognize_parallel(args.audio_path, args.workers, args.threads_per_worker,
+                                       backend=args.backend)
+    for sentence in sentence_info:
+        print(format_sentence(sentence))
+    print(f"识别完成: {len(sentence_info)}句, 耗时 {time.time() - start_time:.2f}秒")
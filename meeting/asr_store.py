@@ -0,0 +1,244 @@
+"""
+语音识别结果存储：以音频内容哈希与模型配置为键，保存模型输出的原始sentence_info（毫秒时间戳、发言人、字级时间戳）
+同一音频重复运行、改变输出格式或重新处理下游时直接读取，不再识别
+
+文件格式（<ASR_STORE_DIR>/<键>.asr，zlib压缩）：
+    魔数 b"ASR1" | 元数据JSON长度(uint32) | 元数据JSON | 各列数据
+按列保存：开始、结束毫秒(uint32)，发言人(int32)，各句文本字节数与字级时间戳数(uint32)，
+全部字级时间戳(uint32，每个为开始/结束两个值)，全部文本（UTF-8拼接）
+文本格式（txt/srt/vtt/json）在读取时按需生成
+
+用法：python -m meeting.asr_store dataset/interview.m4a --format srt --output output/interview.srt
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from datetime import datetime
+
+from meeting.asr import MODEL_CONFIG, asr_backend, asr_hotwords, asr_workers, format_sentence, recognize, use_segmented
+from meeting.cache import make_key
+from meeting.checkpoint import hash_file
+from meeting.tracing import span
+
+store_enabled = os.getenv("ASR_STORE", "1") == "1"
+store_dir = os.getenv("ASR_STORE_DIR", "output/asr_store")
+# 跳过读取已有结果（仍会写入新结果），用于强制重新识别
+store_bypass = os.getenv("ASR_STORE_BYPASS", "0") == "1"
+
+MAGIC = b"ASR1"
+FORMATS = ("txt", "srt", "vtt", "json")
+
+
+def _column(typecode: str, values) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(typecode: str, data: bytes, offset: int, count: int) -> tuple:
+    column = array(typecode)
+    size = column.itemsize * count
+    column.frombytes(data[offset:offset + size])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column, offset + size
+
+
+def encode(sentence_info: list, meta: dict) -> bytes:
+    """sentence_info与元数据编码为压缩的列式二进制"""
+    texts = [sentence["text"].encode("utf-8") for sentence in sentence_info]
+    timestamps = [sentence.get("timestamp") or [] for sentence in sentence_info]
+    header = json.dumps(dict(meta, count=len(sentence_info)), ensure_ascii=False).encode("utf-8")
+    body = b"".join([
+        _column("I", (int(sentence["start"]) for sentence in sentence_info)),
+        _column("I", (int(sentence["end"]) for sentence in sentence_info)),
+        _column("i", (int(sentence["spk"]) for sentence in sentence_info)),
+        _column("I", (len(text) for text in texts)),
+        _column("I", (len(pairs) for pairs in timestamps)),
+        _column("I", (int(value) for pairs in timestamps for pair in pairs for value in pair)),
+        b"".join(texts),
+    ])
+    return MAGIC + zlib.compress(struct.pack("<I", len(header)) + header + body)
+
+
+def decode(data: bytes) -> tuple:
+    """解码encode的结果，返回(元数据, sentence_info)"""
+    if data[:4] != MAGIC:
+        raise ValueError("不是识别结果文件")
+    data = zlib.decompress(data[4:])
+    header_size = struct.unpack_from("<I", data)[0]
+    meta = json.loads(data[4:4 + header_size].decode("utf-8"))
+    count = meta["count"]
+    offset = 4 + header_size
+    starts, offset = _read_column("I", data, offset, count)
+    ends, offset = _read_column("I", data, offset, count)
+    speakers, offset = _read_column("i", data, offset, count)
+    text_sizes, offset = _read_column("I", data, offset, count)
+    timestamp_counts, offset = _read_column("I", data, offset, count)
+    flat, offset = _read_column("I", data, offset, 2 * sum(timestamp_counts))
+
+    sentence_info, position = [], 0
+    for i in range(count):
+        text = data[offset:offset + text_sizes[i]].decode("utf-8")
+        offset += text_sizes[i]
+        sentence = {"start": starts[i], "end": ends[i], "spk": speakers[i], "text": text}
+        if timestamp_counts[i]:
+            values = flat[position:position + 2 * timestamp_counts[i]]
+            sentence["timestamp"] = [[values[j], values[j + 1]] for j in range(0, len(values), 2)]
+            position += 2 * timestamp_counts[i]
+        sentence_info.append(sentence)
+    return meta, sentence_info
+
+
+def model_identity(segmented: bool, backend: str = asr_backend) -> dict:
+    """决定识别结果的模型配置：模型及版本、热词、后端与识别方式（整文件或分段）"""
+    identity = {"models": MODEL_CONFIG, "backend": backend, "segmented": segmented}
+    if asr_hotwords:
+        identity["hotwords"] = asr_hotwords
+    if backend == "onnx":
+        from meeting.asr_backend import MODEL_KEYS, onnx_model_source, onnx_quantize
+        identity.update(onnx_models={name: onnx_model_source(name) for name in MODEL_KEYS},
+                        quantize=onnx_quantize)
+    return identity
+
+
+class ASRStore:
+    """识别结果目录，每个结果为一个原子写入的文件，多进程共用"""
+
+    def __init__(self, root: str = store_dir, bypass: bool = store_bypass):
+        self.root = root
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, audio_hash: str, identity: dict) -> str:
+        return make_key({"audio": audio_hash, **identity})
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key[:32]}.asr")
+
+    def load(self, key: str):
+        """命中返回(元数据, sentence_info)，未命中或文件损坏返回None"""
+        path = self.path(key)
+        if self.bypass or not os.path.exists(path):
+            self.misses += 1
+            return None
+        try:
+            with open(path, 'rb') as f:
+                result = decode(f.read())
+        except (OSError, ValueError, KeyError, zlib.error, struct.error, UnicodeDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def save(self, key: str, sentence_info: list, meta: dict):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp_", suffix=".asr")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode(sentence_info, meta))
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+_store = None
+
+
+def get_store() -> ASRStore:
+    global _store
+    if _store is None:
+        _store = ASRStore()
+    return _store
+
+
+def recognize_stored(audio_path: str, workers: int = None, segmented: bool = None) -> tuple:
+    """
+    识别音频，结果已存储时直接读取
+    :param workers: 并行识别的进程数（默认取ASR_WORKERS），大于1（或使用onnx后端）时分段后多进程识别
+    :param segmented: 为False时总是使用PyTorch整文件识别（如已在工作进程中）
+    :return: (sentence_info, 识别日期)
+    """
+    workers = asr_workers if workers is None else workers
+    if segmented is None:
+        segmented = use_segmented(workers)
+    identity = model_identity(segmented, asr_backend if segmented else "torch")
+    store = get_store() if store_enabled else None
+    if store is not None:
+        with span("asr.store.hash", bytes_in=os.path.getsize(audio_path)):
+            audio_hash = hash_file(audio_path)
+        key = store.key(audio_hash, identity)
+        stored = store.load(key)
+        if stored is not None:
+            meta, sentence_info = stored
+            return sentence_info, meta["date"]
+
+    if segmented:
+        from meeting.asr_parallel import recognize_parallel
+        sentence_info = recognize_parallel(audio_path, max(1, workers), backend=asr_backend)
+    else:
+        sentence_info = recognize(audio_path)
+    date = datetime.now().strftime("%Y-%m-%d")
+    if store is not None:
+        store.save(key, sentence_info, {"audio_sha256": audio_hash, "date": date,
+                                        "source": os.path.basename(audio_path),
+                                        **identity})
+    return sentence_info, date
+
+
+def _clock(ms: int, separator: str) -> str:
+    hours, ms = divmod(int(ms), 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+def render(sentence_info: list, fmt: str = "txt", date: str = None) -> str:
+    """
+    由sentence_info生成文本
+    - txt：首行日期，随后每行 "MM:SS 发言人N: 内容"（与audio_to_text的输出一致）
+    - srt/vtt：字幕格式，字幕文本带发言人
+    - json：原始sentence_info
+    """
+    if fmt == "txt":
+        lines = [f"日期：{date or datetime.now().strftime('%Y-%m-%d')}"]
+        lines.extend(format_sentence(sentence) for sentence in sentence_info)
+        return '\n'.join(lines)
+    if fmt == "srt":
+        return '\n'.join(f"{i}\n{_clock(s['start'], ',')} --> {_clock(s['end'], ',')}\n发言人{s['spk']}: {s['text']}\n"
+                         for i, s in enumerate(sentence_info, 1))
+    if fmt == "vtt":
+        cues = [f"{_clock(s['start'], '.')} --> {_clock(s['end'], '.')}\n<v 发言人{s['spk']}>{s['text']}\n"
+                for s in sentence_info]
+        return '\n'.join(["WEBVTT\n"] + cues)
+    if fmt == "json":
+        return json.dumps(sentence_info, ensure_ascii=False)
+    raise ValueError(f"不支持的输出格式: {fmt}，可选: {', '.join(FORMATS)}")
+
+
+if __name__ == "__main__":
+    from meeting.asr import write_text_atomic
+
+    parser = argparse.ArgumentParser(description="按需生成识别结果的各种文本格式（未存储时先识别）")
+    parser.add_argument("audio_path")
+    parser.add_argument("--format", choices=FORMATS, default="txt")
+    parser.add_argument("--output", default="", help="输出文件，默认打印到终端")
+    parser.add_argument("--workers", type=int, default=None, help="并行识别的进程数")
+    args = parser.parse_args()
+
+    sentence_info, date = recognize_stored(args.audio_path, args.workers)
+    text = render(sentence_info, args.format, date)
+    if args.output:
+        write_text_atomic(args.output, text + '\n')
+        print(f"已写入 {args.output}（{len(sentence_info)}句，{'读取存储结果' if get_store().hits else '新识别'}）")
+    else:
+        print(text)
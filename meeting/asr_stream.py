@@ -0,0 +1,254 @@
+"""
+流式语音转文字：按固定时长的窗口读取音频，增量执行VAD与识别，逐行产出 "MM:SS 发言人N: 内容"
+
+音频输入为16kHz、16bit、单声道PCM（.pcm裸数据或.wav），可来自仍在写入的文件或分块上传
+用法：python -m meeting.asr_stream live.pcm --window 5
+"""
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+import argparse
+import os
+import threading
+import time
+import numpy as np
+from meeting.asr import MODEL_CONFIG, format_sentence
+from meeting.sse import sse_response
+from meeting.tracing import add_metrics_route, span
+
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2
+WAV_HEADER_BYTES = 44
+
+# 流式识别使用的模型：VAD、识别+标点、说话人嵌入分别加载，首次使用时初始化
+_models = None
+_models_lock = threading.Lock()
+_infer_lock = threading.Lock()
+
+# 单个语音段在缓冲区中保留的最长时间（秒），持续讲话超过该时长时强制识别并切分，缓冲区与每个窗口的VAD耗时保持有界
+max_segment_seconds = float(os.getenv("ASR_STREAM_MAX_SEGMENT_SECONDS", "15"))
+
+def get_stream_models() -> tuple:
+    """获取(vad模型, 识别模型, 说话人模型)，线程安全的延迟初始化"""
+    global _models
+    with _models_lock:
+        if _models is None:
+            from funasr import AutoModel
+            vad_model = AutoModel(model=MODEL_CONFIG["vad_model"],
+                                  model_revision=MODEL_CONFIG["vad_model_revision"])
+            asr_model = AutoModel(model=MODEL_CONFIG["model"],
+                                  model_revision=MODEL_CONFIG["model_revision"],
+                                  punc_model=MODEL_CONFIG["punc_model"],
+                                  punc_model_revision=MODEL_CONFIG["punc_model_revision"])
+            spk_model = AutoModel(model=MODEL_CONFIG["spk_model"],
+                                  model_revision=MODEL_CONFIG["spk_model_revision"])
+            _models = (vad_model, asr_model, spk_model)
+        return _models
+
+def pcm_to_float(data: bytes) -> np.ndarray:
+    """16bit PCM字节转为[-1, 1]的float32采样"""
+    return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+class SpeakerRegistry:
+    """跨窗口的说话人登记：按声纹嵌入与已知说话人质心的余弦相似度分配编号"""
+
+    def __init__(self, threshold: float = 0.6):
+        self.threshold = threshold
+        self.centroids = []
+
+    def assign(self, embedding: np.ndarray) -> int:
+        embedding = embedding / (np.linalg.norm(embedding) + 1e-8)
+        if self.centroids:
+            similarities = [float(np.dot(embedding, c / np.linalg.norm(c))) for c in self.centroids]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= self.threshold:
+                # 累加归一化嵌入，质心方向即平均方向
+                self.centroids[best] = self.centroids[best] + embedding
+                return best
+        self.centroids.append(embedding.copy())
+        return len(self.centroids) - 1
+
+class StreamingRecognizer:
+    """
+    增量识别器：每次送入一个窗口的采样，返回已完整结束的语句
+    末尾尚未结束（距缓冲区末尾不足tail_guard_ms）的语音段留到下一窗口继续累积，
+    累积超过max_segment_ms时不再等待，识别到缓冲区末尾后切分
+    """
+
+    def __init__(self, tail_guard_ms: int = 500, speaker_threshold: float = 0.6,
+                 max_segment_ms: int = int(max_segment_seconds * 1000)):
+        self.tail_guard_ms = tail_guard_ms
+        self.max_segment_ms = max_segment_ms
+        self.speakers = SpeakerRegistry(speaker_threshold)
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_offset_ms = 0  # 缓冲区起点在整段音频中的时间
+
+    def feed(self, samples: np.ndarray) -> list:
+        self.buffer = np.concatenate([self.buffer, samples])
+        return self._process(final=False)
+
+    def flush(self) -> list:
+        """音频结束，识别缓冲区中剩余的所有语音段"""
+        return self._process(final=True)
+
+    def _process(self, final: bool) -> list:
+        if len(self.buffer) == 0:
+            return []
+        with span("asr.stream.window", bytes_in=len(self.buffer) * BYTES_PER_SAMPLE, final=final) as s:
+            lines = self._recognize_buffer(final)
+            s.set(lines=len(lines))
+        return lines
+
+    def _recognize_buffer(self, final: bool) -> list:
+        vad_model, asr_model, spk_model = get_stream_models()
+        samples_per_ms = SAMPLE_RATE // 1000
+        buffer_ms = len(self.buffer) // samples_per_ms
+
+        with _infer_lock:
+            segments = vad_model.generate(input=self.buffer)[0]["value"]
+
+        lines = []
+        cut_ms = None
+        for beg, end in segments:
+            if not final and end >= buffer_ms - self.tail_guard_ms:
+                if buffer_ms - beg < self.max_segment_ms:
+                    # 语音段可能延续到下一窗口，从该段起点保留
+                    cut_ms = beg
+                    break
+                # 持续讲话超过最长语音段：识别到缓冲区末尾并在此切分，之后的语音作为新的一段
+                end = cut_ms = buffer_ms
+            audio = self.buffer[beg * samples_per_ms:end * samples_per_ms]
+            with _infer_lock:
+                text = asr_model.generate(input=audio)[0]["text"]
+                embedding = spk_model.generate(input=audio)[0]["spk_embedding"] if text.strip() else None
+            if embedding is not None:
+                embedding = np.asarray(embedding.cpu() if hasattr(embedding, "cpu") else embedding).reshape(-1)
+                lines.append(format_sentence({
+                    "start": self.buffer_offset_ms + beg,
+                    "spk": self.speakers.assign(embedding),
+                    "text": text,
+                }))
+            if cut_ms is not None:
+                break
+
+        if final:
+            cut_ms = buffer_ms
+        elif cut_ms is None:
+            # 全部语音段已处理，仅保留末尾一小段以免截断刚开始的语音
+            cut_ms = max(0, buffer_ms - self.tail_guard_ms)
+        self.buffer = self.buffer[cut_ms * samples_per_ms:]
+        self.buffer_offset_ms += cut_ms
+        return lines
+
+def stream_file(audio_path: str, window_seconds: float = 5.0, idle_timeout: float = 10.0,
+                poll_interval: float = 0.5, stop: threading.Event = None):
+    """
+    以窗口为单位读取（可能仍在写入的）PCM文件并逐行产出识别结果
+    :param idle_timeout: 文件超过该秒数没有新数据即视为结束
+    :param stop: 设置后在当前窗口结束时停止（不再识别剩余音频），用于客户端断开
+    """
+    recognizer = StreamingRecognizer()
+    window_bytes = int(window_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    pending = b""
+    with open(audio_path, 'rb') as f:
+        if audio_path.lower().endswith(".wav"):
+            f.read(WAV_HEADER_BYTES)
+        last_data_time = time.time()
+        while True:
+            if stop is not None and stop.is_set():
+                return
+            data = f.read(window_bytes - len(pending))
+            if data:
+                pending += data
+                last_data_time = time.time()
+            if len(pending) >= window_bytes:
+                yield from recognizer.feed(pcm_to_float(pending))
+                pending = b""
+            elif time.time() - last_data_time > idle_timeout:
+                break
+            elif not data:
+                time.sleep(poll_interval)
+    if pending:
+        usable = len(pending) - len(pending) % BYTES_PER_SAMPLE
+        yield from recognizer.feed(pcm_to_float(pending[:usable]))
+    yield from recognizer.flush()
+
+# 初始化FastAPI应用
+app = FastAPI()
+add_metrics_route(app)
+
+async def stream_events(request: Request, audio_path: str, window_seconds: float, idle_timeout: float):
+    """逐行产出 ("message", {line})；识别在线程池中执行，客户端断开后停止读取与识别"""
+    stop = threading.Event()
+    lines = stream_file(audio_path, window_seconds, idle_timeout, stop=stop)
+    try:
+        while not await request.is_disconnected():
+            line = await run_in_threadpool(next, lines, None)
+            if line is None:
+                break
+            yield "message", {"line": line}
+    finally:
+        # 识别线程仍在执行时无法关闭生成器，由stop在当前窗口结束后停止
+        stop.set()
+        try:
+            lines.close()
+        except ValueError:
+            pass
+
+# SSE接口：识别服务端（可能仍在写入的）音频文件，逐行推送
+@app.get("/asr/stream")
+async def asr_stream_api(request: Request, audio_path: str, window_seconds: float = 5.0,
+                         idle_timeout: float = 10.0):
+    if not os.path.exists(audio_path):
+        raise HTTPException(status_code=404, detail=f"音频文件 {audio_path} 不存在")
+    return sse_response(stream_events(request, audio_path, window_seconds, idle_timeout))
+
+# WebSocket接口：客户端分块发送PCM二进制数据，发送文本"end"表示结束
+@app.websocket("/asr/ws")
+async def asr_ws_api(websocket: WebSocket, window_seconds: float = 5.0):
+    await websocket.accept()
+    recognizer = StreamingRecognizer()
+    window_bytes = int(window_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    pending = b""
+    try:
+        while True:
+            message = await websocket.receive()
+            if message.get("bytes"):
+                pending += message["bytes"]
+                while len(pending) >= window_bytes:
+                    window, pending = pending[:window_bytes], pending[window_bytes:]
+                    for line in await run_in_threadpool(recognizer.feed, pcm_to_float(window)):
+                        await websocket.send_text(line)
+            elif message["type"] == "websocket.disconnect":
+                return
+            elif message.get("text") == "end":
+                break
+        usable = len(pending) - len(pending) % BYTES_PER_SAMPLE
+        lines = await run_in_threadpool(recognizer.feed, pcm_to_float(pending[:usable]))
+        lines += await run_in_threadpool(recognizer.flush)
+        for line in lines:
+            await websocket.send_text(line)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流式语音转文字")
+    parser.add_argument("audio_path", nargs="?", help="16kHz 16bit 单声道PCM/WAV文件，可仍在写入")
+    parser.add_argument("--window", type=float, default=5.0, help="窗口时长（秒）")
+    parser.add_argument("--idle-timeout", type=float, default=10.0, help="无新数据多少秒后结束")
+    parser.add_argument("--serve", action="store_true", help="以服务模式运行（SSE与WebSocket接口）")
+    parser.add_argument("--port", type=int, default=8003, help="服务端口（8001为预处理等服务，8002为识别服务）")
+    args = parser.parse_args()
+
+    if args.serve:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=args.port)
+    else:
+        get_stream_models()
+        start_time = time.time()
+        first_line_seconds = None
+        for line in stream_file(args.audio_path, args.window, args.idle_timeout):
+            if first_line_seconds is None:
+                first_line_seconds = time.time() - start_time
+                print(f"[首行延迟 {first_line_seconds:.2f}秒]")
+            print(line)
@@ -0,0 +1,128 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 缓存配置
+cache_enabled = os.getenv("LLM_CACHE", "1") == "1"
+cache_path = os.getenv("LLM_CACHE_PATH", "output/.llm_cache.sqlite")
+cache_max_bytes = int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+cache_ttl_seconds = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400
+# 跳过读取缓存（仍会写入新结果），用于强制刷新
+cache_bypass = os.getenv("LLM_CACHE_BYPASS", "0") == "1"
+# 命中时的访问时间先记在内存中，累计到该条数（或写入新条目、淘汰前）时批量写回，命中路径不提交事务
+access_flush_size = 100
+
+
+def make_key(payload: dict) -> str:
+    """按请求内容（模型、系统提示词、输入文本、参数）计算内容哈希"""
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """基于SQLite的响应缓存：超过TTL的条目失效，总大小超限时按最近访问时间淘汰（LRU）"""
+
+    def __init__(self, path: str = cache_path, max_bytes: int = cache_max_bytes,
+                 ttl_seconds: float = cache_ttl_seconds, bypass: bool = cache_bypass):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 尚未写回的访问时间 {键: 时间}
+        self._accessed = {}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON responses(accessed)")
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    def get(self, key: str):
+        """命中返回缓存的响应，未命中或已过期返回None"""
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._accessed[key] = now
+            if len(self._accessed) >= access_flush_size:
+                self._flush_accessed()
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def _flush_accessed(self):
+        """写回内存中的访问时间（调用方持有锁并负责提交）"""
+        if self._accessed:
+            self._conn.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                   [(accessed, key) for key, accessed in self._accessed.items()])
+            self._accessed.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+
+    def put(self, key: str, value: dict):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now),
+            )
+            # 淘汰按访问时间排序，先写回
+            self._flush_accessed()
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        """删除过期条目，再按最近访问时间从旧到新淘汰直到总大小不超过上限"""
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._flush_accessed()
+            self._conn.commit()
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def clear(self):
+        with self._lock:
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
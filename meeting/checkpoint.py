@@ -0,0 +1,132 @@
+"""
+流程检查点：以输入内容的哈希为键保存各阶段（及预处理各块）的结果，重新运行时跳过已完成的部分
+
+目录结构：<CHECKPOINT_DIR>/<输入音频哈希>/<阶段名>-<阶段输入哈希>.json
+阶段输入哈希覆盖该阶段的输入文本与参数，上游结果或参数变化时自动失效
+"""
+import hashlib
+import json
+import os
+import threading
+
+from meeting.asr import write_text_atomic
+from meeting.cache import make_key
+from meeting.routing import get_router
+
+checkpoint_dir = os.getenv("CHECKPOINT_DIR", "output/checkpoints")
+
+
+def hash_file(path: str, block_size: int = 1024 * 1024) -> str:
+    """按文件内容计算哈希，音频改名或移动后仍能找到原检查点"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """一次输入对应的检查点目录，每个检查点为一个原子写入的JSON文件"""
+
+    def __init__(self, root: str, resume: bool = True):
+        self.root = root
+        # 为False时不读取已有检查点（仍写入新结果），用于强制重新运行
+        self.resume = resume
+        self.loaded = 0
+        self.saved = 0
+        # 本次运行读取或写入过的检查点，prune时保留
+        self._touched = set()
+        self._lock = threading.Lock()
+
+    def path(self, name: str, key: str) -> str:
+        return os.path.join(self.root, f"{name}-{key[:32]}.json")
+
+    def load(self, name: str, key: str) -> tuple:
+        """返回(是否存在, 值)"""
+        path = self.path(name, key)
+        if not self.resume or not os.path.exists(path):
+            return False, None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            # 损坏的检查点视为不存在
+            return False, None
+        with self._lock:
+            self.loaded += 1
+            self._touched.add(path)
+        return True, value
+
+    def save(self, name: str, key: str, value):
+        path = self.path(name, key)
+        write_text_atomic(path, json.dumps({"value": value}, ensure_ascii=False))
+        with self._lock:
+            self.saved += 1
+            self._touched.add(path)
+
+    def prune(self) -> int:
+        """
+        删除本次运行未用到的检查点（如修改前的旧块），仅应在整次运行成功后调用，返回删除数
+        只清理本次用到过的类别：某阶段整体命中检查点时，其下各块本次未被访问但仍然有效
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        names = {os.path.basename(path).rsplit("-", 1)[0] for path in self._touched}
+        removed = 0
+        for filename in os.listdir(self.root):
+            path = os.path.join(self.root, filename)
+            if (filename.endswith(".json") and filename.rsplit("-", 1)[0] in names
+                    and path not in self._touched):
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def stage(self, name: str, inputs: dict, func) -> tuple:
+        """
+        运行一个阶段：已有检查点时直接返回，否则执行func并保存结果
+        func应在结果不完整（如部分块失败）时抛出异常，异常时不保存，重新运行时再次执行
+        :param inputs: 该阶段的全部输入（文本与参数），其哈希作为检查点的键
+        :return: (结果, 是否来自检查点)
+        """
+        key = make_key(inputs)
+        found, value = self.load(name, key)
+        if found:
+            return value, True
+        value = func()
+        self.save(name, key, value)
+        return value, False
+
+
+def checkpointed(worker, checkpoint, name: str, inputs):
+    """
+    为分块处理函数加上块级检查点：inputs(chunk)返回该块的全部输入，输入不变的块直接读取已保存的结果
+    checkpoint为None时原样返回worker
+    """
+    if checkpoint is None:
+        return worker
+
+    async def wrapped(chunk):
+        key = make_key(inputs(chunk))
+        found, value = checkpoint.load(name, key)
+        if found:
+            return value
+        value = await worker(chunk)
+        checkpoint.save(name, key, value)
+        return value
+    return wrapped
+
+
+def hash_prompts(prompt_dir: str = "prompt") -> str:
+    """提示词目录的内容哈希，修改任一提示词后依赖它的检查点失效"""
+    prompts = {}
+    for name in sorted(os.listdir(prompt_dir)):
+        path = os.path.join(prompt_dir, name)
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                prompts[name] = f.read()
+    return make_key(prompts)
+
+
+def llm_inputs(text: str, **params) -> dict:
+    """LLM阶段的检查点输入：文本、参数、模型与提示词，任一变化都会重新生成"""
+    return {"text": text, "params": params, "routes": get_router().identity(), "prompts": hash_prompts()}
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from meeting import progress
+from meeting.tracing import span
+
+
+def _start_tasks(chunks: list, worker, max_concurrency: int, span_name: str) -> list:
+    """为每块创建任务，同一时刻最多max_concurrency块在处理"""
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency 必须大于0")
+    semaphore = asyncio.Semaphore(max_concurrency)
+    completed = 0
+
+    async def run_one(index: int, chunk):
+        nonlocal completed
+        queued = time.perf_counter()
+        async with semaphore:
+            print(f"Processing chunk {index + 1}/{len(chunks)}...")
+            try:
+                # 排队等待并发名额的时间单独记录
+                with span(span_name, index=index, total=len(chunks),
+                          wait_seconds=round(time.perf_counter() - queued, 6)):
+                    return await worker(chunk)
+            finally:
+                completed += 1
+                progress.chunk_done(completed, len(chunks))
+
+    return [asyncio.ensure_future(run_one(i, chunk)) for i, chunk in enumerate(chunks)]
+
+
+async def _cancel(tasks: list):
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_chunks(chunks: list, worker, max_concurrency: int = 4,
+                     fail_fast: bool = False, span_name: str = "chunk") -> list:
+    """
+    并发处理文本块（失败重试由LLM客户端统一负责）
+    :param chunks: 待处理的块列表
+    :param worker: 异步处理函数 worker(chunk) -> 结果
+    :param max_concurrency: 同时进行的最大请求数
+    :param fail_fast: 为True时任一块失败即取消其余块并抛出异常
+    :param span_name: 每块记录的span名称，用于区分调用阶段
+    :return: 与chunks顺序一致的结果列表；fail_fast为False时失败块位置为异常对象
+    """
+    tasks = _start_tasks(chunks, worker, max_concurrency, span_name)
+    if not fail_fast:
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        # 出现失败时取消尚未完成的块
+        await _cancel(tasks)
+
+
+async def iter_chunks(chunks: list, worker, max_concurrency: int = 4, span_name: str = "chunk"):
+    """
+    与run_chunks相同的并发处理，但按完成顺序逐块产出 (块序号, 结果)，失败块的结果为异常对象
+    调用方提前结束迭代时取消其余块
+    """
+    tasks = _start_tasks(chunks, worker, max_concurrency, span_name)
+    indexes = {task: i for i, task in enumerate(tasks)}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=indexes.get):
+                yield indexes[task], task.exception() or task.result()
+    finally:
+        await _cancel(tasks)
@@ -0,0 +1,69 @@
+"""
+增量处理：会议仍在进行或转写稿被修改后，只重新处理变化或新增的部分，与已保存的结果合并
+
+预处理的每块、摘要的各时间区间（map）与各组合并（reduce）、导读的各章节都按输入内容保存结果，
+再次运行时内容未变的部分直接读取；最终纪要与整体导读在任一部分变化时重新生成
+
+用法：python -m meeting.incremental output/interview.txt --name weekly-0312
+"""
+import json
+import os
+import time
+from meeting.asr import write_text_atomic
+from meeting.checkpoint import Checkpoint, llm_inputs
+from meeting.introduction import generate_intro
+from meeting.preprocess import preprocess_text
+from meeting.summary import generate_summary
+from meeting.transcript import parse_transcript
+
+incremental_dir = os.getenv("INCREMENTAL_DIR", "output/incremental")
+
+
+def update_meeting(meeting_text: str, checkpoint: Checkpoint, chunk_size: int = 100,
+                   overlap_lines: int = 2, interval_minutes: int = 30, time_interval: int = 25) -> dict:
+    """
+    增量生成预处理文本、摘要与会议介绍
+    预处理按固定行数切分：文本追加时之前的块边界不变（按token切分时最后两块的边界也可能移动），
+    摘要固定使用map_reduce、导读固定使用per_chapter，使结果可以按区间/章节复用
+    """
+    processed_text = preprocess_text(meeting_text, chunk_size=chunk_size, overlap_lines=overlap_lines,
+                                     checkpoint=checkpoint)
+    transcript = parse_transcript(processed_text)
+
+    summary, _ = checkpoint.stage(
+        "summary", llm_inputs(processed_text, interval_minutes=interval_minutes, mode="map_reduce"),
+        lambda: generate_summary(processed_text, interval_minutes, "map_reduce", transcript, checkpoint))
+    intro, _ = checkpoint.stage(
+        "introduction", llm_inputs(processed_text, time_interval=time_interval, mode="per_chapter"),
+        lambda: generate_intro(processed_text, time_interval, "per_chapter", transcript, checkpoint))
+    return {"processed_text": processed_text, "summary": summary, "introduction": intro}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="会议文本增量处理")
+    parser.add_argument("input", help="会议文本文件（带时间戳和发言人）")
+    parser.add_argument("--name", default="", help="会议标识，同一会议的多次更新共用已保存的结果（默认取文件名）")
+    parser.add_argument("--output", default="", help="结果JSON文件（默认 <INCREMENTAL_DIR>/<name>.json）")
+    parser.add_argument("--chunk-size", type=int, default=100, help="预处理每块的行数")
+    parser.add_argument("--interval-minutes", type=int, default=30, help="摘要分段的时间间隔")
+    parser.add_argument("--time-interval", type=int, default=25, help="导读章节的时间间隔")
+    args = parser.parse_args()
+
+    name = args.name or os.path.splitext(os.path.basename(args.input))[0]
+    output = args.output or os.path.join(incremental_dir, f"{name}.json")
+    with open(args.input, 'r', encoding='utf-8') as f:
+        meeting_text = f.read()
+
+    checkpoint = Checkpoint(os.path.join(incremental_dir, name))
+    start_time = time.time()
+    result = update_meeting(meeting_text, checkpoint, chunk_size=args.chunk_size,
+                            interval_minutes=args.interval_minutes, time_interval=args.time_interval)
+    elapsed = time.time() - start_time
+
+    write_text_atomic(output, json.dumps(result, ensure_ascii=False, indent=2))
+    # 成功后清理本次未用到的旧结果，避免多次更新后不断累积
+    removed = checkpoint.prune()
+    print(f"增量处理完成，耗时: {elapsed:.2f}秒")
+    print(f"复用已保存结果 {checkpoint.loaded} 项，新处理 {checkpoint.saved} 项，清理过期结果 {removed} 项")
+    print(f"结果已写入 {output}")
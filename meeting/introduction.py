@@ -1,79 +1,39 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import requests
 import re
 import json
 import os
-from dotenv import load_dotenv
-
-# 加载环境变量
-load_dotenv()
-api_key = os.getenv("DEFAULT_API_KEY")
-endpoint = "https://api.deepseek.com/chat/completions"
+from meeting.checkpoint import checkpointed
+from meeting.chunk_engine import iter_chunks, run_chunks
+from meeting.llm_client import extract_content, run_async
+from meeting.routing import get_router
+from meeting.sse import sse_response
+from meeting.tracing import add_metrics_route
+from meeting.transcript import Transcript, parse_transcript, split_rolling
 
 # 初始化FastAPI应用
 app = FastAPI()
+add_metrics_route(app)
+
+# 逐章节生成时同时请求的章节数
+default_concurrency = int(os.getenv("INTRO_CONCURRENCY", "4"))
+
+INTRO_MODES = ("single", "per_chapter")
 
 class IntroductionRequest(BaseModel):
     time_interval: int = 25
     meeting_text: str
+    mode: str = "single"  # single: 整场一次调用；per_chapter: 各章节并发生成后再生成整体导读
+    stream: bool = False  # 以SSE流式返回模型输出
 
 def parse_meeting_content(content: str) -> list:
     """解析会议内容为（时间(总秒数), 发言人, 内容）条目"""
-    entries = []
-    lines = content.split('\n')
-    
-    # 解析每行（格式：MM:SS 发言人x: 内容，MM为分钟(无进制限制)，SS为秒(60进制)）
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        # 匹配时间格式(MM可以是1位或多位数字，SS是两位数字)
-        match = re.match(r'^(\d+:\d{2}) 发言人(\d+): (.+)$', line)
-        if not match:
-            continue
-        time_str, spk, content = match.groups()
-        
-        # 解析MM:SS为总秒数
-        mm_ss = time_str.split(':')
-        if len(mm_ss) != 2:
-            continue  # 格式错误
-        try:
-            minutes = int(mm_ss[0])
-            seconds = int(mm_ss[1])
-            if seconds < 0 or seconds >= 60:
-                continue  # 秒数必须是60进制(0-59)
-        except ValueError:
-            continue  # 转换失败
-        
-        total_seconds = minutes * 60 + seconds
-        entries.append((total_seconds, f"发言人{spk}", content))
-    
-    # 按时间排序（确保条目顺序正确）
-    return sorted(entries, key=lambda x: x[0])
+    return parse_transcript(content).entries()
 
 def split_by_time_interval(entries: list, interval_minutes: int) -> list:
     """按时间间隔分割条目"""
-    if not entries:
-        return []
-    
-    segments = []
-    current_segment = [entries[0]]
-    start_time = entries[0][0]  # 起始时间(总秒数)
-    interval_seconds = interval_minutes * 60  # 转换为秒
-    
-    for entry in entries[1:]:
-        time_diff = entry[0] - start_time
-        if time_diff >= interval_seconds:
-            segments.append(current_segment)
-            current_segment = [entry]
-            start_time = entry[0]
-        else:
-            current_segment.append(entry)
-    
-    if current_segment:
-        segments.append(current_segment)
-    return segments
+    seconds = [entry[0] for entry in entries]
+    return [entries[start:stop] for start, stop in split_rolling(seconds, interval_minutes * 60)]
 
 def format_segment(segment: list) -> str:
     """格式化时间段内容为文本"""
@@ -86,26 +46,6 @@ def format_segment(segment: list) -> str:
         formatted.append(f"{speaker} {time_str}\n{content}")
     return "\n\n".join(formatted)
 
-def call_api(system_prompt: str, user_input: str) -> dict:
-    """调用DeepSeek API"""
-    if not api_key:
-        raise ValueError("API密钥未配置（请检查环境变量DEFAULT_API_KEY）")
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "deepseek-reasoner",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input}
-        ]
-    }
-    response = requests.post(endpoint, json=data, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"API调用失败：状态码{response.status_code}，响应：{response.text}")
-    return response.json()
-
 def extract_section_summaries(api_response: dict, num_sections: int) -> list:
     """从API响应中提取指定数量的章节速览"""
     try:
@@ -131,32 +71,97 @@ def extract_section_summaries(api_response: dict, num_sections: int) -> list:
         print(f"提取章节速览时出错: {e}")
         return []
 
-def generate_intro(meeting_text: str, time_interval: int = 25) -> dict:
-    """
-    生成会议介绍核心函数
-    :param meeting_text: 会议文本内容（带时间戳和发言人）
-    :param time_interval: 章节时间间隔（分钟）
-    :return: 结构化的会议介绍JSON
-    """
-    # 加载提示词
-    prompt_file = "prompt/introduction.txt"
+def load_prompt(prompt_file: str) -> str:
+    """加载提示词文件"""
     if not os.path.exists(prompt_file):
         raise FileNotFoundError(f"提示词文件不存在：{prompt_file}")
     with open(prompt_file, 'r', encoding='utf-8') as f:
-        system_prompt = f.read()
-    
-    # 解析会议内容
-    entries = parse_meeting_content(meeting_text)
-    if not entries:
+        return f.read()
+
+def segment_meeting(meeting_text: str, time_interval: int = 25, transcript: Transcript = None) -> list:
+    """解析会议内容并按时间间隔切分为章节时间段，已有解析结果时直接复用"""
+    transcript = transcript or parse_transcript(meeting_text)
+    if not len(transcript):
         raise ValueError("无法解析会议内容，未提取到有效条目")
     
     # 按时间间隔分割
-    segments = split_by_time_interval(entries, time_interval)
+    segments = [transcript.entries(start, stop) for start, stop in transcript.split_rolling(time_interval)]
     if not segments:
         raise ValueError("未生成有效时间段")
+    return segments
+
+def build_intro_input(meeting_text: str, time_interval: int = 25, transcript: Transcript = None) -> tuple:
+    """加载提示词并按时间间隔切分会议内容，返回(system_prompt, segments)"""
+    system_prompt = load_prompt("prompt/introduction.txt")
+    return system_prompt, segment_meeting(meeting_text, time_interval, transcript)
+
+def parse_json_content(content: str) -> dict:
+    """解析模型返回的JSON，兼容```json代码块包裹"""
+    content = content.strip()
+    fence = re.match(r'^```(?:json)?\s*(.*?)\s*```$', content, re.S)
+    if fence:
+        content = fence.group(1)
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        raise ValueError("API返回内容不是有效的JSON格式")
+
+def make_chapter_worker(checkpoint=None):
+    """
+    单章节处理函数：为一个时间段生成标题与详细总结
+    :param checkpoint: 传入Checkpoint时保存各章节结果，内容未变的时间段不再重新生成
+    """
+    router = get_router()
+    chapter_prompt = load_prompt("prompt/introduction_chapter.txt")
     
-    # 仅调用一次API处理完整内容
-    full_result = call_api(system_prompt, meeting_text)
+    async def chapter_worker(segment: list) -> dict:
+        chapter = parse_json_content(extract_content(
+            await router.achat("introduction.chapter", chapter_prompt, format_segment(segment))
+        ))
+        start_time = segment[0][0]
+        return {
+            "timestamp": f"{start_time // 60:02d}:{start_time % 60:02d}",
+            "title": chapter.get("title", ""),
+            "detailed_summary": chapter.get("detailed_summary", "")
+        }
+    return checkpointed(chapter_worker, checkpoint, "introduction.chapter", lambda segment: {
+        "route": router.route("introduction.chapter").identity(), "system": chapter_prompt,
+        "input": format_segment(segment)})
+
+def build_overall_input(chapters: list) -> str:
+    """以各章节速览构造整体导读的输入"""
+    return "\n\n".join(
+        f"{i}. {c['timestamp']} {c['title']}\n{c['detailed_summary']}"
+        for i, c in enumerate(chapters, 1)
+    )
+
+def combine_intro(overall_result: dict, chapters: list) -> dict:
+    """合并整体导读与章节速览"""
+    overall = parse_json_content(extract_content(overall_result))
+    return {
+        "keywords": overall.get("keywords", ""),
+        "conclusion": overall.get("conclusion", ""),
+        "chapter_overview": chapters,
+        "key_points_review": overall.get("key_points_review", [])
+    }
+
+async def aper_chapter_intro(meeting_text: str, time_interval: int = 25,
+                             max_concurrency: int = default_concurrency,
+                             transcript: Transcript = None, checkpoint=None) -> dict:
+    """
+    逐章节生成会议介绍：每个时间段单独生成章节速览（并发），再用章节速览生成关键词、全文概要与要点回顾
+    章节与时间段一一对应，单次调用的输入长度不随会议时长增长
+    """
+    segments = segment_meeting(meeting_text, time_interval, transcript)
+    chapters = await run_chunks(segments, make_chapter_worker(checkpoint), max_concurrency, fail_fast=True,
+                                span_name="introduction.chapter")
+    overall_prompt = load_prompt("prompt/introduction_overall.txt")
+    overall_result = await get_router().achat("introduction.overall", overall_prompt,
+                                              build_overall_input(chapters))
+    return combine_intro(overall_result, chapters)
+
+def parse_intro_result(full_result: dict, segments: list) -> dict:
+    """解析API返回内容，并按时间段整理章节速览"""
     full_content = ""
     for choice in full_result.get('choices', []):
         full_content = choice.get('message', {}).get('content', '')
@@ -207,11 +212,80 @@ def generate_intro(meeting_text: str, time_interval: int = 25) -> dict:
     except json.JSONDecodeError:
         raise ValueError("API返回内容不是有效的JSON格式")
 
+def check_mode(mode: str):
+    if mode not in INTRO_MODES:
+        raise ValueError(f"不支持的导读模式: {mode}，可选: {', '.join(INTRO_MODES)}")
+
+def generate_intro(meeting_text: str, time_interval: int = 25, mode: str = "single",
+                   transcript: Transcript = None, checkpoint=None) -> dict:
+    """
+    生成会议介绍核心函数
+    :param meeting_text: 会议文本内容（带时间戳和发言人）
+    :param time_interval: 章节时间间隔（分钟）
+    :param mode: single整场一次调用；per_chapter各章节并发生成
+    :param transcript: 已解析的会议文本，流水线中可复用同一份解析结果
+    :param checkpoint: meeting.checkpoint.Checkpoint，per_chapter模式下保存各章节结果
+    :return: 结构化的会议介绍JSON
+    """
+    check_mode(mode)
+    if mode == "per_chapter":
+        return run_async(aper_chapter_intro(meeting_text, time_interval, transcript=transcript,
+                                            checkpoint=checkpoint))
+    system_prompt, segments = build_intro_input(meeting_text, time_interval, transcript)
+    # 仅调用一次API处理完整内容
+    full_result = get_router().chat("introduction", system_prompt, meeting_text)
+    return parse_intro_result(full_result, segments)
+
+async def agenerate_intro(meeting_text: str, time_interval: int = 25, mode: str = "single",
+                          transcript: Transcript = None) -> dict:
+    """generate_intro的异步版本，供接口使用，等待API期间不阻塞事件循环"""
+    check_mode(mode)
+    if mode == "per_chapter":
+        return await aper_chapter_intro(meeting_text, time_interval, transcript=transcript)
+    system_prompt, segments = build_intro_input(meeting_text, time_interval, transcript)
+    full_result = await get_router().achat("introduction", system_prompt, meeting_text)
+    return parse_intro_result(full_result, segments)
+
+async def astream_intro(meeting_text: str, time_interval: int = 25, mode: str = "single",
+                        transcript: Transcript = None):
+    """
+    流式生成会议介绍：逐段产出 ("reasoning"/"content", {text})，最后产出 ("result", 会议介绍JSON)
+    per_chapter模式下每完成一个章节先产出 ("chapter", {index, total, chapter})
+    """
+    check_mode(mode)
+    if mode == "per_chapter":
+        segments = segment_meeting(meeting_text, time_interval, transcript)
+        chapters = [None] * len(segments)
+        async for index, chapter in iter_chunks(segments, make_chapter_worker(), default_concurrency,
+                                                span_name="introduction.chapter"):
+            if isinstance(chapter, Exception):
+                raise chapter
+            chapters[index] = chapter
+            yield "chapter", {"index": index, "total": len(segments), "chapter": chapter}
+        system_prompt = load_prompt("prompt/introduction_overall.txt")
+        user_input = build_overall_input(chapters)
+        stage = "introduction.overall"
+    else:
+        system_prompt, segments = build_intro_input(meeting_text, time_interval, transcript)
+        user_input = meeting_text
+        stage = "introduction"
+    async for kind, value in get_router().astream(stage, system_prompt, user_input):
+        if kind != "done":
+            yield kind, {"text": value}
+        elif mode == "per_chapter":
+            yield "result", combine_intro(value, chapters)
+        else:
+            yield "result", parse_intro_result(value, segments)
+
 # FastAPI接口
 @app.post("/introduction")
 async def introduction_api(request: IntroductionRequest):
     try:
-        return generate_intro(request.meeting_text, request.time_interval)
+        if request.stream:
+            # 参数错误在开始推送前以普通错误返回
+            check_mode(request.mode)
+            return sse_response(astream_intro(request.meeting_text, request.time_interval, request.mode))
+        return await agenerate_intro(request.meeting_text, request.time_interval, request.mode)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
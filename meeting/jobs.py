@@ -0,0 +1,331 @@
+"""
+异步任务接口：提交音频或会议文本后立即返回任务ID，由后台工作线程池执行完整流程，
+任务状态、进度与结果保存在本地SQLite中，客户端断开或服务重启都不会丢失
+
+用法：python -m meeting.jobs --port 8004 --workers 2
+    POST /jobs                 提交任务（上传音频file、服务端音频audio_path或会议文本meeting_text）
+    GET  /jobs/{job_id}        查询状态与进度（当前阶段、已完成块数/总块数）
+    GET  /jobs/{job_id}/result 获取结果
+"""
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from contextlib import asynccontextmanager
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from meeting import progress
+from meeting.introduction import INTRO_MODES
+from meeting.summary import SUMMARY_MODES
+from meeting.tracing import add_metrics_route
+
+# 任务配置
+job_db_path = os.getenv("JOB_DB_PATH", "output/jobs.sqlite")
+job_upload_dir = os.getenv("JOB_UPLOAD_DIR", "output/jobs")
+job_workers = int(os.getenv("JOB_WORKERS", "2"))
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class JobStore:
+    """基于SQLite的任务存储，多线程共享一个连接并以锁串行访问"""
+
+    def __init__(self, path: str = job_db_path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "progress TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, "
+            "created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status_created ON jobs(status, created)")
+        self._conn.commit()
+
+    def create(self, params: dict, job_id: str = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, created) VALUES (?, 'queued', ?, ?)",
+                (job_id, json.dumps(params, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self):
+        """取出最早排队的任务并标记为运行中，没有时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row[0])
+            )
+            self._conn.commit()
+        return row[0], json.loads(row[1])
+
+    def requeue_running(self) -> int:
+        """服务重启时，将上次未执行完的任务重新排队"""
+        with self._lock:
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', progress = '{}' WHERE status = 'running'"
+            ).rowcount
+            self._conn.commit()
+        return count
+
+    def update_progress(self, job_id: str, stage: str, status: str, done: int = None, total: int = None):
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0])
+            entry = stages.setdefault(stage, {})
+            entry["status"] = status
+            if done is not None:
+                entry["done"], entry["total"] = done, total
+            self._conn.execute("UPDATE jobs SET progress = ? WHERE id = ?",
+                               (json.dumps(stages, ensure_ascii=False), job_id))
+            self._conn.commit()
+
+    def finish(self, job_id: str, result: dict = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                ("failed" if error is not None else "succeeded",
+                 json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str, with_result: bool = False):
+        columns = "id, status, params, progress, error, created, started, finished, result"
+        with self._lock:
+            row = self._conn.execute(f"SELECT {columns} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        params = json.loads(row[2])
+        # 会议文本可能很长，状态中不回显
+        params.pop("meeting_text", None)
+        stages = json.loads(row[3])
+        job = {
+            "id": row[0],
+            "status": row[1],
+            "params": params,
+            "stage": [name for name, entry in stages.items() if entry["status"] == "running"],
+            "progress": stages,
+            "error": row[4],
+            "created": row[5],
+            "started": row[6],
+            "finished": row[7],
+        }
+        if with_result:
+            job["result"] = json.loads(row[8]) if row[8] else None
+        return job
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: dict(rows).get(status, 0) for status in JOB_STATUSES}
+
+
+def run_meeting_job(params: dict) -> dict:
+    """
+    执行一个会议任务：（语音转文字）→ 预处理 → 摘要与会议介绍（并发）
+    各阶段通过progress.stage上报，分块进度由分块引擎自动上报到当前阶段
+    """
+    from meeting.asr import audio_to_text
+    from meeting.introduction import generate_intro
+    from meeting.pipeline import Pipeline
+    from meeting.preprocess import preprocess_text
+    from meeting.summary import generate_summary
+    from meeting.transcript import parse_transcript
+
+    def staged(name: str, func):
+        def run(*args):
+            with progress.stage(name):
+                return func(*args)
+        return run
+
+    pipeline = Pipeline(max_workers=2)
+    if params.get("audio_path"):
+        pipeline.add("input", staged("asr", lambda: audio_to_text(params["audio_path"], output_txt=None)))
+    else:
+        pipeline.add("input", lambda: params["meeting_text"])
+    pipeline.add("preprocess", staged("preprocess", lambda text: preprocess_text(
+        text, max_tokens=2000, overlap_lines=2)), deps=("input",))
+    pipeline.add("transcript", parse_transcript, deps=("preprocess",))
+    pipeline.add("summary", staged("summary", lambda text, transcript: generate_summary(
+        text, params.get("interval_minutes", 30), params.get("summary_mode", "auto"), transcript)),
+        deps=("preprocess", "transcript"))
+    pipeline.add("introduction", staged("introduction", lambda text, transcript: generate_intro(
+        text, params.get("time_interval", 25), params.get("intro_mode", "per_chapter"), transcript)),
+        deps=("preprocess", "transcript"))
+
+    results = pipeline.run()
+    failed = [r for r in results.values() if r.error is not None]
+    if failed:
+        raise RuntimeError("; ".join(f"{r.name}: {r.error}" for r in failed))
+    return {
+        "meeting_text": results["input"].value,
+        "processed_text": results["preprocess"].value,
+        "summary": results["summary"].value,
+        "introduction": results["introduction"].value,
+    }
+
+
+class JobWorkerPool:
+    """固定数量的工作线程，从任务存储中依次领取排队的任务执行"""
+
+    def __init__(self, store: JobStore, workers: int = job_workers, handler=run_meeting_job,
+                 poll_interval: float = 1.0):
+        self.store = store
+        self.workers = workers
+        self.handler = handler
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        requeued = self.store.requeue_running()
+        if requeued:
+            print(f"重新排队上次未完成的任务: {requeued}个")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        """有新任务提交时唤醒空闲的工作线程"""
+        self._wakeup.set()
+
+    def stop(self, timeout: float = None):
+        """停止领取新任务；正在执行的任务在重启后重新排队"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            claimed = self.store.claim()
+            if claimed is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            job_id, params = claimed
+            print(f"开始执行任务 {job_id}")
+
+            def report(stage, status, done, total):
+                self.store.update_progress(job_id, stage, status, done, total)
+
+            try:
+                with progress.reporting(report):
+                    result = self.handler(params)
+                self.store.finish(job_id, result=result)
+                print(f"任务 {job_id} 完成")
+            except Exception as e:
+                self.store.finish(job_id, error=str(e))
+                print(f"任务 {job_id} 失败: {e}")
+
+
+store = None
+pool = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global store, pool
+    store = JobStore()
+    pool = JobWorkerPool(store, job_workers)
+    pool.start()
+    yield
+    pool.stop(timeout=5)
+
+
+# 初始化FastAPI应用
+app = FastAPI(lifespan=lifespan)
+add_metrics_route(app)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(None), audio_path: str = Form(None),
+                     meeting_text: str = Form(None), interval_minutes: int = Form(30),
+                     time_interval: int = Form(25), summary_mode: str = Form("auto"),
+                     intro_mode: str = Form("per_chapter")):
+    if file is None and not audio_path and not meeting_text:
+        raise HTTPException(status_code=400, detail="请上传音频文件、提供audio_path或meeting_text")
+    if file is None and audio_path and not os.path.exists(audio_path):
+        raise HTTPException(status_code=404, detail=f"音频文件 {audio_path} 不存在")
+    if summary_mode not in SUMMARY_MODES or intro_mode not in INTRO_MODES:
+        raise HTTPException(status_code=400, detail=f"摘要模式可选: {', '.join(SUMMARY_MODES)}；"
+                                                    f"导读模式可选: {', '.join(INTRO_MODES)}")
+
+    job_id = uuid.uuid4().hex
+    if file is not None:
+        # 上传文件保存在任务目录下，服务重启后任务仍可重新执行
+        job_dir = os.path.join(job_upload_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        suffix = os.path.splitext(file.filename or "")[1]
+        audio_path = os.path.join(job_dir, f"upload{suffix}")
+        with open(audio_path, 'wb') as f:
+            shutil.copyfileobj(file.file, f)
+
+    params = {
+        "audio_path": audio_path,
+        "meeting_text": None if audio_path else meeting_text,
+        "interval_minutes": interval_minutes,
+        "time_interval": time_interval,
+        "summary_mode": summary_mode,
+        "intro_mode": intro_mode,
+    }
+    store.create(params, job_id)
+    pool.notify()
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs")
+async def job_counts():
+    """各状态的任务数"""
+    return store.counts()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = store.get(job_id, with_result=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务 {job_id} 不存在")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "succeeded":
+        # 尚未完成，客户端稍后重试
+        raise HTTPException(status_code=409, detail=f"任务尚未完成，当前状态: {job['status']}")
+    return job["result"]
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+    parser = argparse.ArgumentParser(description="会议异步任务服务")
+    parser.add_argument("--port", type=int, default=8004, help="服务端口（8001~8003为其他模块的服务）")
+    parser.add_argument("--workers", type=int, default=job_workers, help="同时执行的任务数")
+    args = parser.parse_args()
+
+    job_workers = args.workers
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
@@ -0,0 +1,397 @@
+import asyncio
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+import httpx
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from meeting.cache import ResponseCache, cache_enabled, make_key
+from meeting.rate_limit import RateLimiter, parse_retry_after
+from meeting.tokenizer import estimate_tokens
+from meeting.tracing import current_span, finish_span, span, start_span
+
+# 加载环境变量
+load_dotenv()
+
+# 从环境变量获取API配置
+api_key = os.getenv("DEFAULT_API_KEY")
+endpoint = os.getenv("DEEPSEEK_ENDPOINT", "https://api.deepseek.com/chat/completions")
+default_model = os.getenv("DEEPSEEK_MODEL", "deepseek-reasoner")
+
+# 连接配置：deepseek-reasoner单次响应可达数分钟，读超时需留足余量
+connect_timeout = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+read_timeout = float(os.getenv("LLM_READ_TIMEOUT", "900"))
+pool_size = int(os.getenv("LLM_POOL_SIZE", "16"))
+max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# 429（限流）单独计数，限流时多等几次而不是让整个阶段失败
+max_throttled_retries = int(os.getenv("LLM_MAX_THROTTLED_RETRIES", "8"))
+# Retry-After的等待上限（秒）
+max_retry_after = float(os.getenv("LLM_MAX_RETRY_AFTER", "120"))
+
+
+class APIError(Exception):
+    """LLM接口返回非200状态码时抛出，携带状态码（及Retry-After秒数）便于判断是否重试"""
+
+    def __init__(self, status_code: int, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def check_status(response, body: str = None):
+    """非200响应转换为APIError"""
+    if response.status_code != 200:
+        raise APIError(response.status_code,
+                       f"API调用失败：状态码{response.status_code}，响应：{response.text if body is None else body}",
+                       retry_after=parse_retry_after(response.headers.get("Retry-After")))
+
+
+@dataclass
+class RetryPolicy:
+    """重试策略：对429/5xx及连接失败按指数退避（带抖动）重试，响应带Retry-After时按其等待"""
+    max_retries: int = max_retries
+    base_delay: float = 1.0  # 首次重试等待秒数
+    max_delay: float = 30.0  # 单次等待上限
+    max_throttled_retries: int = max_throttled_retries  # 429的重试次数上限
+    max_retry_after: float = max_retry_after  # Retry-After的等待上限
+
+    def is_retryable(self, error: Exception) -> bool:
+        if isinstance(error, (requests.ConnectionError, httpx.ConnectError)):
+            return True
+        status_code = getattr(error, "status_code", None)
+        return status_code == 429 or (status_code is not None and 500 <= status_code < 600)
+
+    def allows(self, attempt: int, error: Exception) -> bool:
+        """已重试attempt次后是否还能重试"""
+        limit = self.max_throttled_retries if getattr(error, "status_code", None) == 429 else self.max_retries
+        return attempt < limit and self.is_retryable(error)
+
+    def backoff(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间（attempt从0开始）"""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """重试前的等待时间：优先遵循上游的Retry-After"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return self.backoff(attempt)
+
+
+class LLMClient:
+    """DeepSeek对话接口客户端：复用连接池（keep-alive），同时提供同步与异步调用"""
+
+    def __init__(self, api_key: str = api_key, endpoint: str = endpoint,
+                 model: str = default_model, connect_timeout: float = connect_timeout,
+                 read_timeout: float = read_timeout, pool_size: int = pool_size,
+                 retry: RetryPolicy = None, cache: ResponseCache = None,
+                 limiter: RateLimiter = None):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.model = model
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.retry = retry or RetryPolicy()
+        # 响应缓存，为None时不缓存
+        self.cache = cache
+        # 限流器（令牌桶与自适应并发上限），为None时不限流
+        self.limiter = limiter
+
+        # 同步会话，requests的连接池可在多线程间共享
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # 异步客户端与事件循环绑定，每个事件循环各自持有一个
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _headers(self) -> dict:
+        if not self.api_key:
+            raise ValueError("API密钥未配置（请检查环境变量DEFAULT_API_KEY）")
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def _payload(self, system_prompt: str, user_input: str, params: dict) -> dict:
+        data = {
+            "model": params.pop("model", self.model),
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_input}
+            ]
+        }
+        data.update(params)
+        return data
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def _cached(self, data: dict, use_cache: bool):
+        """返回(缓存键, 命中的响应)；不使用缓存时缓存键为None"""
+        if self.cache is None or not use_cache:
+            return None, None
+        key = make_key(data)
+        return key, self.cache.get(key)
+
+    async def _acached(self, data: dict, use_cache: bool):
+        """异步调用的缓存查询，SQLite读取放到线程中执行，不阻塞事件循环"""
+        if self.cache is None or not use_cache:
+            return None, None
+        return await asyncio.to_thread(self._cached, data, use_cache)
+
+    def _store(self, cache_key: str, result: dict):
+        """写入缓存；回答为空的响应不缓存，下次重新调用"""
+        if cache_key and extract_content(result).strip():
+            self.cache.put(cache_key, result)
+
+    async def _astore(self, cache_key: str, result: dict):
+        if cache_key:
+            await asyncio.to_thread(self._store, cache_key, result)
+
+    def _estimate_tokens(self, data: dict) -> int:
+        return sum(estimate_tokens(message["content"]) for message in data["messages"])
+
+    def _slot(self, data: dict):
+        """同步调用占用一个限流名额，未配置限流器时为空操作"""
+        if self.limiter is None:
+            return contextlib.nullcontext()
+        return self.limiter.slot(self._estimate_tokens(data))
+
+    def _aslot(self, data: dict):
+        if self.limiter is None:
+            return contextlib.nullcontext()
+        return self.limiter.aslot(self._estimate_tokens(data))
+
+    def _span(self, data: dict, system_prompt: str, user_input: str):
+        return span("llm.chat", model=data["model"],
+                    bytes_in=len(system_prompt.encode("utf-8")) + len(user_input.encode("utf-8")))
+
+    def chat(self, system_prompt: str, user_input: str, use_cache: bool = True, **params) -> dict:
+        """同步调用对话接口，params会合并进请求体（如temperature）"""
+        headers = self._headers()
+        data = self._payload(system_prompt, user_input, params)
+        with self._span(data, system_prompt, user_input) as s:
+            cache_key, cached = self._cached(data, use_cache)
+            s.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            result = self._post(headers, data)
+            record_usage(s, result)
+        self._store(cache_key, result)
+        return result
+
+    def _post(self, headers: dict, data: dict) -> dict:
+        attempt = 0
+        while True:
+            try:
+                with self._slot(data) as permit:
+                    start = time.perf_counter()
+                    response = self._session.post(
+                        self.endpoint, json=data, headers=headers,
+                        timeout=(self.connect_timeout, self.read_timeout)
+                    )
+                    check_status(response)
+                    result = decode_response(response, start)
+                    if permit is not None:
+                        permit.record(result)
+                    return result
+            except Exception as e:
+                if not self.retry.allows(attempt, e):
+                    raise
+                time.sleep(self.retry.delay(attempt, e))
+                attempt += 1
+                record_retry()
+
+    async def achat(self, system_prompt: str, user_input: str, use_cache: bool = True, **params) -> dict:
+        """异步调用对话接口，不阻塞事件循环"""
+        headers = self._headers()
+        data = self._payload(system_prompt, user_input, params)
+        with self._span(data, system_prompt, user_input) as s:
+            cache_key, cached = await self._acached(data, use_cache)
+            s.set(cache_hit=cached is not None)
+            if cached is not None:
+                return cached
+            result = await self._apost(headers, data)
+            record_usage(s, result)
+        await self._astore(cache_key, result)
+        return result
+
+    async def _apost(self, headers: dict, data: dict) -> dict:
+        client = self._async_client()
+        attempt = 0
+        while True:
+            try:
+                async with self._aslot(data) as permit:
+                    start = time.perf_counter()
+                    response = await client.post(self.endpoint, json=data, headers=headers)
+                    check_status(response)
+                    result = decode_response(response, start)
+                    if permit is not None:
+                        permit.record(result)
+                    return result
+            except Exception as e:
+                if not self.retry.allows(attempt, e):
+                    raise
+                await asyncio.sleep(self.retry.delay(attempt, e))
+                attempt += 1
+                record_retry()
+
+    async def astream(self, system_prompt: str, user_input: str, use_cache: bool = True, **params):
+        """
+        以流式方式（stream=true）调用对话接口，逐段产出 (类型, 内容)：
+        ("reasoning", 推理增量) / ("content", 回答增量)，最后产出 ("done", 完整响应)
+        完整响应与chat()返回的结构一致，并与非流式调用共用缓存；仅在收到首段内容前重试
+        """
+        headers = self._headers()
+        data = self._payload(system_prompt, user_input, params)
+        cache_key, cached = await self._acached(data, use_cache)
+        if cached is not None:
+            yield "content", extract_content(cached)
+            yield "done", cached
+            return
+
+        stream_data = dict(data, stream=True, stream_options={"include_usage": True})
+        s = start_span("llm.stream", model=data["model"], cache_hit=False,
+                       bytes_in=len(system_prompt.encode("utf-8")) + len(user_input.encode("utf-8")))
+        client = self._async_client()
+        content, reasoning, usage = [], [], {}
+        attempt = 0
+        try:
+            while True:
+                try:
+                    async with self._aslot(data) as permit, \
+                            client.stream("POST", self.endpoint, json=stream_data, headers=headers) as response:
+                        if response.status_code != 200:
+                            check_status(response, (await response.aread()).decode("utf-8", errors="replace"))
+                        async for line in response.aiter_lines():
+                            # 忽略空行与服务端的keep-alive注释
+                            if not line.startswith("data:"):
+                                continue
+                            payload = line[5:].strip()
+                            if payload == "[DONE]":
+                                break
+                            event = json.loads(payload)
+                            usage = event.get("usage") or usage
+                            for choice in event.get("choices") or []:
+                                delta = choice.get("delta") or {}
+                                for kind, key, parts in (("reasoning", "reasoning_content", reasoning),
+                                                         ("content", "content", content)):
+                                    text = delta.get(key)
+                                    if text:
+                                        if not content and not reasoning:
+                                            s.set(first_token_seconds=round(time.time() - s.start, 6))
+                                        parts.append(text)
+                                        yield kind, text
+                        if permit is not None:
+                            permit.record({"usage": usage})
+                    break
+                except Exception as e:
+                    # 已向调用方产出内容后不能重试，否则内容会重复
+                    if content or reasoning or not self.retry.allows(attempt, e):
+                        raise
+                    await asyncio.sleep(self.retry.delay(attempt, e))
+                    attempt += 1
+                    s.add("retries")
+        except BaseException as e:
+            finish_span(s, e)
+            raise
+
+        result = {
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                "role": "assistant", "content": "".join(content), "reasoning_content": "".join(reasoning)}}],
+            "usage": usage,
+        }
+        record_usage(s, result)
+        s.set(bytes_out=len(result["choices"][0]["message"]["content"].encode("utf-8")))
+        finish_span(s)
+        await self._astore(cache_key, result)
+        yield "done", result
+
+    def close(self):
+        self._session.close()
+
+    async def aclose(self):
+        """关闭当前事件循环上的异步客户端"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+def decode_response(response, start: float) -> dict:
+    """解析响应JSON，将等待响应与解析JSON的耗时分别记入当前span"""
+    received = time.perf_counter()
+    result = response.json()
+    current = current_span()
+    if current is not None:
+        current.add("network_seconds", round(received - start, 6))
+        current.add("decode_seconds", round(time.perf_counter() - received, 6))
+        current.set(bytes_out=len(response.content))
+    return result
+
+
+def record_retry():
+    current = current_span()
+    if current is not None:
+        current.add("retries")
+
+
+def record_usage(current, result: dict):
+    """记录API响应usage字段中的token数（deepseek-reasoner另含推理token数）"""
+    usage = result.get("usage") or {}
+    details = usage.get("completion_tokens_details") or {}
+    current.set(prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                reasoning_tokens=details.get("reasoning_tokens", 0))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """获取进程内共享的客户端"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(cache=ResponseCache() if cache_enabled else None, limiter=RateLimiter())
+        return _client
+
+
+def extract_content(result: dict) -> str:
+    """从API响应中取出第一条非空content，没有则返回空字符串"""
+    for choice in result.get('choices', []):
+        message_content = choice.get('message', {}).get('content')
+        if message_content:
+            return message_content
+    return ""
+
+
+def run_async(coro):
+    """在新的事件循环中运行协程（供同步入口使用），结束后释放该循环上的异步连接"""
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await get_client().aclose()
+    return asyncio.run(runner())
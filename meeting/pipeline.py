@@ -0,0 +1,90 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from meeting.tracing import span
+
+
+@dataclass
+class Stage:
+    """流水线中的一个阶段，func以依赖阶段的结果（按deps顺序）作为位置参数"""
+    name: str
+    func: object
+    deps: tuple = ()
+
+
+@dataclass
+class StageResult:
+    name: str
+    value: object = None
+    error: Exception = None
+    elapsed: float = 0.0
+    skipped: bool = False  # 依赖阶段失败而未执行
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.skipped
+
+
+@dataclass
+class Pipeline:
+    """按依赖关系调度阶段：输入就绪的阶段并发执行，单个阶段失败只影响依赖它的阶段"""
+    stages: list = field(default_factory=list)
+    max_workers: int = 4
+
+    def add(self, name: str, func, deps: tuple = ()) -> "Pipeline":
+        self.stages.append(Stage(name, func, tuple(deps)))
+        return self
+
+    def run(self) -> dict:
+        names = {stage.name for stage in self.stages}
+        for stage in self.stages:
+            missing = [dep for dep in stage.deps if dep not in names]
+            if missing:
+                raise ValueError(f"阶段 {stage.name} 依赖的阶段不存在: {missing}")
+
+        results = {}
+        pending = list(self.stages)
+        running = {}
+
+        def timed(stage: Stage, args: list):
+            start = time.time()
+            try:
+                with span(f"stage.{stage.name}"):
+                    value = stage.func(*args)
+                return StageResult(stage.name, value=value, elapsed=time.time() - start)
+            except Exception as e:
+                return StageResult(stage.name, error=e, elapsed=time.time() - start)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                progressed = True
+                while progressed:
+                    progressed = False
+                    for stage in list(pending):
+                        dep_results = [results.get(dep) for dep in stage.deps]
+                        if any(r is not None and not r.ok for r in dep_results):
+                            # 依赖失败，跳过该阶段
+                            results[stage.name] = StageResult(stage.name, skipped=True)
+                        elif all(r is not None for r in dep_results):
+                            args = [r.value for r in dep_results]
+                            # 复制上下文，阶段的span挂在调用方当前的span之下
+                            context = contextvars.copy_context()
+                            running[executor.submit(context.run, timed, stage, args)] = stage
+                        else:
+                            continue
+                        pending.remove(stage)
+                        progressed = True
+
+                if not running:
+                    if pending:
+                        raise ValueError(f"阶段之间存在循环依赖: {[s.name for s in pending]}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    results[stage.name] = future.result()
+
+        return results
@@ -0,0 +1,250 @@
+"""
+预处理前的本地规则清洗：在分块与调用模型之前删除语气词、重复词组与空发言，合并同一发言人连续的短句，
+减少发送给模型的token数（预处理耗时与输入长度近似成正比）
+
+规则只处理可以确定的情况（错别字、热词与语义修正仍由模型完成）：
+- standalone：整个分句只有该词时删除（如 "嗯，"、"那个，"）
+- leading：出现在分句开头时删除（如 "嗯这边..." -> "这边..."）
+- trailing：出现在分句末尾时删除，问句（后接问号）保留（如 "好的啊，" -> "好的，"，"是啊？" 不变）；
+  "吧"、"呢"、"嘛"、"哈"表示建议、语气或话题（"再研究吧"、"他呢"），也常是词的一部分（"干嘛"、"阿哈"），不在默认词表中
+- protected：以语气词开头或结尾的词（"哎呀"、"嗯哼"、"唉声叹气"、"呃逆"），分句以这些词开头或结尾时不删除该处的语气词
+- suspect：规则无法判断、需要模型处理的填充词，用于判断一块是否已经干净
+词表可通过 PRECLEAN_LEXICON 指定JSON文件（同上五个键）替换
+
+用法：python -m meeting.preclean output/interview.txt --output output/precleaned.txt
+      python -m meeting.preclean --check   # 检查SELF_CHECK中的示例
+"""
+import argparse
+import json
+import os
+import re
+
+from meeting.cache import make_key
+from meeting.tokenizer import count_tokens
+from meeting.tracing import span
+
+preclean_enabled = os.getenv("PRECLEAN", "1") == "1"
+# 为1时规则清洗后已干净的块不再调用模型
+skip_clean_chunks = os.getenv("PRECLEAN_SKIP_CLEAN", "0") == "1"
+lexicon_file = os.getenv("PRECLEAN_LEXICON", "")
+# 同一发言人连续发言合并后的最大字数，0表示不合并
+merge_max_chars = int(os.getenv("PRECLEAN_MERGE_CHARS", "60"))
+
+DEFAULT_LEXICON = {
+    "standalone": ["嗯", "呃", "额", "啊", "哎", "唉", "哦", "噢", "喔", "喂", "嗯嗯", "哎呀",
+                   "那个", "这个", "就是", "然后", "就是说", "怎么说呢"],
+    "leading": ["嗯", "呃", "哎", "唉"],
+    "trailing": ["啊", "啦", "呀", "哦", "唉", "哎", "嗯"],
+    "protected": ["哎呀", "哎哟", "嗯哼", "唉声叹气", "呃逆", "干嘛", "咿呀", "哗啦", "稀里哗啦", "呼啦"],
+    "suspect": ["那个", "这个", "就是", "然后", "反正", "的话", "怎么说", "对吧"],
+}
+
+# 分句标点与发言行格式（内容可以为空）
+CLAUSE_PUNCTUATION = "，。？！、；：,.?!;:"
+QUESTION_MARKS = "？?"
+SPEECH_LINE = re.compile(r'^(\d+:\d{2} 发言人\d+):\s*(.*)$')
+# 连续出现三次及以上的2~4字中文词组（"九月九月九月初" -> "九月初"）；
+# 只重复一次的是动词重叠（"研究研究"、"讨论讨论"）等正常用法，单字叠词（"看看"、"谢谢"）也不处理
+REPEATED_NGRAM = re.compile(r'([\u4e00-\u9fff]{2,4}?)\1{2,}')
+CLAUSE_SPLIT = re.compile(f'([{re.escape(CLAUSE_PUNCTUATION)}]+)')
+
+
+def load_lexicon(path: str = lexicon_file) -> dict:
+    """读取词表，未指定文件时使用默认词表，文件中缺少的键沿用默认值"""
+    lexicon = {name: list(words) for name, words in DEFAULT_LEXICON.items()}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            lexicon.update(json.load(f))
+    return lexicon
+
+
+class PreCleaner:
+    """按词表编译的清洗规则，merge_chars为0时不合并短句"""
+
+    def __init__(self, lexicon: dict = None, merge_chars: int = merge_max_chars):
+        lexicon = lexicon or load_lexicon()
+        self.lexicon = lexicon
+        self.standalone = set(lexicon["standalone"])
+        self.protected = tuple(lexicon.get("protected", ()))
+        self.merge_chars = merge_chars
+        # 长词优先匹配
+        self.leading = self._alternation(lexicon["leading"])
+        self.trailing = self._alternation(lexicon["trailing"])
+        self.suspect = self._alternation(lexicon["suspect"])
+
+    def identity(self) -> dict:
+        """清洗规则（词表与合并上限），计入预处理阶段的检查点键，规则变化后重新处理"""
+        return {"lexicon": make_key(self.lexicon), "merge_chars": self.merge_chars}
+
+    @staticmethod
+    def _alternation(words: list):
+        if not words:
+            return None
+        return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+    def _strip_leading(self, clause: str) -> str:
+        """逐个删除开头的语气词，开头为protected中的词时停止"""
+        while not clause.startswith(self.protected):
+            match = re.match(f'(?:{self.leading})', clause)
+            if not match:
+                break
+            clause = clause[match.end():].strip()
+        return clause
+
+    def _strip_trailing(self, clause: str) -> str:
+        """逐个删除末尾的语气词，末尾为protected中的词时停止"""
+        while not clause.endswith(self.protected):
+            match = re.search(f'(?:{self.trailing})$', clause)
+            if not match:
+                break
+            clause = clause[:match.start()].strip()
+        return clause
+
+    def clean_clause(self, clause: str, punctuation: str) -> str:
+        """清洗一个分句（不含标点），返回清洗后的分句，整句删除时返回空串"""
+        clause = clause.strip()
+        if self.leading:
+            clause = self._strip_leading(clause)
+        if self.trailing and not any(mark in punctuation for mark in QUESTION_MARKS):
+            clause = self._strip_trailing(clause)
+        clause = REPEATED_NGRAM.sub(r'\1', clause)
+        return "" if clause in self.standalone else clause
+
+    def clean_content(self, content: str) -> str:
+        """清洗一条发言内容，只剩标点时返回空串"""
+        parts = CLAUSE_SPLIT.split(content.strip())
+        cleaned = []
+        # split结果为 [分句, 标点, 分句, 标点, ..., 分句]
+        for i in range(0, len(parts), 2):
+            punctuation = parts[i + 1] if i + 1 < len(parts) else ""
+            clause = self.clean_clause(parts[i], punctuation)
+            if clause:
+                cleaned.append(clause + punctuation)
+            elif punctuation and cleaned and any(mark in punctuation for mark in "。？！?!"):
+                # 删除的分句带句末标点时，上一分句改为以该标点结束
+                cleaned[-1] = cleaned[-1].rstrip(CLAUSE_PUNCTUATION) + punctuation
+        return "".join(cleaned)
+
+    def clean(self, text: str) -> str:
+        """清洗会议文本：非发言行（如日期行）原样保留，空发言删除，同一发言人连续的短句合并"""
+        lines = []
+        previous = None  # 上一条发言的 [行首, 内容]
+        for line in text.split('\n'):
+            if not line.strip():
+                continue
+            match = SPEECH_LINE.match(line.strip())
+            if not match:
+                lines.append(line)
+                previous = None
+                continue
+            head, content = match.group(1), self.clean_content(match.group(2))
+            if not content:
+                continue
+            same_speaker = previous is not None and previous[0].split(' ', 1)[1] == head.split(' ', 1)[1]
+            if same_speaker and len(previous[1]) + len(content) <= self.merge_chars:
+                separator = "" if previous[1][-1] in CLAUSE_PUNCTUATION else "，"
+                previous[1] += separator + content
+                lines[-1] = f"{previous[0]}: {previous[1]}"
+                continue
+            previous = [head, content]
+            lines.append(f"{head}: {content}")
+        return '\n'.join(lines)
+
+    def is_clean(self, text: str) -> bool:
+        """规则清洗不再改变文本，且不含需要模型判断的填充词"""
+        if self.clean(text) != '\n'.join(line for line in text.split('\n') if line.strip()):
+            return False
+        return self.suspect is None or re.search(self.suspect, text) is None
+
+
+_cleaner = None
+
+
+def get_cleaner() -> PreCleaner:
+    global _cleaner
+    if _cleaner is None:
+        _cleaner = PreCleaner()
+    return _cleaner
+
+
+def reduction_stats(before: str, after: str) -> dict:
+    """清洗前后的行数、字符数与token数，ratio为token减少的比例"""
+    tokens_before, tokens_after = count_tokens(before), count_tokens(after)
+    return {
+        "lines_before": len([line for line in before.split('\n') if line.strip()]),
+        "lines_after": len([line for line in after.split('\n') if line.strip()]),
+        "chars_before": len(before),
+        "chars_after": len(after),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "ratio": round(1 - tokens_after / tokens_before, 4) if tokens_before else 0.0,
+    }
+
+
+def preclean_text(text: str) -> tuple:
+    """规则清洗，返回(清洗后的文本, 缩减统计)"""
+    with span("preprocess.preclean", bytes_in=len(text.encode("utf-8"))) as s:
+        cleaned = get_cleaner().clean(text)
+        stats = reduction_stats(text, cleaned)
+        s.set(tokens_before=stats["tokens_before"], tokens_after=stats["tokens_after"])
+    return cleaned, stats
+
+
+# 清洗示例（输入 -> 期望输出），修改规则或默认词表后用 --check 检查，避免改变语义
+SELF_CHECK = {
+    "嗯这边我们先开始。": "这边我们先开始。",
+    "好的啊，嗯，那就这样。": "好的，那就这样。",
+    "九月九月九月初开始。": "九月初开始。",
+    "是啊？": "是啊？",
+    "再研究研究这个方案吧，好吧。": "再研究研究这个方案吧，好吧。",
+    "他呢，我们下周再说。": "他呢，我们下周再说。",
+    "你要干嘛。": "你要干嘛。",
+    "你干嘛，我们走吧。": "你干嘛，我们走吧。",
+    "哎呀我忘了。": "哎呀我忘了。",
+    "唉声叹气的。": "唉声叹气的。",
+    "呃逆了。": "呃逆了。",
+    "他叫阿哈。": "他叫阿哈。",
+    "我们去吃沙拉哈。": "我们去吃沙拉哈。",
+    "嗯哼，对。": "嗯哼，对。",
+}
+
+
+def self_check(cleaner: PreCleaner = None) -> list:
+    """按SELF_CHECK逐条清洗，返回不符合期望的 [(输入, 期望, 实际)]"""
+    cleaner = cleaner or PreCleaner(DEFAULT_LEXICON)
+    failures = []
+    for content, expected in SELF_CHECK.items():
+        actual = cleaner.clean_content(content)
+        if actual != expected:
+            failures.append((content, expected, actual))
+    return failures
+
+
+def format_stats(stats: dict) -> str:
+    return (f"规则清洗: {stats['lines_before']} -> {stats['lines_after']}行, "
+            f"{stats['tokens_before']} -> {stats['tokens_after']} tokens (减少 {stats['ratio']:.1%})")
+
+
+if __name__ == "__main__":
+    from meeting.asr import write_text_atomic
+
+    parser = argparse.ArgumentParser(description="会议文本本地规则清洗")
+    parser.add_argument("input", nargs="?", default="output/interview.txt")
+    parser.add_argument("--output", default="", help="输出文件，默认打印到终端")
+    parser.add_argument("--check", action="store_true", help="用默认词表检查清洗示例后退出")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = self_check()
+        for content, expected, actual in failures:
+            print(f"不符合: {content} -> {actual}（期望 {expected}）")
+        print(f"清洗示例: {len(SELF_CHECK) - len(failures)}/{len(SELF_CHECK)} 通过")
+        raise SystemExit(1 if failures else 0)
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        cleaned, stats = preclean_text(f.read())
+    if args.output:
+        write_text_atomic(args.output, cleaned + '\n')
+    else:
+        print(cleaned)
+    print(format_stats(stats))
@@ -1,25 +1,38 @@
 from fastapi import FastAPI, HTTPException
-import requests
 import os
-from dotenv import load_dotenv
+import re
+from typing import Optional
 from pydantic import BaseModel
+from meeting.cache import make_key
+from meeting.chunk_engine import iter_chunks, run_chunks
+from meeting.llm_client import extract_content, get_client, run_async
+from meeting.preclean import format_stats, get_cleaner, preclean_enabled, preclean_text, skip_clean_chunks
+from meeting.routing import get_router
+from meeting.sse import sse_response
+from meeting.tokenizer import count_tokens
+from meeting.tracing import add_metrics_route, span
 
 app = FastAPI()
-
-# 加载环境变量
-load_dotenv()
-
-# 从环境变量获取API配置
-api_key = os.getenv("DEFAULT_API_KEY")
-endpoint = os.getenv("DEEPSEEK_ENDPOINT", "https://api.deepseek.com/chat/completions")
+add_metrics_route(app)
 
 # 固定的提示词文件路径
 prompt_file = "prompt/preprocess.txt"
 
+# 并发处理的块数上限
+default_concurrency = int(os.getenv("PREPROCESS_CONCURRENCY", "4"))
+
 # 定义请求体模型（已移除prompt_text参数）
 class TextProcessingRequest(BaseModel):
     meeting_text: str  # 输入文本内容
     chunk_size: int = 100  # 每块的行数，默认100行
+    max_tokens: Optional[int] = None  # 每块的token预算，设置后按token切分并忽略chunk_size
+    overlap_lines: int = 0  # 每块附带的上一块末尾行数（仅作上下文，不出现在结果中）
+    max_concurrency: int = default_concurrency  # 同时处理的块数
+    fail_fast: bool = False  # 任一块失败时是否立即终止
+    keep_failed: bool = False  # 失败的块保留原文并在failed_chunks中返回序号（默认任一块失败即报错）
+    stream: bool = False  # 以SSE逐块返回处理结果
+    preclean: bool = preclean_enabled  # 分块前执行本地规则清洗
+    skip_clean_chunks: bool = skip_clean_chunks  # 规则清洗后已干净的块不调用模型
 
 def split_text_into_chunks(text: str, chunk_size: int):
     """将文本按指定行数分割成块"""
@@ -32,27 +45,170 @@ def split_text_into_chunks(text: str, chunk_size: int):
     
     return chunks
 
-def call_api(api_key, endpoint, user_input, system_prompt):
-    """调用DeepSeek API处理文本"""
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
+def split_text_by_tokens(text: str, max_tokens: int):
+    """
+    按token预算在发言（行）边界处分割文本：依次装满每块，只在最后一块过小时与前一块重新平分
+    块边界只取决于前面的文本，会议文本追加内容时除最后两块外的块不变（块级缓存与检查点可以复用）
+    """
+    lines = [line for line in text.split('\n') if line.strip()]
+    if not lines:
+        return []
+    costs = [count_tokens(line) + 1 for line in lines]  # +1 计入换行
+    
+    # 各块的起始行号，超出预算时切分（单行超出预算时独立成块）
+    starts = [0]
+    current_tokens = 0
+    for i, cost in enumerate(costs):
+        if i > starts[-1] and current_tokens + cost > max_tokens:
+            starts.append(i)
+            current_tokens = 0
+        current_tokens += cost
+    
+    # 最后一块不足预算的一半时，将前一块末尾的行移入，使两块大小接近
+    if len(starts) > 1 and current_tokens < max_tokens / 2:
+        previous, last = starts[-2], starts[-1]
+        pair_tokens = sum(costs[previous:])
+        while last - 1 > previous and current_tokens + costs[last - 1] <= pair_tokens / 2:
+            last -= 1
+            current_tokens += costs[last]
+        starts[-1] = last
+    
+    bounds = starts + [len(lines)]
+    return ['\n'.join(lines[bounds[i]:bounds[i + 1]]) for i in range(len(starts))]
+
+def make_chunks(text: str, chunk_size: int = 100, max_tokens: int = None, overlap_lines: int = 0) -> list:
+    """
+    切分文本并附带上下文
+    :return: [{"context": 上一块末尾overlap_lines行, "content": 本块文本}, ...]
+    """
+    with span("preprocess.split", bytes_in=len(text.encode("utf-8"))) as s:
+        if max_tokens:
+            contents = split_text_by_tokens(text, max_tokens)
+        else:
+            contents = split_text_into_chunks(text, chunk_size)
+        
+        chunks = []
+        for i, content in enumerate(contents):
+            context = contents[i - 1].split('\n')[-overlap_lines:] if i and overlap_lines > 0 else []
+            chunks.append({"context": context, "content": content})
+        s.set(chunks=len(chunks))
+    return chunks
+
+CONTEXT_MARKER = "【上文（仅供参考，不要输出）】"
+CONTENT_MARKER = "【待处理文本】"
 
-    data = {
-        "model": "deepseek-reasoner",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input}
-        ]
-    }
+def build_chunk_input(chunk: dict) -> str:
+    """构造单块的模型输入，有上下文时用标记区分"""
+    if not chunk["context"]:
+        return chunk["content"]
+    return f"{CONTEXT_MARKER}\n" + '\n'.join(chunk["context"]) + f"\n{CONTENT_MARKER}\n" + chunk["content"]
 
-    response = requests.post(endpoint, json=data, headers=headers)
+def _line_key(line: str) -> str:
+    """取 "MM:SS 发言人N:" 作为行标识，其余行用全文"""
+    match = re.match(r'^\s*(\d+:\d{2} 发言人\d+:)', line)
+    return match.group(1) if match else line.strip()
+
+def strip_context(output: str, chunk: dict) -> str:
+    """去掉模型输出中的标记行，以及开头按顺序复述的上下文行"""
+    lines = [line for line in output.split('\n') if line.strip() not in (CONTEXT_MARKER, CONTENT_MARKER)]
+    context_keys = [_line_key(line) for line in chunk["context"]]
+    skip = 0
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    for index, key in zip(non_empty, context_keys):
+        if _line_key(lines[index]) != key:
+            break
+        skip = index + 1
+    return '\n'.join(lines[skip:])
+
+def make_chunk_worker(system_prompt: str, checkpoint=None, skip_clean: bool = False):
+    """
+    单块处理函数：调用模型清洗文本并去掉模型回显的上文
+    :param checkpoint: 传入Checkpoint时按块输入保存每块结果，重新运行时已完成的块直接读取
+    :param skip_clean: 为True时规则判断已干净的块直接返回原文，不调用模型
+    """
+    router = get_router()
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        raise Exception(f"API 调用失败，状态码: {response.status_code}, 响应: {response.text}")
+    async def worker(chunk: dict) -> str:
+        if skip_clean and get_cleaner().is_clean(chunk["content"]):
+            return chunk["content"]
+        chunk_input = build_chunk_input(chunk)
+        key = None
+        if checkpoint is not None:
+            key = make_key({"route": router.route("preprocess").identity(), "system": system_prompt,
+                            "input": chunk_input})
+            found, text = checkpoint.load("preprocess.chunk", key)
+            if found:
+                return text
+        result = await router.achat("preprocess", system_prompt, chunk_input)
+        text = strip_context(extract_content(result), chunk)
+        if not text:
+            return "没有找到 'content' 字段"
+        if key is not None:
+            checkpoint.save("preprocess.chunk", key, text)
+        return text
+    return worker
+
+def failure_message(failures: dict, total: int) -> str:
+    """{块序号: 异常} -> 报错信息"""
+    numbers = ", ".join(str(index + 1) for index in sorted(failures))
+    first = failures[min(failures)]
+    return f"{len(failures)}/{total} 块处理失败（第 {numbers} 块）: {first}"
+
+async def process_chunks(chunks: list, system_prompt: str,
+                         max_concurrency: int = default_concurrency,
+                         fail_fast: bool = False, checkpoint=None, skip_clean: bool = False,
+                         keep_failed: bool = False) -> tuple:
+    """
+    并发处理所有块，按原顺序合并结果
+    默认任一块失败时抛出异常（fail_fast为False时其余块仍处理完，已完成的块照常保存检查点）；
+    keep_failed为True时失败的块保留原文
+    :return: (合并结果, 失败块的序号列表)
+    """
+    results = await run_chunks(chunks, make_chunk_worker(system_prompt, checkpoint, skip_clean),
+                               max_concurrency=max_concurrency, fail_fast=fail_fast,
+                               span_name="preprocess.chunk")
+
+    failures = {index: result for index, result in enumerate(results) if isinstance(result, Exception)}
+    if failures and not keep_failed:
+        raise ValueError(failure_message(failures, len(chunks)))
+
+    processed_results = []
+    for chunk_num, (chunk, result) in enumerate(zip(chunks, results)):
+        if chunk_num in failures:
+            print(f"Chunk {chunk_num + 1}/{len(chunks)} 处理失败，保留原文: {result}")
+            processed_results.append(chunk["content"])
+        else:
+            processed_results.append(result)
+
+    # 合并所有结果并去除空行
+    return remove_empty_lines('\n'.join(processed_results)), sorted(failures)
+
+async def stream_chunks(chunks: list, system_prompt: str,
+                        max_concurrency: int = default_concurrency,
+                        fail_fast: bool = False, skip_clean: bool = False, keep_failed: bool = False):
+    """
+    并发处理各块，每块完成即产出 ("chunk", {index, total, text, error})，
+    全部完成后产出 ("result", {result, failed_chunks})，与process_chunks的返回值一致；
+    有失败的块且keep_failed为False时，最后抛出异常而不产出result
+    """
+    results = [None] * len(chunks)
+    failures = {}
+    async for index, result in iter_chunks(chunks, make_chunk_worker(system_prompt, skip_clean=skip_clean),
+                                           max_concurrency,
+                                           span_name="preprocess.chunk"):
+        error = None
+        if isinstance(result, Exception):
+            if fail_fast:
+                raise result
+            # 失败的块先以原文返回，全部完成后再决定是否报错
+            failures[index] = result
+            error = str(result)
+            result = chunks[index]["content"]
+        results[index] = result
+        yield "chunk", {"index": index, "total": len(chunks), "text": result, "error": error}
+    if failures and not keep_failed:
+        raise ValueError(failure_message(failures, len(chunks)))
+    yield "result", {"result": remove_empty_lines('\n'.join(results)), "failed_chunks": sorted(failures)}
 
 def remove_empty_lines(text: str) -> str:
     """去除文本中的空行"""
@@ -69,11 +225,24 @@ def load_prompt_from_file(file_path: str) -> str:
         return f.read().strip()
 
 # 新增：允许外部调用的预处理函数
-def preprocess_text(meeting_text: str, chunk_size: int = 100) -> str:
-    """封装预处理逻辑，供外部调用"""
+def preprocess_text(meeting_text: str, chunk_size: int = 100,
+                    max_concurrency: int = default_concurrency, fail_fast: bool = False,
+                    max_tokens: int = None, overlap_lines: int = 0, checkpoint=None,
+                    preclean: bool = preclean_enabled, skip_clean: bool = skip_clean_chunks,
+                    keep_failed: bool = False) -> str:
+    """
+    封装预处理逻辑，供外部调用
+    :param chunk_size: 每块的行数（未设置max_tokens时生效）
+    :param max_tokens: 每块的token预算，设置后在发言边界处按token切分
+    :param overlap_lines: 每块附带的上一块末尾行数，仅作上下文，不出现在结果中
+    :param checkpoint: meeting.checkpoint.Checkpoint，保存每块结果以便中断后续跑
+    :param preclean: 分块前执行本地规则清洗（语气词、重复词组、空发言、短句合并）
+    :param skip_clean: 规则清洗后已干净的块不调用模型
+    :param keep_failed: 失败的块保留原文继续返回，默认任一块失败即抛出异常
+    """
     try:
         # 复用原有逻辑（验证API密钥、加载提示词、分块处理等）
-        if not api_key:
+        if not get_client().api_key:
             raise ValueError("API密钥未配置")
         
         system_prompt = load_prompt_from_file(prompt_file)
@@ -83,28 +252,17 @@ def preprocess_text(meeting_text: str, chunk_size: int = 100) -> str:
         if not meeting_text:
             raise ValueError("输入文本不能为空")
         
-        chunks = split_text_into_chunks(meeting_text, chunk_size)
+        if preclean:
+            meeting_text, stats = preclean_text(meeting_text)
+            print(format_stats(stats))
+        
+        chunks = make_chunks(meeting_text, chunk_size, max_tokens, overlap_lines)
         if not chunks:
             return ""
         
-        processed_results = []
-        for chunk_num, chunk_content in enumerate(chunks):
-            print(f"Processing chunk {chunk_num + 1}/{len(chunks)}...")
-            result = call_api(api_key, endpoint, chunk_content, system_prompt)
-            
-            content_found = False
-            for choice in result.get('choices', []):
-                message_content = choice.get('message', {}).get('content')
-                if message_content:
-                    processed_results.append(message_content)
-                    content_found = True
-                    break
-            
-            if not content_found:
-                processed_results.append("没有找到 'content' 字段")
-        
-        full_result = '\n'.join(processed_results)
-        return remove_empty_lines(full_result)
+        result, _ = run_async(process_chunks(chunks, system_prompt, max_concurrency, fail_fast, checkpoint,
+                                             skip_clean, keep_failed))
+        return result
     except Exception as e:
         raise ValueError(f"预处理失败: {str(e)}")
 
@@ -116,13 +274,21 @@ async def process_text(request: TextProcessingRequest):
     参数:
     - meeting_text: 需要处理的文本内容
     - chunk_size: 每块的行数，默认100行
+    - max_tokens: 每块的token预算，设置后按token切分并忽略chunk_size
+    - overlap_lines: 每块附带的上文行数
+    - max_concurrency: 同时处理的块数
+    - fail_fast: 任一块失败时是否立即终止
+    - keep_failed: 失败的块保留原文，序号在failed_chunks中返回（默认任一块失败即返回500）
+    - stream: 为true时以SSE返回，每块完成即发送chunk事件，最后发送result事件
+    - preclean: 分块前执行本地规则清洗
+    - skip_clean_chunks: 规则清洗后已干净的块不调用模型
     
     返回:
-    - 处理后的文本结果
+    - 处理后的文本结果、失败块序号failed_chunks（非流式时附带规则清洗的缩减统计preclean）
     """
     try:
         # 验证API密钥
-        if not api_key:
+        if not get_client().api_key:
             raise HTTPException(status_code=500, detail="API密钥未配置")
         
         # 加载提示词
@@ -132,41 +298,31 @@ async def process_text(request: TextProcessingRequest):
         
         # 获取请求参数
         meeting_text = request.meeting_text
-        chunk_size = request.chunk_size
         
         # 验证输入文本
         if not meeting_text:
             raise HTTPException(status_code=400, detail="输入文本不能为空")
         
+        # 本地规则清洗后再分块
+        stats = None
+        if request.preclean:
+            meeting_text, stats = preclean_text(meeting_text)
+        
         # 将文本分块
-        chunks = split_text_into_chunks(meeting_text, chunk_size)
+        chunks = make_chunks(meeting_text, request.chunk_size, request.max_tokens, request.overlap_lines)
+        if request.stream:
+            return sse_response(stream_chunks(chunks, system_prompt, request.max_concurrency, request.fail_fast,
+                                              request.skip_clean_chunks, request.keep_failed))
         if not chunks:
-            return {"result": ""}
-        
-        # 处理每个块并收集结果
-        processed_results = []
-        for chunk_num, chunk_content in enumerate(chunks):
-            print(f"Processing chunk {chunk_num + 1}/{len(chunks)}...")
-            result = call_api(api_key, endpoint, chunk_content, system_prompt)
-            
-            content_found = False
-            for choice in result.get('choices', []):
-                message_content = choice.get('message', {}).get('content')
-                if message_content:
-                    processed_results.append(message_content)
-                    content_found = True
-                    break
-            
-            if not content_found:
-                processed_results.append("没有找到 'content' 字段")
-        
-        # 合并所有结果
-        full_result = '\n'.join(processed_results)
+            return {"result": "", "failed_chunks": [], "preclean": stats}
         
-        # 去除空行
-        cleaned_result = remove_empty_lines(full_result)
+        # 并发处理各块并按顺序合并结果
+        cleaned_result, failed = await process_chunks(
+            chunks, system_prompt, request.max_concurrency, request.fail_fast,
+            skip_clean=request.skip_clean_chunks, keep_failed=request.keep_failed
+        )
         
-        return {"result": cleaned_result}
+        return {"result": cleaned_result, "failed_chunks": failed, "preclean": stats}
         
     except HTTPException:
         raise
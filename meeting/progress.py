@@ -0,0 +1,46 @@
+"""
+进度上报：调用方通过reporting()登记回调，各阶段与分块处理在执行时上报进度
+回调经contextvars传递，在异步任务、run_async与流水线线程中自动继承；未登记回调时上报为空操作
+"""
+import contextlib
+import contextvars
+
+# 回调签名：callback(stage, status, done, total)，status为running/done/failed
+_reporter = contextvars.ContextVar("progress_reporter", default=None)
+_stage = contextvars.ContextVar("progress_stage", default=None)
+
+
+@contextlib.contextmanager
+def reporting(callback):
+    token = _reporter.set(callback)
+    try:
+        yield
+    finally:
+        _reporter.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name: str):
+    """标记一个阶段，其中的分块进度归属到该阶段"""
+    callback = _reporter.get()
+    token = _stage.set(name)
+    if callback:
+        callback(name, "running", None, None)
+    try:
+        yield
+    except BaseException:
+        if callback:
+            callback(name, "failed", None, None)
+        raise
+    else:
+        if callback:
+            callback(name, "done", None, None)
+    finally:
+        _stage.reset(token)
+
+
+def chunk_done(done: int, total: int):
+    """上报当前阶段已完成的块数"""
+    callback = _reporter.get()
+    if callback:
+        callback(_stage.get(), "running", done, total)
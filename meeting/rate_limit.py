@@ -0,0 +1,265 @@
+"""
+LLM调用的进程内限流：请求数与token数两个令牌桶，加上按AIMD自适应调整的并发上限
+同一进程内所有模块、接口与线程（同步调用与各事件循环中的异步调用）共用一个限流器
+
+- 令牌桶：请求前按估算的token数预留额度，额度不足时等待；响应后按usage实际用量补差
+- 并发上限：调用成功时加性增加（每完成约一个上限数量的调用+1），收到429或延迟超过目标时减半
+- 429响应带Retry-After时，所有调用暂停到该时间之后再发出
+"""
+import asyncio
+import collections
+import contextlib
+import email.utils
+import os
+import threading
+import time
+
+# 限流配置，0表示不限制
+rate_requests_per_second = float(os.getenv("LLM_RATE_RPS", "0"))
+rate_tokens_per_minute = float(os.getenv("LLM_RATE_TPM", "0"))
+# 并发上限的初始值与调整范围
+concurrency_max = int(os.getenv("LLM_CONCURRENCY_MAX", os.getenv("LLM_POOL_SIZE", "16")))
+concurrency_min = int(os.getenv("LLM_CONCURRENCY_MIN", "1"))
+concurrency_initial = int(os.getenv("LLM_CONCURRENCY_INITIAL", str(concurrency_max)))
+# 单次调用耗时超过该秒数时视为上游过载并降低并发，0表示只按429调整
+latency_target = float(os.getenv("LLM_LATENCY_TARGET", "0"))
+
+
+def parse_retry_after(value):
+    """解析Retry-After响应头（秒数或HTTP日期），返回需等待的秒数，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TokenBucket:
+    """令牌桶：容量为每秒（或每分钟）的额度，允许预留超出当前余额（记为欠额），调用方按返回的秒数等待"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 每秒补充的额度
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        """预留amount额度，返回需等待的秒数（调用方需持有限流器的锁）"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+    def adjust(self, amount: float):
+        """按实际用量补差，amount为正时扣减，为负时退还"""
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class _Waiter:
+    """等待并发名额的调用：同步调用等待Event，异步调用等待所在事件循环中的Future"""
+    __slots__ = ("granted", "event", "loop", "future")
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Permit:
+    """一次调用占用的名额，记录预留的token数与开始时间"""
+    __slots__ = ("tokens", "start", "used_tokens")
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.start = time.monotonic()
+        self.used_tokens = None
+
+    def record(self, result: dict):
+        """记录响应usage中的实际token数，释放名额时用于补差"""
+        usage = result.get("usage") or {}
+        total = usage.get("total_tokens") or (usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0))
+        if total:
+            self.used_tokens = total
+
+
+class RateLimiter:
+    """请求数/token数令牌桶 + AIMD并发上限，线程安全，可同时用于多个事件循环"""
+
+    def __init__(self, requests_per_second: float = rate_requests_per_second,
+                 tokens_per_minute: float = rate_tokens_per_minute,
+                 initial_concurrency: int = concurrency_initial, min_concurrency: int = concurrency_min,
+                 max_concurrency: int = concurrency_max, latency_target: float = latency_target,
+                 decrease_factor: float = 0.5):
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("并发上限范围无效")
+        self.request_bucket = TokenBucket(requests_per_second, max(1.0, requests_per_second)) \
+            if requests_per_second > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute) \
+            if tokens_per_minute > 0 else None
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.throttled = 0
+        self._paused_until = 0.0
+        # 同一轮过载只降一次：只有在上次降低之后发出的调用才能再次触发降低
+        self._last_decrease = 0.0
+        self._waiters = collections.deque()
+        self._lock = threading.Lock()
+
+    # ---- 并发名额 ----
+
+    def _grant(self):
+        """有空余名额时按先来先得唤醒等待者（调用方需持有锁）"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def _enqueue(self, loop=None):
+        """有名额时直接占用并返回None，否则返回排队的等待者"""
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter: _Waiter):
+        """等待中被取消：已分到的名额归还，否则移出队列"""
+        with self._lock:
+            if waiter.granted:
+                self.in_flight -= 1
+                self._grant()
+            else:
+                self._waiters.remove(waiter)
+
+    # ---- 速率 ----
+
+    def _reserve(self, tokens: int) -> float:
+        """在两个令牌桶中预留额度，返回需等待的秒数（含Retry-After暂停）"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1, now))
+            if self.token_bucket is not None:
+                wait = max(wait, self.token_bucket.reserve(tokens, now))
+            return wait
+
+    def pause(self, seconds: float):
+        """所有调用暂停seconds秒（上游返回Retry-After时）"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # ---- 获取与释放 ----
+
+    def acquire(self, tokens: int) -> Permit:
+        """同步获取名额并等待速率额度"""
+        waiter = self._enqueue()
+        if waiter is not None:
+            try:
+                waiter.event.wait()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        try:
+            time.sleep(self._reserve(tokens))
+        except BaseException:
+            self._release_slot()
+            raise
+        return Permit(tokens)
+
+    async def aacquire(self, tokens: int) -> Permit:
+        """异步获取名额并等待速率额度，等待期间不阻塞事件循环"""
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        try:
+            await asyncio.sleep(self._reserve(tokens))
+        except BaseException:
+            self._release_slot()
+            raise
+        return Permit(tokens)
+
+    def _release_slot(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant()
+
+    def release(self, permit: Permit, error: BaseException = None):
+        """释放名额并按本次结果调整并发上限：429或超时降低，成功且延迟正常时缓慢增加"""
+        latency = time.monotonic() - permit.start
+        status_code = getattr(error, "status_code", None)
+        with self._lock:
+            self.in_flight -= 1
+            if permit.used_tokens is not None and self.token_bucket is not None:
+                self.token_bucket.adjust(permit.used_tokens - permit.tokens)
+            overloaded = status_code == 429 or (
+                error is None and self.latency_target > 0 and latency > self.latency_target)
+            if status_code == 429:
+                self.throttled += 1
+                retry_after = getattr(error, "retry_after", None)
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            if overloaded:
+                if permit.start >= self._last_decrease:
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+            elif error is None:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            self._grant()
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int):
+        """with limiter.slot(估算token数) as permit: ...；响应后调用permit.record(result)"""
+        permit = self.acquire(tokens)
+        try:
+            yield permit
+        except BaseException as e:
+            self.release(permit, e)
+            raise
+        self.release(permit)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, tokens: int):
+        permit = await self.aacquire(tokens)
+        try:
+            yield permit
+        except BaseException as e:
+            self.release(permit, e)
+            raise
+        self.release(permit)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"limit": round(self.limit, 2), "in_flight": self.in_flight,
+                    "waiting": len(self._waiters), "throttled": self.throttled}
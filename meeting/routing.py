@@ -0,0 +1,162 @@
+"""
+按阶段路由模型：各阶段（预处理、分段总结、章节导读等）分别配置模型与请求参数，
+可设置延迟预算，超出预算时取消本次调用并改用更快的备用模型
+
+配置为JSON文件（LLM_ROUTES指定路径），键为阶段名，default为未单独配置的阶段：
+    {
+      "default": {"model": "deepseek-reasoner"},
+      "preprocess": {"model": "deepseek-chat", "temperature": 0.2, "max_tokens": 8000},
+      "summary": {"json": true, "fallback_model": "deepseek-chat", "latency_budget": 300}
+    }
+阶段名按层级查找：summary.map 未配置时使用 summary，再使用 default
+未配置时所有阶段使用 DEEPSEEK_MODEL 且不附加参数（与之前的请求完全相同）
+"""
+import asyncio
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, fields
+
+from meeting.llm_client import default_model, get_client, run_async
+from meeting.tracing import current_span
+
+routes_file = os.getenv("LLM_ROUTES", "")
+
+STAGES = ("preprocess", "summary", "summary.map", "summary.reduce",
+          "introduction", "introduction.chapter", "introduction.overall")
+
+
+@dataclass(frozen=True)
+class Route:
+    """一个阶段的模型与请求参数，None表示不在请求中设置（使用接口默认值）"""
+    model: str = default_model
+    max_tokens: int = None
+    temperature: float = None
+    json: bool = False  # 请求JSON格式输出（response_format=json_object），提示词中需包含"json"
+    fallback_model: str = None  # 超出延迟预算时改用的模型
+    latency_budget: float = 0.0  # 延迟预算（秒），流式调用为等待首段内容的时间，0表示不限制
+
+    def params(self, model: str = None) -> dict:
+        """合并进请求体的参数"""
+        params = {"model": model or self.model}
+        if self.max_tokens is not None:
+            params["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        if self.json:
+            params["response_format"] = {"type": "json_object"}
+        return params
+
+    @property
+    def has_fallback(self) -> bool:
+        return bool(self.fallback_model and self.latency_budget > 0)
+
+    def identity(self) -> dict:
+        """计入检查点键的路由配置，模型或参数变化后检查点失效"""
+        return asdict(self)
+
+
+def parse_routes(config: dict) -> dict:
+    """配置字典 -> {阶段名: Route}，未知字段报错以免拼写错误被静默忽略"""
+    names = {field.name for field in fields(Route)}
+    routes = {}
+    for stage, options in config.items():
+        unknown = set(options) - names
+        if unknown:
+            raise ValueError(f"阶段 {stage} 的路由配置包含未知字段: {', '.join(sorted(unknown))}")
+        routes[stage] = Route(**options)
+    return routes
+
+
+def load_routes(path: str = routes_file) -> dict:
+    if not path:
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_routes(json.load(f))
+
+
+class Router:
+    """按阶段选择模型与参数调用共享客户端，统计各阶段改用备用模型的次数"""
+
+    def __init__(self, routes: dict = None):
+        self.routes = routes or {}
+        self.fallbacks = {}
+        self._lock = threading.Lock()
+
+    def route(self, stage: str) -> Route:
+        name = stage
+        while name:
+            if name in self.routes:
+                return self.routes[name]
+            name = name.rpartition(".")[0]
+        return self.routes.get("default", Route())
+
+    def identity(self) -> dict:
+        """所有阶段的路由配置"""
+        return {stage: self.route(stage).identity() for stage in STAGES}
+
+    def _record_fallback(self, stage: str, route: Route):
+        with self._lock:
+            self.fallbacks[stage] = self.fallbacks.get(stage, 0) + 1
+        current = current_span()
+        if current is not None:
+            current.set(fallback_model=route.fallback_model)
+        print(f"{stage}: {route.model} 超出延迟预算 {route.latency_budget:g}秒，改用 {route.fallback_model}")
+
+    async def achat(self, stage: str, system_prompt: str, user_input: str) -> dict:
+        client = get_client()
+        route = self.route(stage)
+        if not route.has_fallback:
+            return await client.achat(system_prompt, user_input, **route.params())
+        try:
+            return await asyncio.wait_for(client.achat(system_prompt, user_input, **route.params()),
+                                          route.latency_budget)
+        except asyncio.TimeoutError:
+            self._record_fallback(stage, route)
+        return await client.achat(system_prompt, user_input, **route.params(route.fallback_model))
+
+    def chat(self, stage: str, system_prompt: str, user_input: str) -> dict:
+        route = self.route(stage)
+        if not route.has_fallback:
+            return get_client().chat(system_prompt, user_input, **route.params())
+        # 超时取消需要异步调用
+        return run_async(self.achat(stage, system_prompt, user_input))
+
+    async def astream(self, stage: str, system_prompt: str, user_input: str):
+        """流式调用，设置备用模型时首段内容超出延迟预算则改用备用模型"""
+        client = get_client()
+        route = self.route(stage)
+        stream = client.astream(system_prompt, user_input, **route.params())
+        if route.has_fallback:
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), route.latency_budget)
+            except asyncio.TimeoutError:
+                await stream.aclose()
+                self._record_fallback(stage, route)
+                stream = client.astream(system_prompt, user_input, **route.params(route.fallback_model))
+            else:
+                yield first
+        async for event in stream:
+            yield event
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> Router:
+    """获取进程内共享的路由"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router(load_routes())
+        return _router
+
+
+def set_routes(config: dict) -> Router:
+    """以配置字典（格式同LLM_ROUTES文件）替换进程内的路由，返回新的路由"""
+    global _router
+    router = Router(parse_routes(config))
+    with _router_lock:
+        _router = router
+    return router
@@ -0,0 +1,53 @@
+"""
+Server-Sent Events响应：将产出 (事件名, 数据) 的异步生成器转为text/event-stream，
+等待上游期间定时发送注释行保活，避免代理因长时间无数据而断开连接
+"""
+import asyncio
+import json
+import os
+
+from fastapi.responses import StreamingResponse
+
+# 无事件时发送保活注释的间隔（秒）
+heartbeat_seconds = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def encode_events(events, heartbeat: float = heartbeat_seconds):
+    """逐个编码事件；出错时发送error事件，正常结束时发送end事件"""
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(events.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=heartbeat)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            task, pending = pending, None
+            try:
+                event, data = task.result()
+            except StopAsyncIteration:
+                break
+            yield format_event(event, data)
+        yield format_event("end", {})
+    except Exception as e:
+        yield format_event("error", {"detail": str(e)})
+    finally:
+        # 客户端断开时取消仍在等待的上游调用
+        if pending is not None:
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
+
+
+def sse_response(events, heartbeat: float = heartbeat_seconds) -> StreamingResponse:
+    return StreamingResponse(
+        encode_events(events, heartbeat),
+        media_type="text/event-stream",
+        # 关闭代理（如nginx）的响应缓冲，事件到达后立即转发
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,158 +1,87 @@
 from fastapi import FastAPI, HTTPException
-from datetime import datetime, timedelta
-import re
 import json
 import os
-import requests
-from dotenv import load_dotenv
 from pydantic import BaseModel
-
-# 加载环境变量
-load_dotenv()
-api_key = os.getenv("DEFAULT_API_KEY")
-endpoint = "https://api.deepseek.com/chat/completions"
+from meeting.checkpoint import checkpointed
+from meeting.chunk_engine import run_chunks
+from meeting.llm_client import extract_content, run_async
+from meeting.routing import get_router
+from meeting.sse import sse_response
+from meeting.tokenizer import count_tokens
+from meeting.tracing import add_metrics_route
+from meeting.transcript import Transcript, parse_transcript
 
 # 初始化FastAPI应用
 app = FastAPI()
+add_metrics_route(app)
+
+# 分段总结（map）时同时请求的区间数
+default_concurrency = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# 合并（reduce）时每次合并的分段数
+reduce_fan_in = int(os.getenv("SUMMARY_REDUCE_FAN_IN", "4"))
+# auto模式下，会议文本超过该token数时改用分段总结
+single_max_tokens = int(os.getenv("SUMMARY_SINGLE_MAX_TOKENS", "30000"))
+
+SUMMARY_MODES = ("single", "map_reduce", "auto")
 
 class SummaryRequest(BaseModel):
     # 将interval_minutes设为可选字段，提供默认值
     interval_minutes: int = 30
     meeting_text: str
+    mode: str = "single"  # single: 整场一次调用；map_reduce: 分段总结后逐级合并；auto: 按长度选择
+    stream: bool = False  # 以SSE流式返回模型输出
 
-def split_by_interval(content: str, interval_minutes: int = 30) -> list:
-    """按时间间隔分割会议内容"""
-    records = []
-    lines = content.split('\n')
-    date_str = None  # 初始化日期变量
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # 匹配日期行
-        date_match = re.match(r'^日期：(\d{4}-\d{2}-\d{2})$', line)
-        if date_match:
-            date_str = date_match.group(1)
-            continue
-        
-        # 匹配时间、发言人和内容（时间格式为MM:SS）
-        time_match = re.match(r'^(\d{2}:\d{2}) 发言人(\d+): (.+)$', line)
-        if time_match and date_str:  # 确保已获取日期
-            time_str, spk, content = time_match.groups()
-            
-            try:
-                # 解析MM:SS格式的时间
-                mm, ss = map(int, time_str.split(':'))
-                
-                # 验证秒数是否符合60进制
-                if ss < 0 or ss >= 60:
-                    raise ValueError(f"无效的秒数: {ss}")
-                
-                # 构建基础时间（日期 + 00:00:00）
-                base_time = datetime.strptime(date_str, "%Y-%m-%d")
-                
-                # 计算实际时间：基础时间 + 分钟 + 秒
-                actual_time = base_time + timedelta(minutes=mm, seconds=ss)
-                
-                records.append({
-                    "name": f"发言人{spk}",
-                    "time": actual_time,
-                    "content": content
-                })
-            except ValueError as e:
-                print(f"跳过格式错误的行: {line}, 错误: {e}")
-                continue
-    
-    if not records:
+def format_seconds(total_seconds: int) -> str:
+    """总秒数格式化为MM:SS"""
+    return f"{total_seconds // 60:02d}:{total_seconds % 60:02d}"
+
+def split_by_interval(content, interval_minutes: int = 30) -> list:
+    """
+    按时间间隔分割会议内容
+    :param content: 会议文本，或已解析的Transcript（避免重复解析）
+    """
+    transcript = content if isinstance(content, Transcript) else parse_transcript(content)
+    if not len(transcript):
         return []
     
-    # 按时间间隔分组
-    start_time = records[0]["time"]
-    intervals = []
-    current_interval = {
-        "start": start_time,
-        "end": start_time,
-        "content": [],
-        "reporters": set()
-    }
-    
-    for record in records:
-        # 计算与开始时间的分钟差
-        time_diff = (record["time"] - start_time).total_seconds() / 60
-        if time_diff > interval_minutes * (len(intervals) + 1):
-            current_interval["end"] = record["time"]
-            intervals.append(current_interval)
-            current_interval = {
-                "start": record["time"],
-                "end": record["time"],
-                "content": [record["content"]],
-                "reporters": {record["name"]}
-            }
-        else:
-            current_interval["content"].append(record["content"])
-            current_interval["reporters"].add(record["name"])
-            current_interval["end"] = record["time"]
-    
-    if current_interval["content"]:
-        intervals.append(current_interval)
-    
-    # 格式化区间信息，显示为MM:SS格式
+    # 按时间间隔分组，区间结束时间取下一区间首条发言的时间
+    seconds = transcript.seconds
     formatted_intervals = []
-    for i, interval in enumerate(intervals):
-        # 格式化开始时间为MM:SS
-        start_minute = interval["start"].hour * 60 + interval["start"].minute
-        start_str = f"{start_minute:02d}:{interval['start'].second:02d}"
-        
-        # 格式化结束时间为MM:SS
-        end_minute = interval["end"].hour * 60 + interval["end"].minute
-        end_str = f"{end_minute:02d}:{interval['end'].second:02d}"
-        
+    for i, (start, stop) in enumerate(transcript.split_fixed(interval_minutes)):
+        end = seconds[stop] if stop < len(seconds) else seconds[stop - 1]
         formatted_intervals.append({
             "id": i + 1,
-            "time_range": f"{start_str}-{end_str}",
-            "content": "\n".join(interval["content"]),
-            "reporters": list(interval["reporters"])
+            "time_range": f"{format_seconds(seconds[start])}-{format_seconds(end)}",
+            "content": "\n".join(transcript.content(j) for j in range(start, stop)),
+            # 按首次发言顺序排列，保证输出（及缓存键）稳定
+            "reporters": list(dict.fromkeys(transcript.speaker(j) for j in range(start, stop)))
         })
     
     return formatted_intervals
 
-def call_api(system_prompt: str, user_input: str) -> dict:
-    """调用DeepSeek API（内部工具函数）"""
-    if not api_key:
-        raise ValueError("API密钥未配置（请检查环境变量DEFAULT_API_KEY）")
-    
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "deepseek-reasoner",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input}
-        ]
-    }
-    
-    response = requests.post(endpoint, json=data, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"API调用失败：状态码{response.status_code}，响应：{response.text}")
-    return response.json()
-
-def generate_summary(meeting_text: str, interval_minutes: int = 30) -> dict:
-    """生成会议摘要核心函数"""
-    # 加载提示词
+def load_summary_prompt() -> str:
+    """加载会议纪要提示词"""
     prompt_file = "prompt/summary.txt"
     if not os.path.exists(prompt_file):
         # 为了测试方便，如果提示词文件不存在，使用默认提示词
-        system_prompt = "请总结会议内容，提取关键议题、讨论结果和行动计划。"
-    else:
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            system_prompt = f.read()
+        return "请总结会议内容，提取关键议题、讨论结果和行动计划。"
+    with open(prompt_file, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def load_prompt(prompt_file: str) -> str:
+    """加载分段总结/合并使用的提示词"""
+    if not os.path.exists(prompt_file):
+        raise FileNotFoundError(f"提示词文件不存在：{prompt_file}")
+    with open(prompt_file, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def build_summary_input(meeting_text: str, interval_minutes: int = 30, transcript: Transcript = None) -> tuple:
+    """加载提示词并构造API输入，返回(system_prompt, processed_input)"""
+    # 加载提示词
+    system_prompt = load_summary_prompt()
     
     # 分割会议内容
-    time_intervals = split_by_interval(meeting_text, interval_minutes)
+    time_intervals = split_by_interval(transcript or meeting_text, interval_minutes)
     if not time_intervals:
         raise ValueError("无法解析会议内容，未提取到有效时间区间")
     
@@ -162,9 +91,10 @@ def generate_summary(meeting_text: str, interval_minutes: int = 30) -> dict:
         f"{json.dumps(time_intervals, ensure_ascii=False, indent=2)}\n\n"
         f"原始完整记录：\n{meeting_text}"
     )
-    
-    # 调用API并解析结果
-    api_result = call_api(system_prompt, processed_input)
+    return system_prompt, processed_input
+
+def parse_summary_result(api_result: dict) -> dict:
+    """解析API返回的摘要内容"""
     for choice in api_result.get('choices', []):
         message_content = choice.get('message', {}).get('content')
         if message_content:
@@ -176,11 +106,139 @@ def generate_summary(meeting_text: str, interval_minutes: int = 30) -> dict:
     
     raise ValueError("API未返回有效内容")
 
+def format_interval(interval: dict) -> str:
+    """格式化单个时间区间作为分段总结的输入"""
+    return (
+        f"时间范围：{interval['time_range']}\n"
+        f"发言人：{'、'.join(interval['reporters'])}\n"
+        f"发言记录：\n{interval['content']}"
+    )
+
+async def build_map_reduce_input(meeting_text: str, interval_minutes: int = 30,
+                                 max_concurrency: int = default_concurrency,
+                                 fan_in: int = reduce_fan_in, transcript: Transcript = None,
+                                 checkpoint=None) -> str:
+    """
+    分段总结并逐级合并，返回生成最终纪要的输入
+    map：各时间区间并发生成分段提炼；reduce：每fan_in段合并一次，直到不超过fan_in段
+    :param checkpoint: 传入Checkpoint时保存各区间与各组合并的结果，会议文本追加或修改后只重新处理变化的部分
+    """
+    if fan_in < 2:
+        raise ValueError("fan_in 必须不小于2")
+    transcript = transcript or parse_transcript(meeting_text)
+    time_intervals = split_by_interval(transcript, interval_minutes)
+    if not time_intervals:
+        raise ValueError("无法解析会议内容，未提取到有效时间区间")
+    
+    router = get_router()
+    map_prompt = load_prompt("prompt/summary_map.txt")
+    reduce_prompt = load_prompt("prompt/summary_reduce.txt")
+    
+    async def summarize(stage: str, system_prompt: str, user_input: str) -> str:
+        content = extract_content(await router.achat(stage, system_prompt, user_input))
+        if not content:
+            raise ValueError("API未返回有效内容")
+        return content
+    
+    async def map_worker(interval: dict) -> str:
+        summary = await summarize("summary.map", map_prompt, format_interval(interval))
+        return f"【{interval['time_range']}】\n{summary}"
+    
+    async def reduce_worker(group: list) -> str:
+        return await summarize("summary.reduce", reduce_prompt, "\n\n".join(group))
+    
+    map_worker = checkpointed(map_worker, checkpoint, "summary.map", lambda interval: {
+        "route": router.route("summary.map").identity(), "system": map_prompt,
+        "input": format_interval(interval)})
+    reduce_worker = checkpointed(reduce_worker, checkpoint, "summary.reduce", lambda group: {
+        "route": router.route("summary.reduce").identity(), "system": reduce_prompt, "input": group})
+    
+    # map：各区间并发总结
+    partials = await run_chunks(time_intervals, map_worker, max_concurrency, fail_fast=True,
+                                span_name="summary.map")
+    
+    # reduce：分组合并，直到剩余段数可放入一次最终调用
+    # 按固定位置分组（追加区间时前面的组不变，可复用检查点），末尾只有一段的组原样进入下一层，不再改写
+    while len(partials) > fan_in:
+        groups = [partials[i:i + fan_in] for i in range(0, len(partials), fan_in)]
+        merged = await run_chunks([group for group in groups if len(group) > 1], reduce_worker,
+                                  max_concurrency, fail_fast=True, span_name="summary.reduce")
+        partials = merged + [group[0] for group in groups if len(group) == 1]
+    
+    date_line = f"会议日期：{transcript.date}\n" if transcript.date else ""
+    return (
+        f"{date_line}以下是按{interval_minutes}分钟区间分段提炼的会议内容，请据此生成议题：\n\n"
+        + "\n\n".join(partials)
+    )
+
+async def amap_reduce_summary(meeting_text: str, interval_minutes: int = 30,
+                              max_concurrency: int = default_concurrency,
+                              fan_in: int = reduce_fan_in, transcript: Transcript = None,
+                              checkpoint=None) -> dict:
+    """分段总结后逐级合并生成会议摘要，单次调用的输入长度与会议总时长无关"""
+    final_input = await build_map_reduce_input(meeting_text, interval_minutes, max_concurrency,
+                                               fan_in, transcript, checkpoint)
+    api_result = await get_router().achat("summary", load_summary_prompt(), final_input)
+    return parse_summary_result(api_result)
+
+def resolve_mode(meeting_text: str, mode: str) -> str:
+    """校验模式，auto按会议文本长度选择single或map_reduce"""
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"不支持的摘要模式: {mode}，可选: {', '.join(SUMMARY_MODES)}")
+    if mode == "auto":
+        return "map_reduce" if count_tokens(meeting_text) > single_max_tokens else "single"
+    return mode
+
+def generate_summary(meeting_text: str, interval_minutes: int = 30, mode: str = "single",
+                     transcript: Transcript = None, checkpoint=None) -> dict:
+    """
+    生成会议摘要核心函数
+    :param mode: single整场一次调用；map_reduce分段总结后逐级合并；auto按文本长度选择
+    :param transcript: 已解析的会议文本，流水线中可复用同一份解析结果
+    :param checkpoint: meeting.checkpoint.Checkpoint，map_reduce模式下保存各区间的分段结果
+    """
+    if resolve_mode(meeting_text, mode) == "map_reduce":
+        return run_async(amap_reduce_summary(meeting_text, interval_minutes, transcript=transcript,
+                                             checkpoint=checkpoint))
+    system_prompt, processed_input = build_summary_input(meeting_text, interval_minutes, transcript)
+    api_result = get_router().chat("summary", system_prompt, processed_input)
+    return parse_summary_result(api_result)
+
+async def agenerate_summary(meeting_text: str, interval_minutes: int = 30, mode: str = "single",
+                            transcript: Transcript = None) -> dict:
+    """generate_summary的异步版本，供接口使用，等待API期间不阻塞事件循环"""
+    if resolve_mode(meeting_text, mode) == "map_reduce":
+        return await amap_reduce_summary(meeting_text, interval_minutes, transcript=transcript)
+    system_prompt, processed_input = build_summary_input(meeting_text, interval_minutes, transcript)
+    api_result = await get_router().achat("summary", system_prompt, processed_input)
+    return parse_summary_result(api_result)
+
+async def astream_summary(meeting_text: str, interval_minutes: int = 30, mode: str = "single",
+                          transcript: Transcript = None):
+    """
+    流式生成会议摘要：逐段产出 ("reasoning"/"content", {text})，最后产出 ("result", 摘要JSON)
+    map_reduce模式下先完成分段总结，再流式输出最终纪要
+    """
+    if resolve_mode(meeting_text, mode) == "map_reduce":
+        system_prompt = load_summary_prompt()
+        user_input = await build_map_reduce_input(meeting_text, interval_minutes, transcript=transcript)
+    else:
+        system_prompt, user_input = build_summary_input(meeting_text, interval_minutes, transcript)
+    async for kind, value in get_router().astream("summary", system_prompt, user_input):
+        if kind == "done":
+            yield "result", parse_summary_result(value)
+        else:
+            yield kind, {"text": value}
+
 # FastAPI接口
 @app.post("/summary")
 async def summary_api(request: SummaryRequest):
     try:
-        return generate_summary(request.meeting_text, request.interval_minutes)
+        if request.stream:
+            # 参数错误在开始推送前以普通错误返回
+            resolve_mode(request.meeting_text, request.mode)
+            return sse_response(astream_summary(request.meeting_text, request.interval_minutes, request.mode))
+        return await agenerate_summary(request.meeting_text, request.interval_minutes, request.mode)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,44 @@
+import math
+import os
+import re
+import threading
+
+# 本地分词器文件（如DeepSeek发布的tokenizer.json），未配置或未安装tokenizers时使用字符估算
+tokenizer_path = os.getenv("DEEPSEEK_TOKENIZER")
+
+# DeepSeek官方换算：1个中文字符约0.6个token，1个英文字符约0.3个token
+CJK_TOKENS_PER_CHAR = 0.6
+OTHER_TOKENS_PER_CHAR = 0.3
+
+# 中日韩统一表意文字及全角标点
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+def _get_tokenizer():
+    global _tokenizer, _tokenizer_loaded
+    with _tokenizer_lock:
+        if not _tokenizer_loaded:
+            _tokenizer_loaded = True
+            if tokenizer_path and os.path.exists(tokenizer_path):
+                try:
+                    from tokenizers import Tokenizer
+                    _tokenizer = Tokenizer.from_file(tokenizer_path)
+                except ImportError:
+                    print("未安装tokenizers，使用字符估算token数")
+        return _tokenizer
+
+def estimate_tokens(text: str) -> int:
+    """按字符类型估算token数"""
+    cjk_chars = len(_CJK_PATTERN.findall(text))
+    other_chars = len(text) - cjk_chars
+    return math.ceil(cjk_chars * CJK_TOKENS_PER_CHAR + other_chars * OTHER_TOKENS_PER_CHAR)
+
+def count_tokens(text: str) -> int:
+    """计算文本token数：优先使用本地分词器，否则按字符估算"""
+    tokenizer = _get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return estimate_tokens(text)
@@ -0,0 +1,216 @@
+"""
+轻量级链路追踪：记录各阶段的耗时片段（span），导出为JSON Lines文件，并汇总为Prometheus格式的指标
+
+    with span("llm.chat", model="deepseek-reasoner") as s:
+        ...
+        s.set(prompt_tokens=120, completion_tokens=80)
+
+span之间的父子关系通过contextvars传递，异步任务与run_in_threadpool中自动继承
+"""
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+# 设置后每个结束的span写入一行JSON；为空时只汇总指标
+trace_file = os.getenv("TRACE_FILE", "")
+
+# 耗时直方图的分桶上界（秒）
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# 按span名称累加的数值属性 -> (指标名, 标签)
+COUNTED_ATTRS = {
+    "prompt_tokens": ("meeting_llm_tokens_total", 'type="prompt"'),
+    "completion_tokens": ("meeting_llm_tokens_total", 'type="completion"'),
+    "reasoning_tokens": ("meeting_llm_tokens_total", 'type="reasoning"'),
+    "retries": ("meeting_llm_retries_total", ""),
+    "bytes_in": ("meeting_bytes_total", 'direction="in"'),
+    "bytes_out": ("meeting_bytes_total", 'direction="out"'),
+}
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一次计时片段，attrs中为阶段、块序号、字节数、token数、重试次数等属性"""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "error", "attrs")
+
+    def __init__(self, name: str, parent=None, **attrs):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, value: float = 1):
+        """累加数值属性"""
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "error": self.error,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """收集结束的span：写入JSON Lines文件并按名称汇总计数、耗时分布与数值属性"""
+
+    def __init__(self, path: str = trace_file):
+        self._lock = threading.Lock()
+        self._file = None
+        self.configure(path)
+        self.reset()
+
+    def configure(self, path: str):
+        """设置（或关闭）JSON Lines导出文件，追加写入"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = path
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._file = open(path, 'a', encoding='utf-8', buffering=1)
+
+    def reset(self):
+        with self._lock:
+            self.counts = {}
+            self.errors = {}
+            self.duration_sums = {}
+            self.buckets = {}
+            self.totals = {}
+
+    def finish(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) if self._file else None
+        with self._lock:
+            name = span.name
+            self.counts[name] = self.counts.get(name, 0) + 1
+            if span.error is not None:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            self.duration_sums[name] = self.duration_sums.get(name, 0.0) + span.duration
+            buckets = self.buckets.setdefault(name, [0] * len(DURATION_BUCKETS))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+            for key in COUNTED_ATTRS:
+                value = span.attrs.get(key)
+                if isinstance(value, (int, float)) and value:
+                    self.totals[(key, name)] = self.totals.get((key, name), 0) + value
+            if line is not None and self._file is not None:
+                self._file.write(line + "\n")
+
+    def summary(self) -> dict:
+        """按span名称汇总：调用次数、失败次数、总耗时及各计数属性之和"""
+        with self._lock:
+            result = {}
+            for name, count in self.counts.items():
+                result[name] = {"count": count, "errors": self.errors.get(name, 0),
+                                "seconds": round(self.duration_sums[name], 3)}
+            for (key, name), value in self.totals.items():
+                result[name][key] = value
+            return result
+
+    def render_prometheus(self) -> str:
+        """Prometheus文本格式的指标"""
+        lines = [
+            "# HELP meeting_span_seconds 各阶段（span）耗时",
+            "# TYPE meeting_span_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self.counts):
+                label = f'span="{name}"'
+                for bound, value in zip(DURATION_BUCKETS, self.buckets[name]):
+                    lines.append(f'meeting_span_seconds_bucket{{{label},le="{bound}"}} {value}')
+                lines.append(f'meeting_span_seconds_bucket{{{label},le="+Inf"}} {self.counts[name]}')
+                lines.append(f"meeting_span_seconds_sum{{{label}}} {self.duration_sums[name]:.6f}")
+                lines.append(f"meeting_span_seconds_count{{{label}}} {self.counts[name]}")
+
+            lines.append("# HELP meeting_span_errors_total 以异常结束的span数")
+            lines.append("# TYPE meeting_span_errors_total counter")
+            for name in sorted(self.counts):
+                lines.append(f'meeting_span_errors_total{{span="{name}"}} {self.errors.get(name, 0)}')
+
+            declared = set()
+            for (key, name), value in sorted(self.totals.items()):
+                metric, extra = COUNTED_ATTRS[key]
+                if metric not in declared:
+                    declared.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                labels = f'span="{name}"' + (f",{extra}" if extra else "")
+                lines.append(f"{metric}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+def current_span():
+    """当前上下文中正在进行的span，没有时返回None"""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """记录一个span，异常会记录到error字段后继续抛出"""
+    current = Span(name, _current.get(), **attrs)
+    token = _current.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current.reset(token)
+        tracer.finish(current)
+
+
+def start_span(name: str, **attrs) -> Span:
+    """
+    创建不进入当前上下文的span，用于跨越多次yield的异步生成器
+    （生成器的各步可能在不同上下文中执行），结束时调用finish_span
+    """
+    return Span(name, _current.get(), **attrs)
+
+
+def finish_span(current: Span, error: BaseException = None):
+    current.duration = time.time() - current.start
+    if error is not None:
+        current.error = f"{type(error).__name__}: {error}"
+    tracer.finish(current)
+
+
+def add_metrics_route(app):
+    """为FastAPI应用添加 GET /metrics，并将每个HTTP请求记录为一个span"""
+    from fastapi import Request
+    from fastapi.responses import PlainTextResponse
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return PlainTextResponse(tracer.render_prometheus(),
+                                 media_type="text/plain; version=0.0.4; charset=utf-8")
+
+    @app.middleware("http")
+    async def trace_requests(request: Request, call_next):
+        if request.url.path == "/metrics":
+            return await call_next(request)
+        with span(f"http {request.method} {request.url.path}") as s:
+            response = await call_next(request)
+            s.set(status_code=response.status_code)
+            return response
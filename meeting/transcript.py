@@ -0,0 +1,126 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+from meeting.tracing import span
+
+# 日期行：日期：YYYY-MM-DD
+DATE_PATTERN = re.compile(r'^日期：(\d{4}-\d{2}-\d{2})$')
+# 发言行：MM:SS 发言人N: 内容（MM为分钟，可超过两位；SS为60进制秒）
+LINE_PATTERN = re.compile(r'^(\d+):(\d{2}) 发言人(\d+): (.+)$')
+
+
+def split_rolling(seconds, interval_seconds: int) -> list:
+    """
+    按滚动起点切分：每段从首条发言起计，时间差达到interval_seconds的发言开始新段
+    :param seconds: 升序的发言时间（秒）
+    :return: [(起始下标, 结束下标)]，左闭右开
+    """
+    ranges = []
+    start, total = 0, len(seconds)
+    while start < total:
+        stop = max(bisect_left(seconds, seconds[start] + interval_seconds, start + 1), start + 1)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def split_fixed(seconds, interval_seconds: int) -> list:
+    """
+    按固定网格切分：第k段在时间差超过k*interval_seconds的首条发言处结束
+    :param seconds: 升序的发言时间（秒）
+    :return: [(起始下标, 结束下标)]，左闭右开
+    """
+    ranges = []
+    start, total = 0, len(seconds)
+    while start < total:
+        bound = seconds[0] + interval_seconds * (len(ranges) + 1)
+        stop = max(bisect_right(seconds, bound, start + 1), start + 1)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+class Transcript:
+    """
+    列式存储的会议转写稿：发言时间为int数组，发言人为驻留后的编号，
+    全部发言内容拼接为一个字符串并以偏移量数组索引
+    """
+    __slots__ = ("date", "seconds", "speaker_ids", "speakers", "text", "offsets")
+
+    def __init__(self, date, seconds: array, speaker_ids: array, speakers: list, text: str, offsets: array):
+        self.date = date  # YYYY-MM-DD，无日期行时为None
+        self.seconds = seconds
+        self.speaker_ids = speaker_ids
+        self.speakers = speakers  # 编号 -> "发言人N"
+        self.text = text
+        self.offsets = offsets  # 第i条内容为 text[offsets[i]:offsets[i+1]]
+
+    def __len__(self) -> int:
+        return len(self.seconds)
+
+    def content(self, index: int) -> str:
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def speaker(self, index: int) -> str:
+        return self.speakers[self.speaker_ids[index]]
+
+    def entries(self, start: int = 0, stop: int = None) -> list:
+        """返回[(总秒数, 发言人, 内容)]"""
+        stop = len(self) if stop is None else stop
+        return [(self.seconds[i], self.speaker(i), self.content(i)) for i in range(start, stop)]
+
+    def split_rolling(self, interval_minutes: int) -> list:
+        return split_rolling(self.seconds, interval_minutes * 60)
+
+    def split_fixed(self, interval_minutes: int) -> list:
+        return split_fixed(self.seconds, interval_minutes * 60)
+
+
+def parse_transcript(content: str) -> Transcript:
+    """单次扫描解析会议文本，无法识别的行与秒数不合法的行被忽略，结果按时间稳定排序"""
+    with span("transcript.parse", bytes_in=len(content.encode("utf-8"))) as s:
+        transcript = _parse(content)
+        s.set(entries=len(transcript))
+    return transcript
+
+
+def _parse(content: str) -> Transcript:
+    date = None
+    rows = []
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        match = LINE_PATTERN.match(line)
+        if match:
+            minutes, seconds, spk, text = match.groups()
+            seconds = int(seconds)
+            if seconds < 60:  # 秒数必须是60进制(0-59)
+                rows.append((int(minutes) * 60 + seconds, spk, text))
+            continue
+        date_match = DATE_PATTERN.match(line)
+        if date_match:
+            date = date_match.group(1)
+
+    # 转写稿通常已按时间排列，仅在乱序时排序
+    if any(rows[i][0] > rows[i + 1][0] for i in range(len(rows) - 1)):
+        rows.sort(key=lambda row: row[0])
+
+    speaker_index = {}
+    speakers = []
+    seconds = array('i')
+    speaker_ids = array('i')
+    offsets = array('i', [0])
+    texts = []
+    position = 0
+    for total_seconds, spk, text in rows:
+        if spk not in speaker_index:
+            speaker_index[spk] = len(speakers)
+            speakers.append(f"发言人{spk}")
+        seconds.append(total_seconds)
+        speaker_ids.append(speaker_index[spk])
+        texts.append(text)
+        position += len(text)
+        offsets.append(position)
+    return Transcript(date, seconds, speaker_ids, speakers, ''.join(texts), offsets)